@@ -20,16 +20,22 @@ from balladeer.lite.compass import Compass
 from balladeer.lite.compass import Traffic
 from balladeer.lite.compass import Transit
 from balladeer.lite.compass import MapBuilder
+from balladeer.lite.dispatcher import Dispatcher
 from balladeer.lite.drama import Drama
+from balladeer.lite.entity import CompactEntity
 from balladeer.lite.entity import Entity
 from balladeer.lite.loader import Loader
 from balladeer.lite.presenter import Presenter
+from balladeer.lite.profiler import Profiler
 from balladeer.lite.speech import Dialogue
 from balladeer.lite.speech import Epilogue
 from balladeer.lite.speech import Prologue
 from balladeer.lite.resident import Resident
 from balladeer.lite.speech import Speech
 from balladeer.lite.speechtables import SpeechTables
+from balladeer.lite.store import MemoryStore
+from balladeer.lite.store import SessionStore
+from balladeer.lite.store import SQLiteStore
 from balladeer.lite.storybuilder import StoryBuilder
 from balladeer.lite.storystager import StoryStager
 from balladeer.lite.types import Detail
@@ -18,16 +18,26 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import asyncio
+from collections import defaultdict
+from collections import deque
+from collections.abc import Callable
 from collections.abc import Generator
-import copy
+from concurrent.futures import Executor
+import contextlib
 import functools
+import hashlib
 import json
+import multiprocessing
 import operator
 import pathlib
 import re
+import signal
 import sys
+import tempfile
 import textwrap
+import time
 from types import ModuleType
+import uuid
 import warnings
 
 import hypercorn
@@ -35,19 +45,30 @@ from hypercorn.asyncio import serve
 
 from starlette.applications import Starlette
 from starlette.endpoints import HTTPEndpoint
+from starlette.endpoints import WebSocketEndpoint
 from starlette.responses import HTMLResponse
 from starlette.responses import JSONResponse
 from starlette.responses import PlainTextResponse
 from starlette.responses import RedirectResponse
+from starlette.responses import Response
+from starlette.responses import StreamingResponse
 from starlette.routing import Mount
 from starlette.routing import Route
+from starlette.routing import WebSocketRoute
 from starlette.staticfiles import StaticFiles
 
 import balladeer
 from balladeer.lite.entity import Entity
 from balladeer.lite.loader import Loader
 from balladeer.lite.compass import MapBuilder
+from balladeer.lite.dispatcher import Dispatcher
 from balladeer.lite.presenter import Presenter
+from balladeer.lite.profiler import Profiler
+from balladeer.lite.router import Ring
+from balladeer.lite.router import Router
+from balladeer.lite.speech import Speech
+from balladeer.lite.store import MemoryStore
+from balladeer.lite.store import SessionStore
 from balladeer.lite.storybuilder import StoryBuilder
 from balladeer.lite.types import Grouping
 from balladeer.lite.types import Page
@@ -74,11 +95,73 @@ class Home(HTTPEndpoint):
     </form>
     """).strip()
 
+    class Shell:
+        """
+        Memoizes those parts of a page which depend only on the assets, and on the
+        style and theme names chosen for a turn.
+
+        A new Shell is made whenever the assets of an endpoint are replaced.
+        Call `clear` after a change to the contents of the assets.
+
+        """
+
+        def __init__(self, assets: Grouping, static: pathlib.Path = None, maxsize: int = 256):
+            self.assets = assets
+            self.static = static
+            self.maxsize = maxsize
+            self.items = {}
+
+        @classmethod
+        def of(cls, endpoint: HTTPEndpoint, request) -> "Home.Shell":
+            "Return the Shell for the current assets of an endpoint."
+            owner = type(endpoint)
+            assets = getattr(owner, "assets", Grouping())
+            static = request.app.state.static
+            rv = getattr(owner, "shell", None)
+            if rv is None or rv.assets is not assets or rv.static != static:
+                rv = owner.shell = cls(assets, static)
+            return rv
+
+        def clear(self):
+            self.items.clear()
+            self.__dict__.pop("media", None)
+
+        @functools.cached_property
+        def media(self) -> dict[str, dict[str, Loader.Asset]]:
+            "An index of assets by file stem, then by MIME type."
+            rv = defaultdict(dict)
+            for asset in self.assets.get(Loader.Asset, []):
+                rv[asset.path.stem][asset.type] = asset
+            return dict(rv)
+
+        def memo(self, key: tuple, fn: Callable[[], list[str]]) -> list[str]:
+            try:
+                return self.items[key]
+            except KeyError:
+                if len(self.items) >= self.maxsize:
+                    self.items.clear()
+                rv = self.items[key] = list(fn())
+                return rv
+
+        def css_links(self, request, *styles: tuple[str]) -> list[str]:
+            return self.memo(
+                ("css",) + styles,
+                lambda: sorted(Home.render_css_links(request, Loader.style(self.assets, *styles)))
+            )
+
+        def js_links(self, request) -> list[str]:
+            return self.memo(("js",), lambda: Home.render_js_links(request, self.assets))
+
+        def css_vars(self, settings: dict) -> list[str]:
+            key = ("vars",) + tuple((k, tuple(v.items())) for k, v in settings.items())
+            return self.memo(key, lambda: Home.render_css_vars(settings))
+
     async def get(self, request):
         page = Page()
         page = self.compose(request, page)
         return HTMLResponse(page.html)
 
+
     @staticmethod
     def render_css_links(request, assets: Grouping[str, list[Loader.Asset]]) -> Generator[str]:
         static = request.app.state.static
@@ -124,9 +207,7 @@ class Home(HTTPEndpoint):
     ) -> Page:
         page.paste(self.meta, zone=page.zone.meta)
 
-        assets = getattr(self, "assets", Grouping())
-        styled = Loader.style(assets)
-        page.paste(*sorted(line for line in Home.render_css_links(request, styled)), zone=page.zone.css)
+        page.paste(*Home.Shell.of(self, request).css_links(request), zone=page.zone.css)
         page.paste(self.body, zone=page.zone.body)
         return page
 
@@ -143,7 +224,11 @@ class HomeHTML4(Home):
 class Start(HTTPEndpoint):
     async def post(self, request):
         state = request.app.state
-        story = copy.deepcopy(state.story_builder)
+        story = state.story_builder.spawn()
+        ring = getattr(state, "ring", None)
+        while ring and ring.lookup(story.uid) != state.node:
+            # Choose an id which the router will send back to this worker
+            story.uid = uuid.uuid4()
         state.sessions[story.uid] = story
         return RedirectResponse(
             url=request.url_for("session", session_id=story.uid), status_code=303
@@ -156,6 +241,14 @@ class Session(HTTPEndpoint):
 
     async def get(self, request):
         session_id = request.path_params["session_id"]
+        try:
+            return await request.app.state.dispatcher.run(session_id, self.play, request, session_id)
+        except Dispatcher.Busy as e:
+            warnings.warn(str(e))
+            return PlainTextResponse(str(e), status_code=429, headers={"Retry-After": "1"})
+
+    def play(self, request, session_id) -> Response:
+        "Play a turn of the story and compose its page. This may run in a worker thread."
         state = request.app.state
 
         try:
@@ -171,9 +264,43 @@ class Session(HTTPEndpoint):
                 warnings.warn(f"Check selector - {getattr(story.context, 'selector')}")
                 return RedirectResponse(url=request.url_for("home"), status_code=300)
 
-            page = self.compose(request, page, story, turn)
+            with story.profiler.stage("compose"):
+                page = self.compose(request, page, story, turn)
+                # The head depends on the story, so render it while the session is held
+                zones = list(page.zone)
+                n = zones.index(page.zone.main)
+                head = list(page.stream(*zones[:n]))
 
-        return HTMLResponse(page.html)
+        state.sessions[story.uid] = story
+        # The cues depend only on the turn, so they may render after the session is released
+        body = self.render(story, page.stream(*zones[n:], sep="\n" if head else ""))
+        return StreamingResponse(
+            self.stream(head, body, executor=state.dispatcher.executor), media_type="text/html"
+        )
+
+    @staticmethod
+    def render(story: StoryBuilder, chunks: Generator[str]) -> Generator[str]:
+        with story.profiler.stage("render"):
+            yield from chunks
+
+    @staticmethod
+    async def stream(head: list[str], body: Generator[str], executor: Executor = None):
+        """
+        Send the page one zone at a time.
+        The head is ready. The zones of the body are rendered in the `executor` if there is one.
+
+        """
+        for chunk in head:
+            yield chunk
+
+        if executor is None:
+            for chunk in body:
+                yield chunk
+            return
+
+        loop = asyncio.get_running_loop()
+        while (chunk := await loop.run_in_executor(executor, next, body, None)) is not None:
+            yield chunk
 
     @staticmethod
     def convert_code_into_action(match: re.Match, request=None, story=None, turn=None, page = None):
@@ -183,6 +310,7 @@ class Session(HTTPEndpoint):
             form = textwrap.dedent(f"""
             <form role="form" action="{url}" method="post" id="ballad-action-form-{text}" class="ballad action">
             <input type="hidden" name="ballad-command-form-input-text" value="{match[2]}" />
+            {Command.render_nonce()}
             </form>
             """)
             page.paste(form, zone=page.zone.inputs)
@@ -233,7 +361,7 @@ class Session(HTTPEndpoint):
         index: int = 0,
         ordinal: int = 0,
     ) -> Generator[str]:
-        assets = {i.path.stem: i for i in self.assets[Loader.Asset]}
+        shell = Home.Shell.of(self, request)
 
         yield (
             f'<details tabindex="0" style="animation-delay: {delay:.2f}s; animation-duration:'
@@ -243,26 +371,60 @@ class Session(HTTPEndpoint):
         if mode:
             yield f"<summary>{mode}</summary>"
 
-        # TODO: separate method to resolve file types, paths, etc.
         for m in media:
-            try:
-                asset = assets[m]
-                if asset.type == "audio/mpeg":
-                    yield (
-                        f'<audio id="{index:02d}-{ordinal:02d}" src="/static/{asset.path.name}"'
-                        ' controls="controls" preload="auto"></audio>'
-                    )
-                    yield (
-                        '<script type="text/javascript">\n'
-                        "  setTimeout(function(){\n"
-                        f'   document.getElementById("{index:02d}-{ordinal:02d}").play();\n'
-                        f"  }}, {delay * 1000})\n"
-                        "</script>"
-                    )
-            except KeyError:
-                pass
+            yield from shell.memo(
+                ("media", m, delay, index, ordinal),
+                lambda: self.render_media(m, shell.media.get(m, {}), delay, index, ordinal)
+            )
         yield "</details>"
 
+    def render_media(
+        self,
+        stem: str,
+        assets: dict[str, Loader.Asset],
+        delay: float = 0,
+        index: int = 0,
+        ordinal: int = 0,
+    ) -> Generator[str]:
+        """
+        Generate the markup for those assets which share the same file stem.
+        Each format is a source for the same element, so the browser may choose one it can play.
+
+        """
+        ident = f"{index:02d}-{ordinal:02d}"
+        urls = {typ: f"/static/{asset.path.name}" for typ, asset in assets.items()}
+        tracks = [f'<track kind="subtitles" src="{url}" />' for typ, url in urls.items() if typ == "text/vtt"]
+        play = (
+            '<script type="text/javascript">\n'
+            "  setTimeout(function(){\n"
+            f'   document.getElementById("{ident}").play();\n'
+            f"  }}, {delay * 1000})\n"
+            "</script>"
+        )
+
+        # A video takes the place of any audio of the same name
+        for tag in ("video", "audio"):
+            sources = [
+                f'<source src="{url}" type="{typ}" />' for typ, url in urls.items() if typ.startswith(f"{tag}/")
+            ]
+            if sources:
+                yield f'<{tag} id="{ident}" controls="controls" preload="auto">'
+                yield from sources
+                if tag == "video":
+                    yield from tracks
+                yield f"</{tag}>"
+                yield play
+                break
+
+        images = [(typ, url) for typ, url in urls.items() if typ.startswith("image/")]
+        if len(images) == 1:
+            yield f'<img src="{images[0][1]}" alt="{stem}" />'
+        elif images:
+            yield "<picture>"
+            yield from (f'<source srcset="{url}" type="{typ}" />' for typ, url in images[1:])
+            yield f'<img src="{images[0][1]}" alt="{stem}" />'
+            yield "</picture>"
+
     def render_refresh(self, url, notes: dict = {}) -> str:
         try:
             wait = notes.get("delay", 0) + notes.get("offer", 0)
@@ -287,6 +449,7 @@ class Session(HTTPEndpoint):
             title="{story.context.tooltip}"
             list="ballad-command-form-input-list"
             />
+            {Command.render_nonce()}
             <button type="submit">Enter</button>
             </fieldset>
             </form>
@@ -313,7 +476,7 @@ class Session(HTTPEndpoint):
     def compose(
         self, request, page: Page, story: StoryBuilder = None, turn: Turn = None
     ) -> Page:
-        assets = getattr(self, "assets", Grouping())
+        shell = Home.Shell.of(self, request)
 
         title = self.render_title(request, story, turn)
         page.paste(title, zone=page.zone.title)
@@ -321,17 +484,15 @@ class Session(HTTPEndpoint):
 
         notes = list(turn.notes.values())
         styles = notes and notes[-1].get("style", []) or []
-        styled = Loader.style(assets, *styles)
-        page.paste(*sorted(line for line in Home.render_css_links(request, styled)), zone=page.zone.css)
+        page.paste(*shell.css_links(request, *styles), zone=page.zone.css)
 
-        page.paste(*Home.render_js_links(request, assets), zone=page.zone.script)
+        page.paste(*shell.js_links(request), zone=page.zone.script)
 
         theme_names = ["default"] + (notes and notes[-1].get("theme", []) or [])
         settings = story.settings(*theme_names, themes=page.themes)
-        page.paste(*Home.render_css_vars(settings), zone=page.zone.theme)
+        page.paste(*shell.css_vars(settings), zone=page.zone.theme)
 
-        html5 = "\n".join(self.render_cues(request, story, turn, page))
-        page.paste("<main>", html5, "</main>", zone=page.zone.main)
+        page.paste("<main>", self.render_cues(request, story, turn, page), "</main>", zone=page.zone.main)
 
         offer = notes and notes[-1]["offer"]
         if offer:
@@ -378,6 +539,7 @@ class SessionHTML4(Session):
             list="ballad-command-form-input-list"
             />
             {selection}
+            {Command.render_nonce()}
             <button type="submit">Enter</button>
             </fieldset>
             </form>
@@ -386,16 +548,48 @@ class SessionHTML4(Session):
 
 
 class Command(HTTPEndpoint):
+    """
+    Applies a command from a form to the story.
+
+    Each form carries a `nonce`. A form submitted twice, whether its command is still in
+    progress or recently finished, is answered once only. A command sent again from a new form
+    is played again.
+
+    """
+
+    @staticmethod
+    def render_nonce() -> str:
+        return f'<input type="hidden" name="ballad-command-form-input-nonce" value="{uuid.uuid4().hex}" />'
+
     async def post(self, request):
         session_id = request.path_params["session_id"]
-        state = request.app.state
-        story = state.sessions[session_id]
 
         async with request.form() as form:
             command = form.get("ballad-command-form-input-text", "")
             command = command or form.get("ballad-command-form-input-value", "")
+            nonce = form.get("ballad-command-form-input-nonce")
+
+        try:
+            return await request.app.state.dispatcher.run(
+                session_id, self.act, request, session_id, command,
+                key=nonce and ("command", nonce, command), remember=True,
+            )
+        except Dispatcher.Busy as e:
+            warnings.warn(str(e))
+            return PlainTextResponse(str(e), status_code=429, headers={"Retry-After": "1"})
+
+    def act(self, request, session_id, command: str) -> Response:
+        "Apply a command to the story. This may run in a worker thread."
+        state = request.app.state
+
+        try:
+            story = state.sessions[session_id]
+        except KeyError:
+            warnings.warn(f"No such session as {session_id}")
+            return RedirectResponse(url=request.url_for("home"), status_code=410)
 
         story.action(command)
+        state.sessions[story.uid] = story
 
         return RedirectResponse(
             url=request.url_for("session", session_id=story.uid), status_code=303
@@ -403,19 +597,271 @@ class Command(HTTPEndpoint):
 
 
 class Assembly(HTTPEndpoint):
+    """
+    Serves the current ensemble and options of a session as JSON.
+
+    Every response carries a `version` number.
+    A client which sends its last version as the query parameter `since` receives only
+    the changes made after it. Instead of an `ensemble`, that response has a `patch`,
+    a list of operations in the style of JSON Patch, addressed by entity `uid`:
+
+    .. code-block:: json
+
+        {"op": "replace", "path": "/ensemble/e0c6...", "value": {"names": ["Lamp"], ...}}
+
+    When the changes are too old to be kept, the full ensemble is sent instead.
+
+    The response carries an `ETag`. When a client sends it back as `If-None-Match`
+    and nothing has changed, the reply is `304 Not Modified` with no body.
+    Set `etag` to `False` in a subclass to disable this.
+
+    """
+
+    etag = True
+
+    class Journal:
+        """
+        A bounded record of changes to the ensemble of one session.
+
+        Each call to `record` compares the ensemble with the last one seen.
+        If any entity has been added, removed or changed, the version number goes up.
+
+        """
+
+        def __init__(self, maxlen: int = 64):
+            self.version = 0
+            self.fragments = []
+            self.snapshot = {}
+            self.entries = deque(maxlen=maxlen)
+
+        def record(self, ensemble: list[Entity], encoder: Entity.Encoder) -> int:
+            self.fragments = [encoder.fragment(i) for i in ensemble]
+            current = {str(i.uid): text for i, text in zip(ensemble, self.fragments)}
+            changes = {uid: "remove" for uid in self.snapshot.keys() - current.keys()}
+            for uid, text in current.items():
+                try:
+                    if self.snapshot[uid] != text:
+                        changes[uid] = "replace"
+                except KeyError:
+                    changes[uid] = "add"
+
+            if changes:
+                self.version += 1
+                self.entries.append((self.version, changes))
+            self.snapshot = current
+            return self.version
+
+        def since(self, version: int) -> list[tuple[str, str, str]] | None:
+            """
+            Return a list of operations which bring an ensemble from `version` up to date.
+            Each is a tuple of (op, uid, JSON text).
+
+            Returns `None` if the journal no longer goes back that far.
+
+            """
+            if version == self.version:
+                return []
+            elif not self.entries or not (self.entries[0][0] - 1 <= version < self.version):
+                return None
+
+            first = {}
+            for n, changes in self.entries:
+                if n > version:
+                    for uid, op in changes.items():
+                        first.setdefault(uid, op)
+
+            rv = []
+            for uid, op in first.items():
+                existed = op != "add"
+                if uid in self.snapshot:
+                    rv.append(("replace" if existed else "add", uid, self.snapshot[uid]))
+                elif existed:
+                    rv.append(("remove", uid, None))
+            return rv
+
     class EntitySerializer(JSONResponse):
         encoder = Entity.Encoder()
 
+        def render_patch(self, patch: list[tuple[str, str, str]]) -> str:
+            return "[" + ", ".join(
+                f'{{"op": "{op}", "path": "/ensemble/{uid}"' + (f', "value": {text}}}' if text else "}")
+                for op, uid, text in patch
+            ) + "]"
+
         def render(self, content) -> bytes:
-            return self.encoder.encode(content).encode("utf-8")
+            try:
+                # Splice in the JSON text of each entity, which may be given already
+                text = "{" + ", ".join(
+                    self.encoder.encode(k) + ": " + (
+                        "[" + ", ".join(
+                            i if isinstance(i, str) else self.encoder.fragment(i) for i in v
+                        ) + "]" if k == "ensemble"
+                        else self.render_patch(v) if k == "patch"
+                        else self.encoder.encode(v)
+                    )
+                    for k, v in content.items()
+                ) + "}"
+            except (AttributeError, TypeError):
+                text = self.encoder.encode(content)
+            return text.encode("utf-8")
+
+    @staticmethod
+    def entity_tag(body: bytes) -> str:
+        return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    @staticmethod
+    def is_not_modified(request, tag: str) -> bool:
+        tags = {i.strip().removeprefix("W/") for i in request.headers.get("if-none-match", "").split(",")}
+        return tag in tags or "*" in tags
 
     async def get(self, request):
         session_id = request.path_params["session_id"]
+        try:
+            return await request.app.state.dispatcher.run(
+                session_id, self.assemble, request, session_id,
+                key=("assembly", str(request.url), request.headers.get("if-none-match")),
+            )
+        except Dispatcher.Busy as e:
+            warnings.warn(str(e))
+            return JSONResponse({}, status_code=429, headers={"Retry-After": "1"})
+
+    def assemble(self, request, session_id) -> Response:
+        "Gather the ensemble and options of the story. This may run in a worker thread."
         state = request.app.state
-        story = state.sessions[session_id]
+
+        try:
+            story = state.sessions[session_id]
+        except KeyError:
+            warnings.warn(f"No such session as {session_id}")
+            return JSONResponse({}, status_code=410)
+
         ensemble = story.context.ensemble
-        assembly = dict(ensemble=ensemble, options=list(story.context.options(ensemble).keys()))
-        return self.EntitySerializer(assembly)
+        options = list(story.context.options(ensemble).keys())
+
+        try:
+            journal = story.journal
+        except AttributeError:
+            journal = story.journal = self.Journal()
+
+        version = journal.version
+        if journal.record(ensemble, self.EntitySerializer.encoder) != version:
+            state.sessions[story.uid] = story
+
+        try:
+            patch = journal.since(int(request.query_params["since"]))
+        except (KeyError, ValueError):
+            patch = None
+
+        if patch is None:
+            assembly = dict(ensemble=journal.fragments, options=options, version=journal.version)
+        else:
+            assembly = dict(patch=patch, options=options, version=journal.version)
+
+        response = self.EntitySerializer(assembly)
+        if not self.etag:
+            return response
+
+        tag = self.entity_tag(response.body)
+        if self.is_not_modified(request, tag):
+            return Response(status_code=304, headers={"ETag": tag})
+
+        response.headers["ETag"] = tag
+        return response
+
+
+class Channel(WebSocketEndpoint):
+    """
+    A WebSocket over which a client sends commands and receives the output of each turn.
+
+    Messages from the client are JSON objects with a `command`, eg: ``{"command": "look"}``.
+    After each command, the server sends a JSON object with
+    the rendered `cues` of the turn, the visible `options` for the next command,
+    and the `offer` of a delay in seconds when the story will proceed without one.
+
+    The page shell need only be fetched once from :py:class:`Session`.
+    On connection, the server sends the turn which that page has already played,
+    so the story does not advance. Only a story which has not yet played a turn plays one then.
+
+    """
+
+    encoding = "json"
+    renderer = Session
+
+    def render(self, websocket, story: StoryBuilder, turn: Turn = None) -> dict:
+        "Render a turn of the story. Without one, play the next."
+        if turn is None:
+            with story.turn() as turn:
+                return self.render(websocket, story, turn)
+
+        endpoint = self.renderer(dict(type="http"), None, None)
+        cues = []
+        with story.profiler.stage("compose"):
+            for line in endpoint.render_cues(websocket, story, turn):
+                if line == '<div class="ballad cue">':
+                    cues.append([])
+                cues[-1].append(line)
+
+        notes = list(turn.notes.values())
+        offer = notes and notes[-1].get("offer") or 0
+        if offer:
+            offer += notes[-1].get("delay", 0)
+
+        context = story.context
+        options = context.options(context.ensemble)
+        return dict(
+            cues=["\n".join(i) for i in cues],
+            options=sorted(i for i in options.keys() if not context.is_command_hidden(i, options)),
+            offer=offer,
+        )
+
+    async def on_connect(self, websocket):
+        session_id = websocket.path_params["session_id"]
+        if session_id not in websocket.app.state.sessions:
+            warnings.warn(f"No such session as {session_id}")
+            await websocket.close(code=4410)
+            return
+
+        await websocket.accept()
+        await self.push(websocket)
+
+    async def on_receive(self, websocket, data):
+        try:
+            command = data["command"]
+        except (KeyError, TypeError):
+            await websocket.send_json(dict(error="Expected an object with a 'command'"))
+            return
+
+        await self.push(websocket, str(command))
+
+    def play(self, websocket, command: str = None) -> dict:
+        """
+        Apply a command and play a turn. Without a command, send the latest turn again.
+        This may run in a worker thread.
+
+        """
+        state = websocket.app.state
+        story = state.sessions[websocket.path_params["session_id"]]
+        if command is None:
+            message = self.render(websocket, story, getattr(story, "latest", None))
+        else:
+            story.action(command)
+            message = self.render(websocket, story)
+        state.sessions[story.uid] = story
+        return message
+
+    async def push(self, websocket, command: str = None):
+        session_id = websocket.path_params["session_id"]
+        try:
+            message = await websocket.app.state.dispatcher.run(session_id, self.play, websocket, command)
+        except Dispatcher.Busy as e:
+            message = dict(error=str(e))
+        await websocket.send_json(message)
+
+
+class Metrics(HTTPEndpoint):
+    async def get(self, request):
+        profiler = request.app.state.profiler
+        return PlainTextResponse(profiler.render(), media_type="text/plain; version=0.0.4")
 
 
 async def app_factory(
@@ -426,6 +872,10 @@ async def app_factory(
     static: pathlib.Path = None,
     loop=None,
     html_syntax=5,
+    sessions: SessionStore = None,
+    profiler: Profiler = None,
+    watcher: Loader.Watcher = None,
+    executor: Executor = None,
     **kwargs,
 ):
 
@@ -443,10 +893,13 @@ async def app_factory(
         session=session_handler,
         assembly=next(reversed(Assembly.__subclasses__()), Assembly),
         command=next(reversed(Command.__subclasses__()), Command),
+        channel=next(reversed(Channel.__subclasses__()), Channel),
+        metrics=next(reversed(Metrics.__subclasses__()), Metrics),
     )
     for endpt in endpoints.values():
         endpt.assets = assets.copy()
         endpt.metadata = kwargs.copy()
+    endpoints["channel"].renderer = session_handler
 
     routes = routes or [
         Route("/", endpoints["home"], name="home"),
@@ -460,18 +913,64 @@ async def app_factory(
             methods=["POST"],
             name="command",
         ),
+        WebSocketRoute("/session/{session_id:uuid}/channel", endpoints["channel"], name="channel"),
     ]
     if static:
         routes.append(Mount("/static", app=StaticFiles(directory=static), name="static"))
+    if profiler is not None:
+        routes.append(Route("/metrics", endpoints["metrics"], name="metrics"))
 
     presenter = next(reversed(Presenter.__subclasses__()), Presenter)
 
-    app = Starlette(routes=routes)
+    lifespan = None
+    if watcher is not None:
+        groupings = [i for i in (assets, getattr(story_builder, "assets", None)) if isinstance(i, Grouping)]
+
+        def refresh(paths, items):
+            # A new copy for each endpoint invalidates its Shell
+            for endpt in endpoints.values():
+                endpt.assets = groupings[0].copy()
+            print(f"Reloaded {len(paths)} file{'' if len(paths) == 1 else 's'}", file=sys.stderr)
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            task = asyncio.create_task(
+                watcher.run(*groupings, callback=refresh, profiler=app.state.profiler)
+            )
+            try:
+                yield
+            finally:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+    app = Starlette(routes=routes, lifespan=lifespan)
     app.state.static = static
     app.state.story_builder = story_builder
     app.state.config = config
-    app.state.sessions = {}
+    app.state.sessions = MemoryStore() if sessions is None else sessions
+    app.state.profiler = Profiler(enabled=False) if profiler is None else profiler
+    if story_builder is not None and not isinstance(story_builder, type):
+        # Stories spawned from the template share these objects with it
+        story_builder.profiler = app.state.profiler
+        app.state.sessions.share(
+            assets=story_builder.assets,
+            config=story_builder.config,
+            profiler=story_builder.profiler,
+            world_assets=getattr(story_builder.world, "assets", None),
+        )
     app.state.presenter = presenter()
+    app.state.dispatcher = next(reversed(Dispatcher.__subclasses__()), Dispatcher)(executor)
+
+    if profiler is not None:
+        profiler.gauge("sessions", lambda: len(app.state.sessions), "Number of live sessions.")
+        profiler.gauge(
+            "render_cache_hits_total", lambda: Speech.cache.hits, "Hits on the speech render cache.", "counter"
+        )
+        profiler.gauge(
+            "render_cache_misses_total", lambda: Speech.cache.misses, "Misses on the speech render cache.", "counter"
+        )
+        profiler.gauge("render_cache_ratio", lambda: Speech.cache.ratio, "Hit ratio of the speech render cache.")
 
     return app
 
@@ -530,25 +1029,94 @@ def make_story_builder(story_builder: StoryBuilder | type, assets=None, config=N
     return story_builder
 
 
-def quick_start(
-    module: [str | ModuleType] = "", resource="",
-    story_builder: StoryBuilder | type = None,
-    host="localhost", port=8080,
-    config=None,
+def serve_app(
+    bind: str,
+    assets: Grouping,
+    story_builder: StoryBuilder,
+    static: pathlib.Path = None,
+    watcher: Loader.Watcher = None,
+    elapsed: float = None,
+    ring: Ring = None,
+    node: int = None,
     **kwargs
 ):
-    assets = discover_assets(module, resource)
-    paths = collect_static_paths(assets)
-    story_builder = make_story_builder(story_builder, assets=assets, config=config)
-
+    "Build the app and serve it at a hypercorn bind address, eg: `localhost:8080` or `unix:/tmp/app.sock`."
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
     app = loop.run_until_complete(
         app_factory(
-            assets=assets, story_builder=story_builder, static=paths and min(paths), loop=loop, **kwargs
+            assets=assets, story_builder=story_builder, static=static, loop=loop,
+            watcher=watcher, **kwargs
         )
     )
-    settings = hypercorn.Config.from_mapping({"bind": f"{host}:{port}", "errorlog": "-"})
+    app.state.ring = ring
+    app.state.node = node
+    if elapsed is not None and app.state.profiler.enabled:
+        app.state.profiler.observe("discover", elapsed)
+    settings = hypercorn.Config.from_mapping({"bind": bind, "errorlog": "-"})
 
     loop.run_until_complete(serve(app, settings))
+
+
+def quick_start(
+    module: [str | ModuleType] = "", resource="",
+    story_builder: StoryBuilder | type = None,
+    host="localhost", port=8080,
+    config=None,
+    cache: Loader.Cache = None,
+    watch: bool = False,
+    workers: int = 1,
+    **kwargs
+):
+    """
+    Discover assets, build a story, and serve it.
+
+    With more than one `worker`, each is a separate process with its own sessions.
+    A :py:class:`~balladeer.lite.router.Router` listens at `host` and `port`, and sends every
+    request for a session to the worker which owns it.
+
+    """
+    start = time.perf_counter()
+    assets = discover_assets(module, resource, cache=cache)
+    elapsed = time.perf_counter() - start
+    paths = collect_static_paths(assets)
+    print(f"Discovered {len({i.path for i in assets.all})} files in {elapsed * 1000:.0f} ms", file=sys.stderr)
+    watcher = Loader.Watcher(module, resource) if watch else None
+    story_builder = make_story_builder(story_builder, assets=assets, config=config)
+    static = paths and min(paths)
+
+    try:
+        # Workers inherit the assets and story builder rather than discover them again
+        context = multiprocessing.get_context("fork") if workers > 1 else None
+    except ValueError:
+        warnings.warn("Multiple workers need the 'fork' start method. Serving with one.")
+        context = None
+
+    if context is None:
+        return serve_app(f"{host}:{port}", assets, story_builder, static, watcher, elapsed, **kwargs)
+
+    ring = Ring(range(workers))
+    with tempfile.TemporaryDirectory(prefix="balladeer-") as tmp:
+        sockets = [str(pathlib.Path(tmp).joinpath(f"worker-{n:02d}.sock")) for n in range(workers)]
+        processes = [
+            context.Process(
+                target=serve_app,
+                args=(f"unix:{path}", assets, story_builder, static, watcher, elapsed),
+                kwargs=dict(kwargs, ring=ring, node=n),
+                daemon=True,
+            )
+            for n, path in enumerate(sockets)
+        ]
+        for process in processes:
+            process.start()
+
+        print(f"Routing {host}:{port} to {workers} workers", file=sys.stderr)
+        # Stop the workers and remove their sockets when terminated
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            asyncio.run(Router(sockets, ring).serve(host, port))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
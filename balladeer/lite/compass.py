@@ -19,8 +19,11 @@
 
 import cmath
 from collections import defaultdict
+from collections import deque
 from collections.abc import Generator
+import copy
 import enum
+import heapq
 import itertools
 
 from balladeer.lite.entity import Entity
@@ -108,7 +111,20 @@ class Traffic(State, enum.Enum):
 
 
 class Transit(Entity):
-    pass
+    """
+    An entity which joins one spot on the map to another.
+
+    A transit notifies the map which holds it whenever its state is set,
+    so that the map may discard any routes which depend upon it.
+
+    """
+
+    def set_state(self, *args: tuple[State | int]):
+        rv = super().set_state(*args)
+        map = getattr(self, "_map", None)
+        if map is not None:
+            map.invalidate(self)
+        return rv
 
 
 class MapBuilder:
@@ -146,6 +162,9 @@ class MapBuilder:
        :dedent: 4
 
     """
+    # Maps with no more spots than this have all their routes calculated at once
+    precompute = 64
+
     def __init__(self, spots: dict, config=None, **kwargs):
         self.config = config
         global Into, Home, Spot, Exit
@@ -155,12 +174,90 @@ class MapBuilder:
         self.exit = Exit = enum.Enum("Exit", spots, type=State)
         self.transits = []
         self.routes = {}
+        self.trees = {}
+        self.arcs = {}
+        self.exits = defaultdict(dict)
+        self.indexed = None
         self.make(**kwargs)
 
+    def __getstate__(self):
+        # The arcs are keyed by object id, so a copy must rebuild them
+        return self.__dict__ | dict(arcs={}, exits=defaultdict(dict), indexed=None)
+
     def make(self, **kwargs):
-        self.transits = list(self.build(**kwargs))
+        self.transits = []
+        self.indexed = None
+        self.add(*self.build(**kwargs))
         return self
 
+    def add(self, *transits: tuple[Transit]):
+        "Add transits to the map."
+        current = self.indexed == len(self.transits)
+        for transit in transits:
+            transit._map = self
+            self.transits.append(transit)
+
+        if current:
+            self.reindex(*transits)
+            self.indexed = len(self.transits)
+        self.routes.clear()
+        self.trees.clear()
+        return self
+
+    def invalidate(self, transit: Transit = None):
+        """
+        Discard all routes. This is called whenever a transit changes state.
+        The arcs of that transit are indexed again.
+
+        """
+        self.routes.clear()
+        self.trees.clear()
+        if transit is not None and self.indexed == len(self.transits) and id(transit) in self.arcs:
+            self.reindex(transit)
+        else:
+            self.indexed = None
+
+    def reindex(self, *transits: tuple[Transit]):
+        for transit in transits:
+            for d, c, t, a in self.arcs.pop(id(transit), []):
+                if d is not None:
+                    self.exits[d.name].pop(id(transit), None)
+
+            arcs = self.arcs[id(transit)] = []
+            d = transit.get_state(self.exit)
+            a = transit.get_state(self.into)
+            v = transit.get_state(Traffic)
+            c = transit.get_state(Compass)
+            b = c and c.back
+            if v in (Traffic.flowing, Traffic.forward):
+                arcs.append((d, c, transit, a))
+            if v in (Traffic.flowing, Traffic.reverse):
+                arcs.append((a, b, transit, d))
+
+            for arc in arcs:
+                if arc[0] is not None and arc[-1] is not None:
+                    self.exits[arc[0].name].setdefault(id(transit), []).append(arc)
+
+    def spawn(self, memo: dict = None):
+        """
+        Copy this map from a template for use in a new story.
+        The state types of the map are shared with the original.
+
+        """
+        memo = {} if memo is None else memo
+        try:
+            return memo[id(self)]
+        except KeyError:
+            rv = memo[id(self)] = copy.copy(self)
+
+        rv.transits = [i.spawn(memo) for i in self.transits]
+        rv.routes = {}
+        rv.trees = {}
+        rv.arcs = {}
+        rv.exits = defaultdict(dict)
+        rv.indexed = None
+        return rv
+
     @property
     def topology(self) -> Generator[tuple[State, State, Entity, State]]:
         """
@@ -182,16 +279,10 @@ class MapBuilder:
            (<Into.hall: ['hall', 'hallway']>, <Compass.NE: ['Northeast', 'North East', (1, 1, 0)]>, Transit(names=['kitchen door'], ...) <Exit.kitchen: ['kitchen']>)
 
         """
+        # Bring the index up to date
+        self.adjacency
         for t in self.transits:
-            d = t.get_state(self.exit)
-            a = t.get_state(self.into)
-            v = t.get_state(Traffic)
-            c = t.get_state(Compass)
-            b = c and c.back
-            if v in (Traffic.flowing, Traffic.forward):
-                yield d, c, t, a
-            if v in (Traffic.flowing, Traffic.reverse):
-                yield a, b, t, d
+            yield from self.arcs.get(id(t), [])
 
     def options(self, spot: State) -> set:
         """
@@ -209,12 +300,80 @@ class MapBuilder:
 
         """
         typ = type(spot)
+        arcs = self.adjacency.get(spot.name, {}).values()
         return {
             (c or n, typ[a.name], t)
-            for n, (d, c, t, a) in enumerate(self.topology)
-            if d.name == spot.name
+            for n, (d, c, t, a) in enumerate(arc for group in arcs for arc in group)
         }
 
+    @property
+    def adjacency(self) -> dict[str, dict[int, list[tuple[State, State, Transit, State]]]]:
+        """
+        Returns an index of the arcs which leave each spot on the map.
+        The key is the name of the spot. The value is a dictionary which
+        groups those arcs by the `id` of their transit.
+
+        The index is maintained as transits are added or change state.
+        It is built again if the list of transits is modified directly.
+
+        """
+        if self.indexed != len(self.transits):
+            self.arcs = {}
+            self.exits = defaultdict(dict)
+            self.reindex(*self.transits)
+            self.indexed = len(self.transits)
+            self.routes.clear()
+            self.trees.clear()
+        return self.exits
+
+    def weight(self, transit: Transit) -> float:
+        """
+        Override this method to assign a cost to the passage of a transit.
+        When all transits have the same cost, the shortest route is the one with fewest steps.
+
+        """
+        return 1
+
+    def search(self, origin: str) -> dict[str, str]:
+        """
+        Find the shortest routes from the spot called `origin` to all the others.
+        Returns a dictionary which maps the name of each reachable spot to
+        the name of the one before it.
+
+        """
+        adjacency = self.adjacency
+        rv = {origin: None}
+        if type(self).weight is MapBuilder.weight:
+            # Breadth first
+            queue = deque([origin])
+            while queue:
+                node = queue.popleft()
+                for arcs in adjacency.get(node, {}).values():
+                    for d, c, t, a in arcs:
+                        if a.name not in rv:
+                            rv[a.name] = node
+                            queue.append(a.name)
+            return rv
+
+        # Dijkstra
+        costs = {origin: 0}
+        done = set()
+        n = itertools.count()
+        queue = [(0, next(n), origin)]
+        while queue:
+            cost, _, node = heapq.heappop(queue)
+            if node in done:
+                continue
+            done.add(node)
+            for arcs in adjacency.get(node, {}).values():
+                for d, c, t, a in arcs:
+                    total = cost + self.weight(t)
+                    if a.name not in costs or total < costs[a.name]:
+                        costs[a.name] = total
+                        rv[a.name] = node
+                        heapq.heappush(queue, (total, next(n), a.name))
+        return rv
+
     def route(self, start: State, end: State) -> list[State]:
         """
         Return a list containing the shortest route between the spots `start` and `end`.
@@ -224,35 +383,31 @@ class MapBuilder:
         [<Spot.kitchen: ['kitchen']>,
          <Spot.hall: ['hall', 'hallway']>,
          <Spot.bedroom: ['bedroom']>]
+
+        If there is no route, the list is empty.
+
         """
-        if (start.name, end.name) in self.routes:
+        adjacency = self.adjacency
+        try:
             return self.routes[(start.name, end.name)]
+        except KeyError:
+            pass
+
+        if not self.trees and len(self.spot) <= self.precompute:
+            self.trees = {i.name: self.search(i.name) for i in self.spot}
+
+        try:
+            tree = self.trees[start.name]
+        except KeyError:
+            tree = self.trees[start.name] = self.search(start.name)
+
+        names = []
+        node = end.name if end.name in tree else None
+        while node is not None:
+            names.append(node)
+            node = tree[node]
 
-        rvs = set()
-        paths = [[start.name]]
-
-        graph = defaultdict(set)
-        for d, _, t, a in self.topology:
-            graph[d.name].add(a.name)
-
-        n = len(graph)
-        d = 1
-        while n >= 0 or not rvs:
-            nxt = []
-            for p in paths:
-                if p[-1] == end.name:
-                    rvs.add(tuple(p))
-                else:
-                    nodes = graph[p[-1]]
-                    d = len(nodes)
-                    for i in nodes:
-                        if i not in p:
-                            nxt.append(p.copy())
-                            nxt[-1].append(i)
-            paths = nxt
-            n = n - d
-
-        rv = [type(start)[i] for i in sorted(rvs, key=len)[0]] if rvs else []
+        rv = [type(start)[i] for i in reversed(names)]
         self.routes[(start.name, end.name)] = rv
         return rv
 
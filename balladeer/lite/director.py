@@ -20,9 +20,11 @@
 
 import codecs
 from collections.abc import Generator
-from collections import ChainMap
+from collections.abc import MutableMapping
 from collections import Counter
+from collections import OrderedDict
 from collections import defaultdict
+import copy
 import html
 import itertools
 import pathlib
@@ -54,6 +56,192 @@ class Director:
             else:
                 return super().convert_field(value, conversion)
 
+    class Note(MutableMapping):
+        """
+        The notes on a single cue.
+
+        Entries are layered as they are in a `ChainMap`. Later layers take precedence,
+        and writes go to the latest. Unlike a `ChainMap`, `new_child` appends
+        a layer in place, rather than make a copy of the whole chain.
+
+        """
+
+        __slots__ = ("layers",)
+
+        def __init__(self, *maps: tuple[dict]):
+            # Oldest first, the reverse of ChainMap.maps
+            self.layers = list(reversed(maps)) or [{}]
+
+        @property
+        def maps(self) -> list[dict]:
+            "The layers of the note, latest first, as in a `ChainMap`."
+            return self.layers[::-1]
+
+        def new_child(self, m: dict = None, **kwargs):
+            if m is None:
+                m = kwargs
+            elif kwargs:
+                m.update(kwargs)
+            self.layers.append(m)
+            return self
+
+        def __getitem__(self, key):
+            for m in reversed(self.layers):
+                try:
+                    return m[key]
+                except KeyError:
+                    pass
+            raise KeyError(key)
+
+        def __setitem__(self, key, value):
+            self.layers[-1][key] = value
+
+        def __delitem__(self, key):
+            del self.layers[-1][key]
+
+        def __iter__(self):
+            return iter(dict.fromkeys(k for m in self.layers for k in m))
+
+        def __len__(self):
+            return len(set().union(*self.layers))
+
+        def __contains__(self, key):
+            return any(key in m for m in self.layers)
+
+        def __bool__(self):
+            return any(self.layers)
+
+        def __repr__(self):
+            return f"{self.__class__.__name__}({', '.join(map(repr, self.maps))})"
+
+        def get(self, key, default=None):
+            for m in reversed(self.layers):
+                if key in m:
+                    return m[key]
+            return default
+
+        def copy(self):
+            maps = self.maps
+            return self.__class__(maps[0].copy(), *maps[1:])
+
+    class Notes(dict):
+        """
+        The notes of a turn, as a log of :py:class:`Director.Note` objects in the order of their cues.
+        A lookup of a new key appends a fresh Note.
+
+        The `cursor` is the key of the latest cue, so the current Note is always to hand.
+
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.cursor = next(reversed(self), None)
+
+        def __missing__(self, key):
+            rv = self[key] = Director.Note()
+            return rv
+
+        def __setitem__(self, key, value):
+            if key not in self:
+                self.cursor = key
+            super().__setitem__(key, value)
+
+        def __delitem__(self, key):
+            super().__delitem__(key)
+            self.cursor = next(reversed(self), None)
+
+        @property
+        def current(self) -> "Director.Note":
+            return self[self.cursor]
+
+        def update(self, *args, **kwargs):
+            super().update(*args, **kwargs)
+            self.cursor = next(reversed(self), None)
+
+        def clear(self):
+            super().clear()
+            self.cursor = None
+
+        def copy(self):
+            return self.__class__(self)
+
+    class Casting:
+        """
+        An index of entities by type, class name, state and boolean attribute.
+
+        Entities are referred to by their position in the ensemble.
+        Selecting candidates for a role is a matter of set intersections.
+
+        The index is built for one turn, and serves every scene considered during it.
+        It does not follow changes of state, so make a new one for each turn.
+
+        """
+
+        def __init__(self, ensemble: list[Entity] = []):
+            self.entities = []
+            self.index = {}
+            self.types = defaultdict(set)
+            self.classes = defaultdict(set)
+            self.states = defaultdict(set)
+            self.attributes = {}
+            for entity in ensemble:
+                self.add(entity)
+
+        @property
+        def everyone(self) -> set[int]:
+            return set(self.index.values())
+
+        def postings(self, entity: Entity) -> Generator[tuple[defaultdict, object]]:
+            for typ in entity.types:
+                yield self.types, typ
+            yield self.classes, entity.__class__.__name__
+            for k, v in entity.states.items():
+                yield self.states, (k, getattr(v, "name", v))
+
+        def add(self, entity: Entity) -> int:
+            if entity in self.index:
+                return self.index[entity]
+
+            n = self.index[entity] = len(self.entities)
+            self.entities.append(entity)
+            for table, key in self.postings(entity):
+                try:
+                    table[key].add(n)
+                except TypeError:
+                    # Unhashable state value
+                    continue
+            self.attributes.clear()
+            return n
+
+        def attribute(self, name: str, value: bool) -> set[int]:
+            try:
+                return self.attributes[(name, value)]
+            except KeyError:
+                rv = self.attributes[(name, value)] = {
+                    n for entity, n in self.index.items()
+                    if bool(getattr(entity, name, not value)) == value
+                }
+                return rv
+
+        def select(self, types: set, states: dict, attributes: dict) -> set[int]:
+            if types:
+                rv = set.intersection(*(self.types.get(i, set()) for i in types))
+                rv.update(*(self.classes.get(i, set()) for i in types))
+            else:
+                rv = self.everyone
+
+            for k, values in states.items():
+                if not rv:
+                    break
+                rv &= set().union(*(self.states.get((k, v), set()) for v in values))
+
+            for k, v in attributes.items():
+                if not rv:
+                    break
+                rv &= self.attribute(k, v)
+
+            return rv
+
     @staticmethod
     def express_frustration(e: Exception, **kwargs):
         data = dict(
@@ -90,6 +278,9 @@ class Director:
 
         return roles, states, types, attributes
 
+    # The number of scenes whose role specifications are kept
+    rankings_size = 256
+
     def __init__(
         self,
         shot_key: str = "_",
@@ -102,7 +293,7 @@ class Director:
     ):
         self.fmtr = self.Formatter()
         self.counts = Counter()
-        self.notes = defaultdict(ChainMap)
+        self.notes = self.Notes()
 
         self.shot_key = shot_key
         self.dialogue_key = dialogue_key
@@ -113,24 +304,29 @@ class Director:
 
         self.cast = None
         self.role = None
+        self.rankings = OrderedDict()
 
         self.safe_chars = set(string.ascii_letters + string.digits + "-")
-        self.bq_matcher = re.compile("<blockquote.*?<\\/blockquote>", re.DOTALL)
-        self.tag_matcher = re.compile("<[^>]+?>")
-        self.cite_matcher = re.compile(
-            """
-            (?P<head><cite.*?data-role=")   # Up until role attribute
-            (?P<role>[^"]+?)                # Role attribute
-            (?P<tail>"[^>]*?)               # Until end of opening tag
-            >                               # Close opening tag
-            .*?</cite>                      # Text and closing tag
-            """,
-            re.VERBOSE,
-        )
-        self.attr_matcher = re.compile('data-([^=]+)=[^"]*"([^"]*)"')
+        self.bq_matcher = Speech.bq_matcher
+        self.tag_matcher = Speech.tag_matcher
+        self.cite_matcher = Speech.cite_matcher
+        self.attr_matcher = Speech.attr_matcher
         self.ul_matcher = re.compile("<ul>.*?<\\/ul>", re.DOTALL)
         self.li_matcher = re.compile("<li>.*?<\\/li>", re.DOTALL)
-        self.pp_matcher = re.compile("<p>(.*?)<\\/p>", re.DOTALL)
+        self.pp_matcher = Speech.pp_matcher
+
+    def __getstate__(self):
+        # Scene rankings are keyed by object id, and shared between spawned directors
+        return self.__dict__ | dict(rankings=OrderedDict())
+
+    def spawn(self):
+        "Create a fresh director with the same settings, for use in a new story."
+        rv = copy.copy(self)
+        rv.counts = Counter()
+        rv.notes = self.Notes()
+        rv.cast = None
+        rv.role = None
+        return rv
 
     def attributes(self, text: str) -> dict[str, str]:
         return dict(self.attr_matcher.findall(text))
@@ -222,8 +418,8 @@ class Director:
 
         return html5
 
-    def rank_constraints(self, spec: dict) -> int:
-        roles, states, types, attributes = self.specify_role(spec)
+    def rank_constraints(self, spec: dict | tuple) -> int:
+        roles, states, types, attributes = spec if isinstance(spec, tuple) else self.specify_role(spec)
         return sum(1 / len(v) for v in states.values()) + len(types) + len(roles) + len(attributes)
 
     def edit(
@@ -235,29 +431,16 @@ class Director:
         cue_offset: int = 0,
     ) -> Generator[str]:
         self.cast = roles.copy()
-        for cue_index, block in enumerate(self.bq_matcher.findall(speech.tags)):
+        for cue_index, cue in enumerate(speech.cues):
             cue_index += cue_offset
             self.notes[(path, shot_id, cue_index)] = self.notes[(path, shot_id, cue_index)].new_child(
                 pause=self.pause, duration=self.dwell, delay=self.delay
             )
 
-            html5 = self.cite_matcher.sub(self.edit_cite, block)
-
-            attrs = self.attributes(html5)
-
-            parameters = self.parameters(attrs)
-            html5 = self.handle_parameters(html5, parameters, path, shot_id, cue_index)
-
-            fragments = self.fragments(attrs)
-            html5 = self.handle_fragments(html5, fragments, path, shot_id, cue_index)
-
-            mode = self.mode(attrs)
-            html5 = self.handle_mode(html5, mode, path, shot_id, cue_index)
-
-            directives = self.directives(attrs)
-            html5 = self.handle_directives(html5, directives, path, shot_id, cue_index)
-
-            html5 = self.pp_matcher.sub(self.edit_para, html5)
+            if cue.pieces is None or self.fragments(cue.attrs).endswith("!"):
+                html5 = self.edit_block(cue.block, path, shot_id, cue_index)
+            else:
+                html5 = self.edit_cue(cue, path, shot_id, cue_index)
 
             try:
                 yield self.fmtr.format(html5, **self.cast)
@@ -267,43 +450,88 @@ class Director:
                     speech=speech, roles=roles,
                     path=path, shot_id=shot_id,
                     cue_offset=cue_offset, cue_index=cue_index,
-                    block=block
+                    block=cue.block
                 )
 
-    def edit_cite(self, match: re.Match) -> str:
-        key = list(self.notes)[-1]
+    def edit_block(self, block: str, path: pathlib.Path | str, shot_id: int, cue_index: int) -> str:
+        html5 = self.cite_matcher.sub(self.edit_cite, block)
+
+        attrs = self.attributes(html5)
+
+        parameters = self.parameters(attrs)
+        html5 = self.handle_parameters(html5, parameters, path, shot_id, cue_index)
+
+        fragments = self.fragments(attrs)
+        html5 = self.handle_fragments(html5, fragments, path, shot_id, cue_index)
+
+        mode = self.mode(attrs)
+        html5 = self.handle_mode(html5, mode, path, shot_id, cue_index)
+
+        directives = self.directives(attrs)
+        html5 = self.handle_directives(html5, directives, path, shot_id, cue_index)
+
+        return self.pp_matcher.sub(self.edit_para, html5)
+
+    def edit_cue(self, cue: Speech.Cue, path: pathlib.Path | str, shot_id: int, cue_index: int) -> str:
+        """
+        Edit a precompiled cue. The result is the same as that of `edit_block`,
+        without the need to search the markup.
+
+        """
+        key = self.notes.cursor
+        pieces = list(cue.pieces)
+        for n, piece in enumerate(pieces):
+            if isinstance(piece, tuple) and piece[0] == "cite":
+                pieces[n] = self.cite(key, *piece[1:])
+
+        parameters = self.parameters(cue.attrs)
+        pieces[0] = self.handle_parameters(pieces[0], parameters, path, shot_id, cue_index)
+
+        fragments = self.fragments(cue.attrs)
+        self.handle_fragments("", fragments, path, shot_id, cue_index)
+
+        mode = self.mode(cue.attrs)
+        self.handle_mode("", mode, path, shot_id, cue_index)
+
+        directives = self.directives(cue.attrs)
+        self.handle_directives("", directives, path, shot_id, cue_index)
+
+        for n, piece in enumerate(pieces):
+            if isinstance(piece, tuple):
+                pieces[n] = self.para(key, *piece[1:])
+
+        return "".join(pieces)
+
+    def cite(self, key: tuple, text: str, head: str, role: str, tail: str) -> str:
         self.notes[key]["type"] = "cue"
-        head, self.role, tail = [match.group(i) for i in ("head", "role", "tail")]
+        self.role = role
         try:
             entity = self.cast[self.role]
         except KeyError:
-            return match.group()
+            return text
 
         # TODO: New child for notes.
         delay = self.delay + self.pause
         try:
             attr = f'" data-entity="{entity.names[0]}'
-            text = entity.names[0].translate(Speech.processor.escape_table)
+            name = entity.names[0].translate(Speech.processor.escape_table)
             self.notes[key]["entity"] = entity
             self.notes[key]["role"] = self.role
             return (
                 f'{head}{self.role}{attr}{tail} style="animation-delay: {delay:.2f}s;'
-                f' animation-duration: {self.dwell:.2f}s">{text}</cite>'
+                f' animation-duration: {self.dwell:.2f}s">{name}</cite>'
             )
         except IndexError:
-            return match.group()
+            return text
 
-    def edit_para(self, match: re.Match) -> str:
-        content = match.group(1).strip()
+    def para(self, key: tuple, content: str, words: int) -> str:
         if not content:
             return ""
 
-        words = Speech(content).words
         delay = self.delay + self.pause
-        duration = self.dwell * len(words)
+        duration = self.dwell * words
         self.delay = delay + duration
 
-        key = list(self.notes)[-1]
         self.notes[key] = self.notes[key].new_child(
             pause=self.pause, duration=duration, delay=self.delay
         )
@@ -312,46 +540,71 @@ class Director:
             f' {duration:.2f}s">{content}</p>'
         )
 
-    def roles(self, specs: dict, ensemble: list[Entity]) -> dict[str, Entity]:
-        specs = dict(
-            sorted(specs.items(), key=lambda x: self.rank_constraints(x[1]), reverse=True)
+    def edit_cite(self, match: re.Match) -> str:
+        key = self.notes.cursor
+        return self.cite(key, match.group(), *match.group("head", "role", "tail"))
+
+    def edit_para(self, match: re.Match) -> str:
+        content = match.group(1).strip()
+        words = Speech(content).words if content else []
+        key = self.notes.cursor
+        return self.para(key, content, len(words))
+
+    def ranking(self, specs: dict) -> list[tuple[str, tuple[set, set, dict, dict]]]:
+        return sorted(
+            ((role, self.specify_role(spec)) for role, spec in specs.items()),
+            key=lambda x: self.rank_constraints(x[1]),
+            reverse=True
         )
-        pool = {i: set(specs.keys()) for i in ensemble}
-        for role, spec in specs.items():
-            roles, states, types, attributes = self.specify_role(spec)
-            try:
-                entity = next(
-                    entity
-                    for entity, jobs in pool.items()
-                    if role in jobs
-                    and (
-                        not types
-                        or entity.types.issuperset(types)
-                        or entity.__class__.__name__ in types
-                    )
-                    and all(
-                        k in entity.states
-                        and getattr(entity.get_state(k), "name", entity.get_state(k)) in v
-                        for k, v in states.items()
-                    )
-                    and all(
-                        bool(getattr(entity, k, not v)) == v
-                        for k, v in attributes.items()
-                    )
-                )
-            except StopIteration:
-                continue
-            else:
-                pool[entity] = roles
-                yield role, entity
+
+    def roles(
+        self, specs: dict, ensemble: list[Entity], casting: Casting = None, ranking: list = None
+    ) -> Generator[tuple[str, Entity]]:
+        casting = casting or self.Casting(ensemble)
+        ranking = self.ranking(specs) if ranking is None else ranking
+        pool = {}
+        for role, (roles, states, types, attributes) in ranking:
+            candidates = casting.select(types, states, attributes)
+            n = min((i for i in candidates if role in pool.get(i, specs)), default=None)
+            if n is not None:
+                pool[n] = roles
+                yield role, casting.entities[n]
 
     def specifications(self, toml: dict):
         return {k: v for k, v in toml.items() if isinstance(v, dict) and k != self.shot_key}
 
+    def specify_scene(self, scene: Loader.Scene) -> tuple[dict, list]:
+        """
+        Return the role specifications of a scene, and their ranking.
+        These are cached for the `rankings_size` scenes most recently used.
+
+        """
+        key = id(scene.tables)
+        try:
+            tables, specs, ranking = self.rankings[key]
+            if tables is scene.tables:
+                self.rankings.move_to_end(key)
+                return specs, ranking
+        except KeyError:
+            # Missing, or evicted by another thread
+            pass
+
+        specs = self.specifications(scene.tables)
+        ranking = self.ranking(specs)
+        self.rankings[key] = (scene.tables, specs, ranking)
+        try:
+            self.rankings.move_to_end(key)
+            while len(self.rankings) > self.rankings_size:
+                self.rankings.popitem(last=False)
+        except KeyError:
+            pass
+        return specs, ranking
+
     def selection(self, scripts, ensemble: list[Entity] = []):
+        casting = self.Casting(ensemble)
         for scene in scripts:
-            specs = self.specifications(scene.tables)
-            roles = dict(self.roles(specs, ensemble))
+            specs, ranking = self.specify_scene(scene)
+            roles = dict(self.roles(specs, ensemble, casting=casting, ranking=ranking))
             if len(specs) and len(roles) == len(specs):
                 return scene, specs, roles
         else:
@@ -394,7 +647,12 @@ class Director:
             conditions = dict(self.specify_conditions(shot))
             if self.allows(conditions, roles):
                 text = shot.get(self.dialogue_key, "")
-                yield n, Dialogue(text)
+                rv = Dialogue(text)
+                try:
+                    rv.cues = scene.cues[text]
+                except (KeyError, TypeError):
+                    pass
+                yield n, rv
 
     def rewrite(
         self,
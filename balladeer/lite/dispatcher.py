@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+from collections import Counter
+from collections import OrderedDict
+from collections.abc import Callable
+from collections.abc import Hashable
+from concurrent.futures import Executor
+import contextlib
+import functools
+import uuid
+
+from balladeer.lite.store import SessionStore
+
+
+class Dispatcher:
+    """
+    Runs the turns of each session.
+
+    By default a turn runs on the event loop, as part of the request which causes it.
+    Given an `executor`, turns run there instead, so that one slow turn does not hold up
+    every other session.
+
+    Either way, the turns of one session run one at a time, in the order they were requested.
+    No more than `limit` of them may wait at once. Beyond that, :py:class:`Dispatcher.Busy` is raised.
+
+    A request may carry a `key`. While a request of the same key is waiting or running,
+    another one does not run again, but shares its result. That takes care of double clicks.
+    A request may also ask for its result to be remembered. The results of the last `memory`
+    such keys to complete are kept, so that a request which is sent again after its first
+    has finished gets the same result, and does not run again.
+
+    :param executor:    A `concurrent.futures.ThreadPoolExecutor`, or `None`.
+                        Turns need the request and the session store, so they cannot be sent
+                        to another process.
+
+    """
+
+    class Busy(Exception):
+        "Raised when a session has too many turns waiting."
+
+    limit = 8
+    memory = 256
+
+    def __init__(self, executor: Executor = None):
+        self.executor = executor
+        self.locks = {}
+        self.pending = Counter()
+        self.inflight = {}
+        self.completed = OrderedDict()
+
+    @contextlib.asynccontextmanager
+    async def session(self, session_id: uuid.UUID | str):
+        "Hold the lock of a session. It is discarded when nothing else is waiting for it."
+        key = SessionStore.key(session_id)
+        if self.limit and self.pending[key] >= self.limit:
+            raise self.Busy(f"Session {key} has {self.pending[key]} turns waiting")
+
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self.pending[key] += 1
+        try:
+            async with lock:
+                yield lock
+        finally:
+            self.pending[key] -= 1
+            if not self.pending[key]:
+                del self.pending[key]
+                del self.locks[key]
+
+    async def dispatch(self, session_id: uuid.UUID | str, fn: Callable, *args, **kwargs):
+        async with self.session(session_id):
+            if self.executor is None:
+                return fn(*args, **kwargs)
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def run(
+        self, session_id: uuid.UUID | str, fn: Callable, *args,
+        key: Hashable = None, remember: bool = False, **kwargs
+    ):
+        "Call `fn` with the lock of the session held, and return its result."
+        if key is None:
+            return await self.dispatch(session_id, fn, *args, **kwargs)
+
+        key = (SessionStore.key(session_id), key)
+        try:
+            self.completed.move_to_end(key)
+            return self.completed[key]
+        except KeyError:
+            pass
+
+        future = self.inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self.inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            rv = await self.dispatch(session_id, fn, *args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it as retrieved, in case no other request is waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(rv)
+            if remember:
+                self.completed[key] = rv
+                while len(self.completed) > self.memory:
+                    self.completed.popitem(last=False)
+            return rv
+        finally:
+            del self.inflight[key]
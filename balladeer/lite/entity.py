@@ -17,11 +17,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from collections import OrderedDict
+import copy
 import dataclasses
 import enum
+import functools
 import json
+import os
 import random
 import re
+import sys
+import threading
 from typing import Type
 import uuid
 
@@ -121,6 +127,28 @@ class Entity:
             aspect=self.aspect,
         )
 
+    def spawn(self, memo: dict = None):
+        """
+        Copy this entity from a template for use in a new story.
+
+        Unlike `deepcopy`, the copy keeps the `uid` of the original so that links remain valid.
+        Containers of state are copied, and strings are shared. Any other attributes are deep-copied
+        with `memo`, so that references to objects already spawned resolve to their copies.
+
+        """
+        memo = {} if memo is None else memo
+        try:
+            return memo[id(self)]
+        except KeyError:
+            rv = memo[id(self)] = copy.copy(self)
+
+        for k, v in vars(self).items():
+            if isinstance(v, (list, set, dict)) and k in ("names", "types", "states", "links"):
+                setattr(rv, k, v.copy())
+            elif not isinstance(v, (str, int, float, uuid.UUID, enum.Enum)):
+                setattr(rv, k, copy.deepcopy(v, memo))
+        return rv
+
     def __eq__(self, other):
         if not self.names:
             return self.uid == other.uid
@@ -131,15 +159,87 @@ class Entity:
             return False
 
     class Encoder(json.JSONEncoder):
+        """
+        Encodes entities as JSON objects.
+
+        The `fragment` method returns the JSON text of a single entity. Fragments are held
+        in a bounded cache, keyed by every value they are made from, so an entity is encoded
+        again only when it has changed.
+
+        """
+
+        fragments = OrderedDict()
+        maxsize = 65536
+        lock = threading.Lock()
+
+        @staticmethod
+        @functools.cache
+        def field_names(cls) -> tuple[str]:
+            return tuple(f.name for f in dataclasses.fields(cls))
+
+        @staticmethod
+        @functools.cache
+        def extra_fields(cls) -> tuple[str]:
+            "Return the names of any fields which a subclass adds to those of Entity."
+            return tuple(i for i in Entity.Encoder.field_names(cls) if i not in Entity.Encoder.field_names(Entity))
+
+        @classmethod
+        def fingerprint(cls, obj) -> tuple:
+            rv = (
+                obj.__class__, tuple(obj.names), tuple(obj.types), tuple(obj.states.items()),
+                obj.uid, tuple(obj.links), obj.sketch, obj.aspect, obj.revert
+            )
+            extra = cls.extra_fields(obj.__class__)
+            if extra:
+                rv += tuple(
+                    tuple(v.items()) if isinstance(v, dict) else tuple(v) if isinstance(v, (list, set)) else v
+                    for v in (getattr(obj, i) for i in extra)
+                )
+            return rv
+
+        def data(self, obj) -> dict:
+            "Return the fields of an entity without the deep copy made by `dataclasses.asdict`."
+            rv = {}
+            for name in self.field_names(type(obj)):
+                value = getattr(obj, name)
+                if name == "uid":
+                    value = str(value)
+                elif name == "types":
+                    value = sorted(value)
+                elif name == "links":
+                    value = sorted(str(i) for i in value)
+                elif isinstance(value, (list, dict)):
+                    value = value.copy()
+                elif dataclasses.is_dataclass(value):
+                    value = dataclasses.asdict(value)
+                rv[name] = value
+            return rv
+
         def default(self, obj):
             if isinstance(obj, enum.Enum):
                 return {"name": obj.name, "value": obj.value}
+            elif dataclasses.is_dataclass(obj):
+                return self.data(obj)
+            return super().default(obj)
 
-            data = dataclasses.asdict(obj)
-            data["uid"] = str(data["uid"])
-            data["types"] = sorted(data.get("types", []))
-            data["links"] = sorted((str(i) for i in data.get("links", [])))
-            return data
+        def fragment(self, obj) -> str:
+            "Return the JSON text of an entity."
+            try:
+                key = self.fingerprint(obj)
+                return self.fragments[key]
+            except (AttributeError, TypeError):
+                # Not an entity, or some field is unhashable
+                return self.encode(obj)
+            except KeyError:
+                pass
+
+            rv = self.encode(obj)
+            with self.lock:
+                self.fragments[key] = rv
+                while len(self.fragments) > self.maxsize:
+                    # Discard the oldest
+                    self.fragments.popitem(last=False)
+            return rv
 
     @property
     def name(self) -> str:
@@ -175,9 +275,16 @@ class Entity:
 
         >>> entity = Entity().set_state(Politics.ind, 12)
 
+        An entity which belongs to a :py:class:`~balladeer.lite.world.WorldBuilder`
+        reports the change so the world can update its indexes.
+
         """
         for arg in args:
             self.states[type(arg).__name__] = arg
+
+        world = getattr(self, "_world", None)
+        if world is not None:
+            world.reindex(self)
         return self
 
     def get_state(self, typ: State | str = int):
@@ -235,3 +342,106 @@ class Entity:
             value = kwargs.get(attr)
             if isinstance(value, str):
                 setattr(self, attr, value)
+
+
+class CompactEntity(Entity):
+    """
+    A variant of :py:class:`Entity` for very large worlds.
+
+    The attributes of Entity are held in slots. Entity itself is not slotted, so an instance
+    may still take other attributes. Their dictionary is created only when the first one is set.
+    Names and types are interned, and instances share a single empty Speech object.
+    The `states` and `links` containers are created only when first used.
+    The `uid` is generated only when needed, and without a call to the operating system.
+
+    >>> CompactEntity(name="Chuck", type="Squirrel").set_state(12)
+    CompactEntity(names=['Chuck'], types={'Squirrel'}, states={'int': 12}, uid=UUID('0b4c6d7e-5f3a-4e21-9a8b-7c6d5e4f3a2b'), links=set(), sketch='', aspect='', revert='')
+
+    It is otherwise interchangeable with :py:class:`Entity`.
+
+    """
+
+    __slots__ = (
+        "names", "types", "_states", "_uid", "_links", "sketch", "aspect", "revert", "_world", "_map"
+    )
+
+    blank = Speech()
+    generator = random.Random()
+
+    def __init__(
+        self, *, name: str = "", names: list = None, type: str = "", types: set = None,
+        states: dict = None, uid: uuid.UUID = None, links: set = None,
+        sketch: Speech = blank, aspect: Speech = blank, revert: Speech = blank,
+    ):
+        self.names = [sys.intern(i) for i in names or []]
+        self.types = {sys.intern(i) for i in types or []}
+        self._states = states
+        self._uid = uid
+        self._links = links
+        self.sketch = sketch
+        self.aspect = aspect
+        self.revert = revert
+        self.__post_init__(name and sys.intern(name), type and sys.intern(getattr(type, "__name__", type)))
+
+    @property
+    def states(self) -> dict:
+        if self._states is None:
+            self._states = {}
+        return self._states
+
+    @states.setter
+    def states(self, value: dict):
+        self._states = value
+
+    @property
+    def links(self) -> set:
+        if self._links is None:
+            self._links = set()
+        return self._links
+
+    @links.setter
+    def links(self, value: set):
+        self._links = value
+
+    @property
+    def uid(self) -> uuid.UUID:
+        if self._uid is None:
+            self._uid = uuid.UUID(int=self.generator.getrandbits(128), version=4)
+        return self._uid
+
+    @uid.setter
+    def uid(self, value: uuid.UUID):
+        self._uid = value
+
+    def __getstate__(self):
+        # Copies and pickles must share the uid of the original
+        self.uid
+        return super().__getstate__()
+
+    def spawn(self, memo: dict = None):
+        memo = {} if memo is None else memo
+        try:
+            return memo[id(self)]
+        except KeyError:
+            rv = memo[id(self)] = copy.copy(self)
+
+        for k in ("names", "types", "_states", "_links"):
+            v = getattr(rv, k)
+            if v is not None:
+                setattr(rv, k, v.copy())
+
+        for k in ("_world", "_map"):
+            try:
+                setattr(rv, k, copy.deepcopy(getattr(self, k), memo))
+            except AttributeError:
+                continue
+        return rv
+
+    def get_state(self, typ: State | str = int):
+        if self._states is None:
+            return None
+        return super().get_state(typ)
+
+
+# A forked process must not generate the same uids as its parent
+os.register_at_fork(after_in_child=CompactEntity.generator.seed)
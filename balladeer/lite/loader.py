@@ -17,15 +17,28 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
 from collections import namedtuple
+from collections.abc import Callable
+from collections.abc import Generator
+from concurrent.futures import Executor
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import importlib.resources
 from importlib.resources import Package
 import mimetypes
+import operator
+import os
 from pathlib import Path
+import pickle
 import re
+import time
 import tomllib
 from typing import Mapping
+import warnings
 
+from balladeer.lite.speech import Dialogue
+from balladeer.lite.speech import Speech
 from balladeer.lite.types import Grouping
 from busker.stager import Stager
 
@@ -34,26 +47,176 @@ class Loader:
     Asset = namedtuple("Asset", ["resource", "path", "type", "stats"], defaults=[None, None])
     Scene = namedtuple(
         "Scene",
-        ["text", "tables", "resource", "path", "stats"],
-        defaults=[None, None, None],
+        ["text", "tables", "resource", "path", "stats", "cues"],
+        defaults=[None, None, None, None],
     )
     Storage = namedtuple("Storage", ["resource", "path", "stats"], defaults=[None])
     Staging = namedtuple("Staging", ["text", "data", "resource", "path", "stats"], defaults=[None, None, None])
     Structure = namedtuple("Structure", ["text", "data", "resource", "path", "stats"], defaults=[None, None, None])
 
+    # Qualified names permit pickling of stories which hold assets
+    for typ in (Asset, Scene, Storage, Staging, Structure):
+        typ.__qualname__ = f"Loader.{typ.__name__}"
+    del typ
+
+    class Cache:
+        """
+        A persistent store of parsed assets, kept in a pickle file.
+
+        Entries are keyed by path. They are valid while the size and modification time
+        of the file remain the same.
+
+        """
+
+        version = 2
+
+        def __init__(self, path: Path = None):
+            self.path = path and Path(path)
+            self.items = {}
+            self.changed = False
+            try:
+                with open(path, "rb") as f:
+                    version, items = pickle.load(f)
+                if version == self.version:
+                    self.items = items
+            except Exception:
+                # Missing, corrupt, or written by another version
+                pass
+
+        @staticmethod
+        def key(path: Path, resource: str, precompile: bool) -> tuple:
+            return (str(path), resource, precompile)
+
+        def get(self, key: tuple, stats: os.stat_result) -> list | None:
+            try:
+                mtime, size, items = self.items[key]
+            except KeyError:
+                return None
+            return items if (mtime, size) == (stats.st_mtime_ns, stats.st_size) else None
+
+        def put(self, key: tuple, stats: os.stat_result, items: list):
+            self.items[key] = (stats.st_mtime_ns, stats.st_size, items)
+            self.changed = True
+
+        def save(self):
+            if not (self.path and self.changed):
+                return
+
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            try:
+                with open(tmp, "wb") as f:
+                    pickle.dump((self.version, self.items), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.path)
+                self.changed = False
+            except OSError:
+                tmp.unlink(missing_ok=True)
+
+    class Watcher:
+        """
+        Polls a package or directory for files which have been added, changed or removed.
+
+        Changed files are parsed again by :py:meth:`Loader.load`, and the results
+        swapped into Groupings of assets. Each list in a Grouping is replaced rather than
+        modified, so a turn already in progress sees either the old assets or the new.
+
+        """
+
+        def __init__(self, package: [Package | Path | str], resource=".", interval: float = 1.0, **kwargs):
+            if isinstance(package, str):
+                path = Path(package)
+                package = path.parent if path.is_file() else path
+            self.package = package
+            self.resource = resource
+            self.interval = interval
+            self.kwargs = kwargs
+            self.snapshot = self.scan()
+
+        def scan(self) -> dict[Path, tuple[int, int]]:
+            "Return the modification time and size of each file."
+            kwargs = {k: v for k, v in self.kwargs.items() if k in ("avoid", "ignore")}
+            rv = {}
+            for path in Loader.walk(self.package, self.resource, **kwargs):
+                try:
+                    with importlib.resources.as_file(path) as f:
+                        stats = f.stat()
+                except OSError:
+                    continue
+                rv[path] = (stats.st_mtime_ns, stats.st_size)
+            return rv
+
+        def changes(self) -> tuple[set[Path], list]:
+            """
+            Return the paths which have changed since the last scan, and the new assets of those files.
+            A file which cannot be parsed keeps its old assets, and is tried again on the next scan.
+
+            """
+            kwargs = {k: v for k, v in self.kwargs.items() if k in ("suffixes", "precompile")}
+            snapshot = self.scan()
+            paths = {i for i in snapshot.keys() | self.snapshot.keys() if snapshot.get(i) != self.snapshot.get(i)}
+            items = []
+            for path in sorted(paths & snapshot.keys()):
+                try:
+                    items.extend(Loader.load(path, self.resource, **kwargs))
+                except Exception as e:
+                    warnings.warn(f"In file {path}: {e!s}")
+                    paths.discard(path)
+                    snapshot[path] = self.snapshot.get(path)
+
+            self.snapshot = {k: v for k, v in snapshot.items() if v is not None}
+            return paths, items
+
+        @staticmethod
+        def swap(grouping: Grouping, paths: set[Path], items: list) -> Grouping:
+            "Replace the assets of `paths` in a Grouping with `items`."
+            update = Grouping.typewise(items)
+            for key in set(grouping) | set(update):
+                old = grouping.get(key, [])
+                if key not in update and not any(i.path in paths for i in old):
+                    continue
+
+                grouping[key] = sorted(
+                    [i for i in old if i.path not in paths] + update.get(key, []),
+                    key=operator.attrgetter("path"),
+                )
+            return grouping
+
+        async def run(self, *groupings: tuple[Grouping], callback: Callable = None, profiler=None):
+            """
+            Poll for changes until cancelled.
+
+            Files are scanned and parsed in a thread. Groupings are updated on the event loop,
+            after which `callback` is called with the changed paths and their new assets.
+
+            """
+            while True:
+                await asyncio.sleep(self.interval)
+                start = time.perf_counter()
+                paths, items = await asyncio.to_thread(self.changes)
+                if not paths:
+                    continue
+
+                for grouping in groupings:
+                    self.swap(grouping, paths, items)
+                if callback is not None:
+                    callback(paths, items)
+                if profiler is not None and profiler.enabled:
+                    profiler.observe("reload", time.perf_counter() - start)
+
+    suffixes = {
+        ".db": Storage,
+        ".scene.toml": Scene,
+        ".stage.toml": Staging,
+        ".toml": Structure,
+    }
+
     @staticmethod
-    def discover(
+    def walk(
         package: [Package | Path],
         resource=".",
-        suffixes={
-            ".db": Storage,
-            ".scene.toml": Scene,
-            ".stage.toml": Staging,
-            ".toml": Structure,
-        },
         avoid=["tmp", "__pycache__", "node_modules"],
         ignore=[re.compile("^test_.*")],
-    ):
+    ) -> Generator[Path]:
+        "Generate the paths of all files in a package or directory."
         if isinstance(package, Path):
             paths = list(package.iterdir()) if package.is_dir() else [package]
         else:
@@ -63,29 +226,111 @@ class Loader:
             if path.is_dir() and path.name in avoid:
                 continue
             elif path.is_dir():
-                yield from Loader.discover(path, resource, suffixes, avoid, ignore)
+                yield from Loader.walk(path, resource, avoid, ignore)
             elif any(i.match(path.name) for i in ignore):
                 continue
+            else:
+                yield path
 
+    @staticmethod
+    def load(path: Path, resource=".", suffixes: dict = None, precompile=False) -> list:
+        "Return the assets of a single file."
+        suffixes = Loader.suffixes if suffixes is None else suffixes
+        rv = []
+        with importlib.resources.as_file(path) as f:
+            stats = f.stat()
             typ, _ = mimetypes.guess_type(path)
             if typ and typ != "text/x-python":
-                with importlib.resources.as_file(path) as f:
-                    yield Loader.Asset(resource, path, typ, f.stat())
+                rv.append(Loader.Asset(resource, path, typ, stats))
 
             typ = suffixes.get("".join(path.suffixes))
-            if typ in (Loader.Scene, Loader.Structure):
-                with importlib.resources.as_file(path) as f:
-                    text = f.read_text(encoding="utf8")
-                    data = Loader.read_toml(text)
-                    yield typ(text, data, resource, path, f.stat())
+            if typ == Loader.Scene and precompile:
+                text = f.read_text(encoding="utf8")
+                data = Loader.read_toml(text)
+                rv.append(typ(text, data, resource, path, stats, Loader.compile_cues(data)))
+            elif typ in (Loader.Scene, Loader.Structure):
+                text = f.read_text(encoding="utf8")
+                data = Loader.read_toml(text)
+                rv.append(typ(text, data, resource, path, stats))
             elif typ == Loader.Staging:
-                with importlib.resources.as_file(path) as f:
-                    text = f.read_text(encoding="utf8")
-                    data = next(Stager.load(text))  # TODO: new signature
-                    yield typ(text, data, resource, path, f.stat())
+                text = f.read_text(encoding="utf8")
+                data = next(Stager.load(text))  # TODO: new signature
+                rv.append(typ(text, data, resource, path, stats))
             elif typ:
+                rv.append(typ(resource, path, stats))
+        return rv
+
+    @staticmethod
+    def discover(
+        package: [Package | Path],
+        resource=".",
+        suffixes=None,
+        avoid=["tmp", "__pycache__", "node_modules"],
+        ignore=[re.compile("^test_.*")],
+        precompile=False,
+        workers: int = 0,
+        pool: type[Executor] = ThreadPoolExecutor,
+        cache: Cache = None,
+    ):
+        """
+        Generate the assets of a package or directory.
+
+        When `precompile` is set, the dialogue of each Scene is parsed ahead of time.
+        The `cues` attribute of those scenes maps the dialogue text of each shot to its list of
+        :py:class:`~balladeer.lite.speech.Speech.Cue` objects.
+
+        When `workers` is set, files are parsed in parallel by an executor of that size.
+        `pool` may be a `ThreadPoolExecutor` (the default) or a `ProcessPoolExecutor`.
+
+        A :py:class:`Loader.Cache` object saves the results of parsing. Files which have not changed
+        since they were cached are not read again.
+
+        """
+        suffixes = Loader.suffixes if suffixes is None else suffixes
+        paths = Loader.walk(package, resource, avoid, ignore)
+        if not (workers or cache):
+            for path in paths:
+                yield from Loader.load(path, resource, suffixes, precompile)
+            return
+
+        # The cache must not discover itself
+        paths = [path for path in paths if cache is None or path != cache.path]
+        results = dict.fromkeys(paths)
+        stats = {}
+        if cache is not None:
+            for path in paths:
                 with importlib.resources.as_file(path) as f:
-                    yield typ(resource, path, f.stat())
+                    stats[path] = f.stat()
+                results[path] = cache.get(cache.key(path, resource, precompile), stats[path])
+
+        pending = [path for path, items in results.items() if items is None]
+        load = functools.partial(Loader.load, resource=resource, suffixes=suffixes, precompile=precompile)
+        if workers and len(pending) > 1:
+            with pool(max_workers=workers) as executor:
+                results.update(zip(pending, executor.map(load, pending, chunksize=16)))
+        else:
+            results.update((path, load(path)) for path in pending)
+
+        if cache is not None:
+            for path in pending:
+                cache.put(cache.key(path, resource, precompile), stats[path], results[path])
+            cache.save()
+
+        for items in results.values():
+            yield from items
+
+    @staticmethod
+    def compile_cues(tables: dict, shot_key="_", dialogue_key="s") -> dict[str, list[Speech.Cue]]:
+        """
+        Parse the dialogue of each shot. Cues are keyed by the text they come from, so that
+        a Director which reads other keys from the shot finds no match, and parses its text instead.
+
+        """
+        return {
+            text: Dialogue(text).cues
+            for text in (shot.get(dialogue_key, "") for shot in tables.get(shot_key, []))
+            if isinstance(text, str)
+        }
 
     @staticmethod
     def ignore_style(asset: Asset, *args) -> bool:
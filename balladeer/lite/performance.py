@@ -17,12 +17,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from collections import Counter
 from collections import defaultdict
 from collections.abc import Callable
+from collections.abc import Generator
 import difflib
 import enum
+import functools
+import heapq
 import inspect
 import itertools
+import math
 import string
 import sys
 
@@ -33,6 +38,103 @@ from balladeer.lite.types import Grouping
 class Performance:
     discard = ("a", "an", "any", "her", "his", "my", "some", "the", "their")
 
+    class Matcher:
+        """
+        An index of command phrases which gives the same results as
+        `difflib.get_close_matches <https://docs.python.org/3/library/difflib.html#difflib.get_close_matches>`_.
+
+        Phrases are bucketed by length and indexed by their character bigrams.
+        Only those phrases which could possibly reach the cutoff are scored by
+        `difflib.SequenceMatcher`.
+
+        """
+
+        def __init__(self, options: dict, q: int = 2):
+            self.options = options
+            self.q = q
+            self.lengths = defaultdict(list)
+            self.grams = defaultdict(list)
+            self.profiles = dict()
+            for key in options:
+                self.lengths[len(key)].append(key)
+                for gram in {key[n:n + q] for n in range(len(key) - q + 1)}:
+                    self.grams[gram].append(key)
+
+        def qgrams(self, text: str) -> Counter:
+            return Counter(text[n:n + self.q] for n in range(len(text) - self.q + 1))
+
+        @staticmethod
+        def least_matches(total: int, cutoff: float) -> int:
+            "Return the fewest matching characters which achieve the cutoff ratio."
+            rv = math.ceil(cutoff * total / 2)
+            while rv > 0 and total and 2.0 * (rv - 1) / total >= cutoff:
+                rv -= 1
+            while total and 2.0 * rv / total < cutoff:
+                rv += 1
+            return rv
+
+        def least_grams(self, a: int, b: int, cutoff: float) -> int:
+            """
+            Return the fewest grams two phrases of length `a` and `b` must share to achieve the cutoff.
+
+            Each unmatched character spoils at most q grams of its own phrase.
+            Each gap in the other phrase breaks at most q - 1 more.
+
+            """
+            matches = self.least_matches(a + b, cutoff)
+            return max(
+                (a - self.q + 1) - self.q * (a - matches) - (self.q - 1) * (b - matches),
+                (b - self.q + 1) - self.q * (b - matches) - (self.q - 1) * (a - matches),
+            )
+
+        def candidates(self, word: str, cutoff: float) -> Generator[str]:
+            n = len(word)
+            thresholds = {
+                length: self.least_grams(n, length, cutoff)
+                for length in self.lengths
+                if not (n + length) or 2.0 * min(n, length) / (n + length) >= cutoff
+            }
+            if not thresholds:
+                return
+
+            profile = self.qgrams(word)
+            least = min(thresholds.values())
+            prefix = profile.total() - least + 1
+            if least <= 0 or 2 * prefix > profile.total():
+                # Grams are little help at a low cutoff. Check every phrase of a viable length.
+                yield from (key for length in thresholds for key in self.lengths[length])
+                return
+
+            # Any phrase with enough grams in common must share one of the rarest few.
+            rarest = sorted(profile.elements(), key=lambda x: len(self.grams.get(x, [])))
+            for key in {key for gram in set(rarest[:prefix]) for key in self.grams.get(gram, [])}:
+                try:
+                    threshold = thresholds[len(key)]
+                except KeyError:
+                    continue
+
+                try:
+                    grams = self.profiles[key]
+                except KeyError:
+                    grams = self.profiles[key] = self.qgrams(key)
+
+                if sum((profile & grams).values()) >= threshold:
+                    yield key
+
+        def get_close_matches(self, word: str, n: int = 3, cutoff: float = 0.6) -> list[str]:
+            if n == 1 and word in self.options:
+                return [word]
+
+            result = []
+            s = difflib.SequenceMatcher()
+            s.set_seq2(word)
+            for x in self.candidates(word, cutoff):
+                s.set_seq1(x)
+                if s.real_quick_ratio() >= cutoff and s.quick_ratio() >= cutoff and s.ratio() >= cutoff:
+                    result.append((s.ratio(), x))
+
+            return [x for score, x in heapq.nlargest(n, result)]
+
     @staticmethod
     def unpack_annotation(name, annotation, ensemble, parent=None):
         if isinstance(annotation, str) and parent:
@@ -70,72 +172,158 @@ class Performance:
         ]
 
     @staticmethod
-    def expand_commands(method, ensemble=[], parent=None):
+    @functools.cache
+    def compile_commands(method) -> tuple[list[tuple[int, str]], list[tuple[str, object]]]:
         """
-        Read a method's docstring and expand it to create all possible matching
-        command phrases. Calculate the corresponding keyword arguments.
+        Read a method's docstring and signature once only.
 
-        Generates pairs of each command with a 2-tuple; (method, keyword arguments).
+        Returns a list of command templates, each with its rank, and a list of the annotated parameters
+        of the method.
 
         """
         doc = method.func.__doc__ if hasattr(method, "func") else method.__doc__ or ""
-        terms = list(
-            filter(None, ((n, i.strip()) for n, line in enumerate(doc.strip().splitlines()) for i in line.split("|")))
-        )
-        params = list(
-            itertools.chain(
-                list(Performance.unpack_annotation(p.name, p.annotation, ensemble, parent))
-                for p in inspect.signature(method, follow_wrapped=True).parameters.values()
-                if p.annotation != inspect.Parameter.empty
+        terms = [
+            (rank, " ".join(Performance.parse_tokens(term, discard=Performance.discard)))
+            for rank, term in filter(
+                None,
+                ((n, i.strip()) for n, line in enumerate(doc.strip().splitlines()) for i in line.split("|"))
             )
-        )
+        ]
+        params = [
+            (p.name, p.annotation)
+            for p in inspect.signature(method, follow_wrapped=True).parameters.values()
+            if p.annotation != inspect.Parameter.empty
+        ]
+        return terms, params
+
+    @staticmethod
+    def fingerprint(obj) -> tuple:
+        """
+        Identify an object and every attribute of it which a command template may refer to.
+        An entity has changed if any of its fields, including its states, types and links, are different.
+
+        """
+        try:
+            return (id(obj),) + Entity.Encoder.fingerprint(obj)
+        except (AttributeError, TypeError):
+            # Not an entity
+            return (id(obj), tuple(getattr(obj, "names", ())), getattr(obj, "aspect", None))
+
+    @staticmethod
+    def expand_terms(method, terms: list[tuple[int, str]], params: list[list[tuple[str, object]]]):
         cartesian = [dict(i) for i in itertools.product(*params)]
-        for rank, term in terms:
-            tokens = Performance.parse_tokens(term, discard=Performance.discard)
+        for rank, template in terms:
             for prod in cartesian:
                 try:
-                    yield (" ".join(tokens).format(**prod).lower(), (rank, method, prod))
+                    yield (template.format(**prod).lower(), (rank, method, prod))
                 except (AttributeError, IndexError, KeyError) as e:
                     continue
 
+    @staticmethod
+    def expand_commands(method, ensemble=[], parent=None):
+        """
+        Read a method's docstring and expand it to create all possible matching
+        command phrases. Calculate the corresponding keyword arguments.
+
+        Generates pairs of each command with a 2-tuple; (method, keyword arguments).
+
+        """
+        terms, params = Performance.compile_commands(getattr(method, "__func__", method))
+        params = [
+            list(Performance.unpack_annotation(name, annotation, ensemble, parent))
+            for name, annotation in params
+        ]
+        yield from Performance.expand_terms(method, terms, params)
+
     @staticmethod
     def is_command_hidden(text: str, options: Grouping = None, threshold=sys.maxsize) -> bool:
         "Hide valid commands from the UI according to rank"
-        rank, fn, kwargs = options[text]
+        value = options[text]
+        if isinstance(value, list):
+            # A Grouping of options may hold several actions for one command
+            return all(threshold <= rank for rank, fn, kwargs in value)
+
+        rank, fn, kwargs = value
         return threshold <= rank
 
+    def spawn(self, memo: dict = None):
+        "Spawn a copy which will expand its commands afresh."
+        memo = {} if memo is None else memo
+        if hasattr(self, "compiled"):
+            memo[id(self.compiled)] = dict()
+        if hasattr(self, "expanded"):
+            memo[id(self.expanded)] = Grouping(list)
+        if hasattr(self, "matcher"):
+            memo[id(self.matcher)] = None
+        return super().spawn(memo)
+
     def __call__(self, fn, *args, **kwargs):
         yield from fn(fn, *args, **kwargs)
 
     def options(
         self, ensemble: list[Entity], prefix="do_"
     ) -> Grouping[str, list[tuple[int, Callable, dict[str, Entity]]]]:
+        """
+        Return a Grouping of all current commands. It is shared between calls, and should be
+        treated as read-only.
+
+        Each method is expanded again only when the objects which match its parameters have changed.
+
+        """
         if not hasattr(self, "active"):
             self.active = dict(
                 (i, set())
                 for i in (getattr(self, name) for name in dir(self) if name.startswith(prefix))
                 if isinstance(i, Callable)
             )
+            self.compiled = dict()
 
-        rv = Grouping(list)
+        changed = False
         for fn, commands in self.active.items():
+            terms, params = self.compile_commands(getattr(fn, "__func__", fn))
+            params = [
+                list(self.unpack_annotation(name, annotation, ensemble, parent=self))
+                for name, annotation in params
+            ]
+            key = tuple(tuple(self.fingerprint(obj) for name, obj in param) for param in params)
+            if fn in self.compiled and self.compiled[fn][0] == key:
+                continue
+
+            self.compiled[fn] = (key, list(self.expand_terms(fn, terms, params)))
             commands.clear()
-            for k, v in self.expand_commands(fn, ensemble, parent=self):
-                commands.add(k)
-                rv[k].append(v)
-        return rv
+            commands.update(k for k, v in self.compiled[fn][1])
+            changed = True
+
+        if changed or not hasattr(self, "expanded"):
+            self.expanded = Grouping(list)
+            for fn in self.active:
+                for k, v in self.compiled[fn][1]:
+                    self.expanded[k].append(v)
+        return self.expanded
 
     def pick(self, options) -> tuple[int, Callable, list, dict]:
         "Override this method to pick from multiple actions matching the same command"
         return next(iter(options), (None,) * 4)
 
+    def index(self, options: Grouping) -> Matcher:
+        "Return a matcher for the options, reusing the previous one if they have not changed."
+        try:
+            if self.matcher.options is options:
+                return self.matcher
+        except AttributeError:
+            pass
+
+        self.matcher = self.Matcher(options)
+        return self.matcher
+
     def actions(self, text, context=None, ensemble=[], prefix="do_", cutoff=0.95):
         options = self.options(ensemble, prefix=prefix)
+        matcher = self.index(options)
 
         tokens = self.parse_tokens(text, discard=self.discard)
-        matches = difflib.get_close_matches(
-            " ".join(tokens), options, cutoff=cutoff
-        ) or difflib.get_close_matches(text.strip(), options, cutoff=cutoff)
+        matches = matcher.get_close_matches(
+            " ".join(tokens), n=1, cutoff=cutoff
+        ) or matcher.get_close_matches(text.strip(), n=1, cutoff=cutoff)
         try:
             yield from ((rank, fn, [text, context], kwargs) for rank, fn, kwargs in options[matches[0]])
         except (IndexError, KeyError):
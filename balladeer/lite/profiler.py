@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import namedtuple
+from collections.abc import Callable
+from collections.abc import Generator
+import bisect
+import contextlib
+import threading
+import time
+
+
+class Profiler:
+    """
+    Collects the time spent in each stage of a turn, and reports it
+    in the text format of `Prometheus <https://prometheus.io/docs/instrumenting/exposition_formats/>`_.
+
+    :param enabled: When false, `stage` returns a context manager which does nothing.
+    :param buckets: The upper bounds in seconds of each histogram bucket.
+
+    A Profiler may also report gauges and counters, which are read from a callable
+    at the time of rendering.
+
+    """
+
+    Gauge = namedtuple("Gauge", ["name", "fn", "help", "type"], defaults=["", "gauge"])
+    Gauge.__qualname__ = "Profiler.Gauge"
+
+    class Timer:
+        def __init__(self, profiler, name: str):
+            self.profiler = profiler
+            self.name = name
+            self.start = None
+
+        def __enter__(self):
+            self.start = self.profiler.clock()
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            self.profiler.observe(self.name, self.profiler.clock() - self.start)
+            return False
+
+    disabled = contextlib.nullcontext()
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        buckets: tuple[float] = (
+            0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5
+        ),
+        prefix: str = "balladeer",
+        clock=time.perf_counter,
+    ):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.gauges = {}
+
+    def __getstate__(self):
+        # Neither the lock nor the callables of gauges can be pickled
+        return self.__dict__ | dict(lock=None, gauges={})
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def stage(self, name: str):
+        "Return a context manager which times the code it encloses."
+        if not self.enabled:
+            return self.disabled
+        return self.Timer(self, name)
+
+    def observe(self, name: str, value: float):
+        with self.lock:
+            try:
+                counts, total = self.stages[name]
+            except KeyError:
+                counts, total = [0] * (len(self.buckets) + 1), 0
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.stages[name] = (counts, total + value)
+
+    def gauge(self, name: str, fn: Callable[[], float], help: str = "", type: str = "gauge"):
+        "Register a callable to be read each time the metrics are rendered."
+        self.gauges[name] = self.Gauge(name, fn, help, type)
+        return self
+
+    def clear(self):
+        with self.lock:
+            self.stages.clear()
+
+    def render_stages(self) -> Generator[str]:
+        name = f"{self.prefix}_stage_seconds"
+        yield f"# HELP {name} Time spent in each stage of a turn."
+        yield f"# TYPE {name} histogram"
+        with self.lock:
+            stages = {k: (counts.copy(), total) for k, (counts, total) in self.stages.items()}
+
+        for stage, (counts, total) in sorted(stages.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+            yield f'{name}_sum{{stage="{stage}"}} {total}'
+            yield f'{name}_count{{stage="{stage}"}} {cumulative}'
+
+    def render_gauges(self) -> Generator[str]:
+        for gauge in self.gauges.values():
+            name = f"{self.prefix}_{gauge.name}"
+            try:
+                value = float(gauge.fn())
+            except Exception:
+                continue
+
+            if gauge.help:
+                yield f"# HELP {name} {gauge.help}"
+            yield f"# TYPE {name} {gauge.type}"
+            yield f"{name} {value}"
+
+    def render(self) -> str:
+        return "\n".join(list(self.render_stages()) + list(self.render_gauges())) + "\n"
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import bisect
+from collections import defaultdict
+import contextlib
+import hashlib
+import itertools
+import re
+import uuid
+import warnings
+
+
+class Ring:
+    """
+    A consistent hash of keys onto nodes.
+
+    Each node is placed at several points around the ring. A key belongs to the node at the
+    next point after its own hash. When a node is added or removed, only the keys
+    on either side of its points change owner.
+
+    """
+
+    def __init__(self, nodes: list, replicas: int = 64):
+        self.nodes = list(nodes)
+        points = sorted((self.hash(f"{node}:{n}"), node) for node in self.nodes for n in range(replicas))
+        self.points = [i for i, node in points]
+        self.owners = [node for i, node in points]
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf8"), digest_size=8).digest(), "big")
+
+    def lookup(self, key: uuid.UUID | str):
+        "Return the node which owns a key."
+        n = bisect.bisect(self.points, self.hash(str(key)))
+        return self.owners[n % len(self.owners)]
+
+
+class Router:
+    """
+    Accepts connections for the app, and passes each request to the worker process
+    which owns its session.
+
+    The session is read from the path of the request. Requests without one are shared
+    between workers in turn. Each worker listens on a Unix socket.
+
+    Connections from clients are kept alive, and each request on one is routed afresh.
+    Connections to each worker are kept in a pool of up to `idle`, and used again.
+    A WebSocket upgrade stays with its worker.
+
+    Each worker has its own :py:class:`~balladeer.lite.profiler.Profiler`. A request for
+    `/metrics` goes to all of them, and the reply joins their samples with a `worker` label.
+
+    """
+
+    session_matcher = re.compile(rb"^[A-Z]+ /session/([0-9a-fA-F-]{32,36})(?:[/? ]|$)")
+    metrics_matcher = re.compile(rb"^GET /metrics(?:[? ]|$)")
+    sample_matcher = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(.*)$")
+
+    idle = 8
+
+    def __init__(self, paths: list[str], ring: Ring = None, retries: int = 50):
+        self.paths = paths
+        self.ring = ring or Ring(range(len(paths)))
+        self.retries = retries
+        self.turns = itertools.cycle(range(len(paths)))
+        self.pools = defaultdict(list)
+
+    def route(self, head: bytes) -> int:
+        "Return the worker for a request."
+        match = self.session_matcher.match(head)
+        try:
+            return self.ring.lookup(uuid.UUID(match[1].decode("ascii")))
+        except (TypeError, ValueError):
+            return next(self.turns)
+
+    @staticmethod
+    def headers(head: bytes) -> dict[bytes, bytes]:
+        "Return the headers of a message, with lower case names."
+        lines = head.rstrip(b"\r\n").split(b"\r\n")[1:]
+        return {k.strip().lower(): v.strip() for k, _, v in (i.partition(b":") for i in lines)}
+
+    @staticmethod
+    def keep_alive(head: bytes, headers: dict[bytes, bytes]) -> bool:
+        "Return whether a message allows its connection to be used again."
+        tokens = {i.strip().lower() for i in headers.get(b"connection", b"").split(b",")}
+        line = head.split(b"\r\n", 1)[0]
+        # A response line begins with the version, and a request line ends with it
+        if line.startswith(b"HTTP/1.0") or line.endswith(b"HTTP/1.0"):
+            return b"keep-alive" in tokens
+        return b"close" not in tokens
+
+    @staticmethod
+    async def body(reader: asyncio.StreamReader, headers: dict[bytes, bytes], eof: bool = False):
+        """
+        Generate the bytes of a message body as they arrive, framing and all.
+        A body which has neither a length nor chunks ends at `eof` if set, and is empty otherwise.
+
+        """
+        if b"chunked" in headers.get(b"transfer-encoding", b"").lower():
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                yield line
+                size = int(line.split(b";")[0], 16)
+                if not size:
+                    break
+                yield await reader.readexactly(size + 2)
+
+            # Trailers end with an empty line
+            while (line := await reader.readuntil(b"\r\n")) != b"\r\n":
+                yield line
+            yield line
+        elif b"content-length" in headers:
+            remaining = int(headers[b"content-length"])
+            while remaining:
+                data = await reader.readexactly(min(remaining, 65536))
+                remaining -= len(data)
+                yield data
+        elif eof:
+            while data := await reader.read(65536):
+                yield data
+
+    @staticmethod
+    async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, eof: bool = False):
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+        if eof and writer.can_write_eof():
+            writer.write_eof()
+
+    async def connect(self, node: int) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        "Open a connection to a worker. Workers may take a moment to start."
+        for n in range(self.retries):
+            try:
+                return await asyncio.open_unix_connection(self.paths[node])
+            except OSError:
+                if n == self.retries - 1:
+                    raise
+                await asyncio.sleep(0.1)
+
+    def acquire(self, node: int) -> tuple[asyncio.StreamReader, asyncio.StreamWriter] | None:
+        "Return an idle connection to a worker, if there is one still open."
+        pool = self.pools[node]
+        while pool:
+            reader, writer = pool.pop()
+            if not (reader.at_eof() or writer.is_closing()):
+                return reader, writer
+            writer.close()
+        return None
+
+    def release(self, node: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pool = self.pools[node]
+        if len(pool) < self.idle and not writer.is_closing():
+            pool.append((reader, writer))
+        else:
+            writer.close()
+
+    async def exchange(self, node: int, head: bytes, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        """
+        Send a request to a worker and copy its response to the client.
+        Return whether the connection to the client may be used again.
+
+        """
+        method = head.split(b" ", 1)[0]
+        for reused in (True, False):
+            upstream = self.acquire(node) if reused else await self.connect(node)
+            if upstream is None:
+                continue
+
+            upstream_reader, upstream_writer = upstream
+            try:
+                upstream_writer.write(head + body)
+                await upstream_writer.drain()
+                response = await upstream_reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                upstream_writer.close()
+                if reused and not getattr(e, "partial", b""):
+                    # The worker closed an idle connection. Nothing came back, so try a fresh one.
+                    continue
+                raise
+            break
+
+        try:
+            while response[9:10] == b"1" and response[9:12] != b"101":
+                # Pass on any informational responses before the final one
+                writer.write(response)
+                response = await upstream_reader.readuntil(b"\r\n\r\n")
+
+            headers = self.headers(response)
+            bodiless = method == b"HEAD" or response[9:12] in (b"204", b"304")
+            framed = bodiless or b"content-length" in headers or b"chunked" in headers.get(
+                b"transfer-encoding", b""
+            ).lower()
+
+            writer.write(response)
+            if not bodiless:
+                async for data in self.body(upstream_reader, headers, eof=True):
+                    writer.write(data)
+                    await writer.drain()
+            await writer.drain()
+        except BaseException:
+            upstream_writer.close()
+            raise
+
+        if framed and self.keep_alive(response, headers):
+            self.release(node, upstream_reader, upstream_writer)
+        else:
+            upstream_writer.close()
+        return framed
+
+    async def metrics(self, head: bytes, writer: asyncio.StreamWriter):
+        "Gather the metrics of every worker into one reply."
+        request = head.split(b"\r\n", 1)[0].rsplit(b" ", 1)[0] + b" HTTP/1.0\r\n\r\n"
+        replies = []
+        for node in range(len(self.paths)):
+            try:
+                reader, upstream = await self.connect(node)
+                upstream.write(request)
+                data = await reader.read()
+                upstream.close()
+            except OSError as e:
+                warnings.warn(f"Worker {node} unavailable: {e!s}")
+                continue
+
+            response, _, body = data.partition(b"\r\n\r\n")
+            replies.append((node, response.split(b"\r\n", 1)[0].split(b" ", 1)[-1], body))
+
+        families = {}
+        for node, status, body in replies:
+            if status[:3] != b"200":
+                continue
+
+            family = None
+            for line in body.decode("utf8").splitlines():
+                if line.startswith("#"):
+                    family = line.split()[2]
+                    lines = families.setdefault(family, ([], []))[0]
+                    if line not in lines:
+                        lines.append(line)
+                elif match := self.sample_matcher.match(line):
+                    name, labels, value = match.groups()
+                    labels = ",".join(filter(None, [f'worker="{node}"', labels]))
+                    families.setdefault(family or name, ([], []))[1].append(f"{name}{{{labels}}} {value}")
+
+        if any(status[:3] == b"200" for node, status, body in replies):
+            status = b"200 OK"
+            body = "".join(f"{i}\n" for comments, samples in families.values() for i in comments + samples)
+            body = body.encode("utf8")
+        else:
+            # No worker serves metrics. Pass on the reply of the first.
+            node, status, body = replies[0] if replies else (None, b"502 Bad Gateway", b"")
+
+        writer.write(
+            b"HTTP/1.1 %s\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            b"Content-Length: %d\r\n\r\n" % (status, len(body)) + body
+        )
+        await writer.drain()
+
+    async def tunnel(self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        "Join a client to its worker for the rest of the connection."
+        upstream_reader, upstream = await self.connect(self.route(head))
+        try:
+            upstream.write(head)
+            sending = asyncio.create_task(self.pipe(reader, upstream, eof=True))
+            try:
+                await self.pipe(upstream_reader, writer)
+            finally:
+                sending.cancel()
+                with contextlib.suppress(asyncio.CancelledError, ConnectionError):
+                    await sending
+        finally:
+            upstream.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    # The client has gone
+                    break
+
+                if b"\r\nupgrade:" in head.lower():
+                    return await self.tunnel(head, reader, writer)
+
+                headers = self.headers(head)
+                if headers.get(b"expect", b"").lower() == b"100-continue":
+                    # The body is read here before it goes to a worker
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    lines = head.rstrip(b"\r\n").split(b"\r\n")
+                    head = b"\r\n".join([i for i in lines if not i.lower().startswith(b"expect:")] + [b"", b""])
+
+                body = b"".join([i async for i in self.body(reader, headers)])
+                if self.metrics_matcher.match(head):
+                    await self.metrics(head, writer)
+                    keep = True
+                else:
+                    node = self.route(head)
+                    try:
+                        keep = await self.exchange(node, head, body, writer)
+                    except OSError as e:
+                        warnings.warn(f"Worker {node} unavailable: {e!s}")
+                        writer.write(
+                            b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                        )
+                        await writer.drain()
+                        break
+
+                if not (keep and self.keep_alive(head, headers)):
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        "Close the idle connections to workers."
+        for pool in self.pools.values():
+            while pool:
+                reader, writer = pool.pop()
+                writer.close()
+
+    async def serve(self, host: str = "localhost", port: int = 8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
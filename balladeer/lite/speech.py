@@ -18,13 +18,134 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+from collections import OrderedDict
+from collections import namedtuple
+from collections.abc import Callable
 import functools
+import hashlib
+import importlib.metadata
+import pathlib
 import re
+import sqlite3
 import textwrap
+import threading
 
 from speechmark import SpeechMark
 
 
+class RenderCache:
+    """
+    A bounded cache of rendered markup, keyed by a digest of the source text.
+    It counts its `hits` and `misses`.
+
+    Optionally, the cache is backed by a SQLite database file.
+    That lets a restarted server begin warm, and several processes may share it.
+    The key of a stored item includes the `version` of the renderer, so that
+    an upgrade, or a change of options, does not serve stale markup.
+
+    """
+
+    def __init__(self, maxsize: int = 4096, path: pathlib.Path | str = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.items = OrderedDict()
+        self.lock = threading.RLock()
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(
+                str(path), timeout=30, check_same_thread=False, isolation_level=None
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS renders(key TEXT PRIMARY KEY, html TEXT NOT NULL)"
+            )
+
+    @staticmethod
+    def digest(text: str, version: str = "") -> str:
+        rv = hashlib.blake2b(version.encode("utf8"), digest_size=16)
+        rv.update(b"\0")
+        rv.update(text.encode("utf8"))
+        return rv.hexdigest()
+
+    @staticmethod
+    @functools.cache
+    def identify(processor) -> str:
+        "Return the version of a processor. It changes with its class, its options, or its library."
+        cls = type(processor)
+        try:
+            library = importlib.metadata.version(cls.__module__.partition(".")[0])
+        except importlib.metadata.PackageNotFoundError:
+            library = ""
+        options = (
+            sorted(getattr(processor, "escape_table", {}).items()),
+            sorted(getattr(processor, "tagging", {}).items()),
+            getattr(getattr(processor, "source", None), "maxlen", None),
+        )
+        return f"{cls.__module__}.{cls.__qualname__} {library} {options!r}"
+
+    @property
+    def ratio(self) -> float:
+        "Return the proportion of lookups which were hits."
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def fetch(self, key: str) -> str | None:
+        if self.connection is None:
+            return None
+        with self.lock:
+            row = self.connection.execute("SELECT html FROM renders WHERE key = ?", (key,)).fetchone()
+        return row and row[0]
+
+    def store(self, key: str, html: str):
+        with self.lock:
+            self.items[key] = html
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def render(self, text: str, fn: Callable[[str], str], version: str = "") -> str:
+        "Return the rendered form of `text`, calling `fn` to render it only when necessary."
+        key = self.digest(text, version)
+        with self.lock:
+            try:
+                rv = self.items[key]
+            except KeyError:
+                pass
+            else:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return rv
+
+        rv = self.fetch(key)
+        if rv is None:
+            rv = fn(text)
+            with self.lock:
+                self.misses += 1
+                if self.connection is not None:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO renders(key, html) VALUES (?, ?)", (key, rv)
+                    )
+        else:
+            with self.lock:
+                self.hits += 1
+
+        self.store(key, rv)
+        return rv
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
 class Speech(str):
     """
     This is a lightweight class for objects which
@@ -39,10 +160,71 @@ class Speech(str):
             3. Try the Dover Sole
         ''')
     """
+    Cue = namedtuple("Cue", ["block", "attrs", "pieces"])
+    Cue.__qualname__ = "Speech.Cue"
+
     processor = SpeechMark()
+    # The processor keeps state while it renders, so threads must take turns with it
+    processor_lock = threading.Lock()
+    cache = RenderCache()
     tag_matcher = re.compile("<[^>]+?>")
+    bq_matcher = re.compile("<blockquote.*?<\\/blockquote>", re.DOTALL)
+    cite_matcher = re.compile(
+        """
+        (?P<head><cite.*?data-role=")   # Up until role attribute
+        (?P<role>[^"]+?)                # Role attribute
+        (?P<tail>"[^>]*?)               # Until end of opening tag
+        >                               # Close opening tag
+        .*?</cite>                      # Text and closing tag
+        """,
+        re.VERBOSE,
+    )
+    attr_matcher = re.compile('data-([^=]+)=[^"]*"([^"]*)"')
+    pp_matcher = re.compile("<p>(.*?)<\\/p>", re.DOTALL)
 
-    @functools.cache
+    @classmethod
+    @functools.lru_cache(maxsize=4096)
+    def compile_cue(cls, block: str) -> Cue:
+        """
+        Parse a blockquote of rendered markup into a Cue.
+
+        The `pieces` of the cue are the text of the block split around its cite and paragraph elements.
+        A cite is represented by a tuple of ("cite", text, head, role, tail).
+        A paragraph is represented by a tuple of ("p", content, word count).
+
+        """
+        attrs = dict(cls.attr_matcher.findall(block))
+        spans = [
+            (m.start(), m.end(), ("cite", m.group(), *m.group("head", "role", "tail")))
+            for m in cls.cite_matcher.finditer(block)
+        ]
+        for m in cls.pp_matcher.finditer(block):
+            content = m.group(1).strip()
+            words = len(Speech(content).words) if content else 0
+            spans.append((m.start(), m.end(), ("p", content, words)))
+
+        pieces = []
+        pos = 0
+        for start, end, piece in sorted(spans):
+            if start < pos:
+                # Overlapping elements. Leave this block to be edited by regex.
+                return cls.Cue(block, attrs, None)
+            pieces.extend([block[pos:start], piece])
+            pos = end
+        pieces.append(block[pos:])
+        return cls.Cue(block, attrs, tuple(pieces))
+
+    @functools.cached_property
+    def cues(self) -> list[Cue]:
+        """
+        Return the rendered markup as a list of :py:class:`Speech.Cue` objects.
+        These are pre-parsed so that a :py:class:`~balladeer.lite.director.Director`
+        can edit them with minimal effort.
+
+        """
+        return [self.compile_cue(block) for block in self.bq_matcher.findall(self.tags)]
+
+    @functools.lru_cache(maxsize=4096)
     def trim(self) -> str:
         """
         Eliminates indentation and other leading whitespace.
@@ -79,7 +261,11 @@ class Speech(str):
             </blockquote>
 
         """
-        return self.processor.loads(self.trim())
+        def render(text: str) -> str:
+            with self.processor_lock:
+                return self.processor.loads(self.trim())
+
+        return self.cache.render(self, render, version=self.cache.identify(self.processor))
 
     @functools.cached_property
     def lines(self) -> list[str]:
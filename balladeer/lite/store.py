@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from collections.abc import Generator
+from collections.abc import MutableMapping
+import io
+import pathlib
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class SessionStore(MutableMapping):
+    """
+    The interface by which the web application keeps live stories.
+
+    A store behaves like a dictionary of
+    :py:class:`~balladeer.lite.storybuilder.StoryBuilder` objects
+    keyed by their `uid`. A missing session raises `KeyError`.
+
+    Stories are mutated in place during a turn. Handlers assign the story back
+    to the store when the turn is done, so that persistent stores may save it.
+
+    """
+
+    @staticmethod
+    def key(session_id: uuid.UUID | str) -> str:
+        return str(session_id)
+
+    def expire(self) -> list[str]:
+        "Override this method to remove idle sessions. Returns the keys of those removed."
+        return []
+
+    def share(self, **kwargs) -> "SessionStore":
+        """
+        Name the objects which all stories share, such as their assets and config.
+        A store which saves stories keeps a reference to each of them instead of a copy.
+
+        """
+        return self
+
+
+class MemoryStore(SessionStore):
+    """
+    Keeps stories in process memory, with optional limits.
+
+    :param limit:   The maximum number of stories to keep in memory.
+                    Least recently used stories are evicted first.
+    :param ttl:     The number of seconds a story may stay idle before eviction.
+    :param backing: Another store to receive evicted stories.
+                    They are restored from it on demand.
+
+    """
+
+    def __init__(
+        self, limit: int = None, ttl: float = None, backing: SessionStore = None, clock=time.monotonic
+    ):
+        self.limit = limit
+        self.ttl = ttl
+        self.backing = backing
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.items = OrderedDict()
+
+    def __getitem__(self, session_id):
+        key = self.key(session_id)
+        with self.lock:
+            self.expire()
+            try:
+                story, stamp = self.items[key]
+            except KeyError:
+                if self.backing is None:
+                    raise
+                story = self.backing.pop(key)
+
+            self.items[key] = (story, self.clock())
+            self.items.move_to_end(key)
+            self.evict()
+            return story
+
+    def __setitem__(self, session_id, story):
+        key = self.key(session_id)
+        with self.lock:
+            self.items[key] = (story, self.clock())
+            self.items.move_to_end(key)
+            self.expire()
+            self.evict()
+
+    def __delitem__(self, session_id):
+        key = self.key(session_id)
+        with self.lock:
+            try:
+                del self.items[key]
+            except KeyError:
+                if self.backing is None:
+                    raise
+                del self.backing[key]
+
+    def __iter__(self):
+        with self.lock:
+            keys = list(self.items)
+        yield from keys
+        if self.backing is not None:
+            yield from (i for i in self.backing if i not in keys)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __contains__(self, session_id):
+        key = self.key(session_id)
+        return key in self.items or (self.backing is not None and key in self.backing)
+
+    def share(self, **kwargs) -> "SessionStore":
+        if self.backing is not None:
+            self.backing.share(**kwargs)
+        return self
+
+    def retire(self, key: str) -> str:
+        story, stamp = self.items.pop(key)
+        if self.backing is not None:
+            self.backing[key] = story
+        return key
+
+    def evict(self) -> list[str]:
+        "Retire least recently used stories beyond the limit."
+        rv = []
+        while self.limit is not None and len(self.items) > self.limit:
+            rv.append(self.retire(next(iter(self.items))))
+        return rv
+
+    def expire(self) -> list[str]:
+        "Retire stories which have been idle for longer than the ttl."
+        if self.ttl is None:
+            return []
+
+        rv = []
+        now = self.clock()
+        with self.lock:
+            for key, (story, stamp) in list(self.items.items()):
+                if now - stamp < self.ttl:
+                    # Entries are held in order of use
+                    break
+                rv.append(self.retire(key))
+        return rv
+
+
+class SQLiteStore(SessionStore):
+    """
+    Keeps stories pickled in a SQLite database.
+
+    Several server processes may share the same database file.
+
+    Objects named by :py:meth:`SessionStore.share` are not pickled with each story.
+    Only their names are saved, and a restored story is given the live objects of that name.
+
+    :param path:    The path to the database file. The default is an in-memory database.
+    :param ttl:     The number of seconds a story may stay idle before deletion.
+    :param shared:  A dictionary of shared objects by name.
+
+    """
+
+    class Pickler(pickle.Pickler):
+
+        def __init__(self, file, shared: dict, **kwargs):
+            super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL, **kwargs)
+            self.names = {id(v): k for k, v in shared.items()}
+
+        def persistent_id(self, obj):
+            return self.names.get(id(obj))
+
+    class Unpickler(pickle.Unpickler):
+
+        def __init__(self, file, shared: dict, **kwargs):
+            super().__init__(file, **kwargs)
+            self.shared = shared
+
+        def persistent_load(self, pid):
+            try:
+                return self.shared[pid]
+            except KeyError:
+                raise pickle.UnpicklingError(f"No shared object named {pid}")
+
+    def __init__(
+        self, path: pathlib.Path | str = ":memory:", ttl: float = None, clock=time.time, shared: dict = None
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self.shared = {}
+        self.share(**(shared or {}))
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(
+            str(path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        if str(path) != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions("
+            "key TEXT PRIMARY KEY, story BLOB NOT NULL, modified REAL NOT NULL)"
+        )
+
+    def __getstate__(self):
+        raise TypeError(f"{self.__class__.__name__} objects cannot be pickled")
+
+    def share(self, **kwargs) -> SessionStore:
+        # None, and other singletons, must not be taken for a reference
+        self.shared.update({k: v for k, v in kwargs.items() if v is not None})
+        return self
+
+    def dumps(self, story) -> bytes:
+        buf = io.BytesIO()
+        self.Pickler(buf, self.shared).dump(story)
+        return buf.getvalue()
+
+    def loads(self, data: bytes):
+        return self.Unpickler(io.BytesIO(data), self.shared).load()
+
+    def __getitem__(self, session_id):
+        key = self.key(session_id)
+        with self.lock:
+            self.expire()
+            row = self.connection.execute(
+                "SELECT story FROM sessions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(key)
+            self.connection.execute(
+                "UPDATE sessions SET modified = ? WHERE key = ?", (self.clock(), key)
+            )
+        return self.loads(row[0])
+
+    def __setitem__(self, session_id, story):
+        key = self.key(session_id)
+        data = self.dumps(story)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sessions(key, story, modified) VALUES (?, ?, ?)",
+                (key, data, self.clock()),
+            )
+
+    def __delitem__(self, session_id):
+        key = self.key(session_id)
+        with self.lock:
+            cursor = self.connection.execute("DELETE FROM sessions WHERE key = ?", (key,))
+        if not cursor.rowcount:
+            raise KeyError(key)
+
+    def __iter__(self) -> Generator[str]:
+        with self.lock:
+            rows = self.connection.execute("SELECT key FROM sessions ORDER BY modified").fetchall()
+        yield from (key for key, in rows)
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def __contains__(self, session_id):
+        key = self.key(session_id)
+        with self.lock:
+            row = self.connection.execute("SELECT 1 FROM sessions WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def expire(self) -> list[str]:
+        "Delete stories which have been idle for longer than the ttl."
+        if self.ttl is None:
+            return []
+
+        limit = self.clock() - self.ttl
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key FROM sessions WHERE modified <= ?", (limit,)
+            ).fetchall()
+            self.connection.execute("DELETE FROM sessions WHERE modified <= ?", (limit,))
+        return [key for key, in rows]
+
+    def close(self):
+        self.connection.close()
@@ -29,6 +29,7 @@ import warnings
 from balladeer.lite.director import Director
 from balladeer.lite.drama import Drama
 from balladeer.lite.loader import Loader
+from balladeer.lite.profiler import Profiler
 from balladeer.lite.speech import Speech
 from balladeer.lite.types import Detail
 from balladeer.lite.types import Turn
@@ -38,6 +39,9 @@ from balladeer.lite.world import WorldBuilder
 
 class StoryBuilder:
 
+    # Stories spawned from a template share its profiler. See `app_factory` to enable it.
+    profiler = Profiler(enabled=False)
+
     @staticmethod
     def settings(*names, themes={}) -> dict:
         rv = dict()
@@ -73,6 +77,7 @@ class StoryBuilder:
 
         self.drama = deque([])
         self.director = Director(**kwargs)
+        self.latest = None
         self.make(**kwargs)
 
     def make(self, **kwargs):
@@ -84,6 +89,36 @@ class StoryBuilder:
         m = self.world.map and copy.deepcopy(self.world.map, memo).make()
         w = self.world.__class__ (map=m, config=config, assets=self.assets)
         rv = self.__class__(*self.speech, config=config, assets=self.assets, world=w)
+        rv.profiler = self.profiler
+        return rv
+
+    def spawn(self, memo: dict = None):
+        """
+        Create a new story using this one as a template.
+
+        This is much cheaper than a `deepcopy`, which builds a new story from scratch.
+        Assets, config and profiler are shared with the template. The world and drama are spawned from
+        their counterparts in the template, so the template itself must not be played.
+
+        """
+        memo = {} if memo is None else memo
+        memo.update({id(i): i for i in (self.assets, self.config)})
+
+        try:
+            drama = list(self.drama.values())
+        except AttributeError:
+            drama = list(self.drama)
+
+        rv = memo[id(self)] = copy.copy(self)
+        rv.uid = uuid.uuid4()
+        rv.world = self.world.spawn(memo)
+        rv.director = self.director.spawn()
+        for d in drama:
+            d.spawn(memo)
+
+        for k, v in vars(self).items():
+            if k not in ("uid", "world", "director", "assets", "config", "profiler"):
+                setattr(rv, k, copy.deepcopy(v, memo))
         return rv
 
     def build(self, *args: tuple[type], **kwargs):
@@ -99,18 +134,20 @@ class StoryBuilder:
 
     def action(self, text: str, *args, **kwargs):
         drama = self.context
-        actions = drama.actions(
-            text,
-            context=self.director,
-            ensemble=drama.ensemble,
-            prefix=drama.prefixes[0],
-        )
-        rank, fn, args, kwargs = drama.pick(actions)
+        with self.profiler.stage("match"):
+            actions = drama.actions(
+                text,
+                context=self.director,
+                ensemble=drama.ensemble,
+                prefix=drama.prefixes[0],
+            )
+            rank, fn, args, kwargs = drama.pick(actions)
         if not fn:
             return None
 
         try:
-            drama.speech.extend(drama(fn, *args, **kwargs))
+            with self.profiler.stage("action"):
+                drama.speech.extend(drama(fn, *args, **kwargs))
         except Exception as e:
             warnings.warn(e)
 
@@ -127,30 +164,34 @@ class StoryBuilder:
             speech = list(self.gather_speech(*[i.speech for i in self.drama]))
         # Director selection
         drama = self.context
-        scripts = drama.scripts(self.assets.get(Loader.Scene, []))
-        scene, specs, roles = self.director.selection(scripts, drama.ensemble)
+        with self.profiler.stage("selection"):
+            scripts = drama.scripts(self.assets.get(Loader.Scene, []))
+            scene, specs, roles = self.director.selection(scripts, drama.ensemble)
         assert isinstance(scene, Loader.Scene), f"{type(scene)} is not a Scene"
 
-        blocks = list(self.director.rewrite(scene, roles, speech))
-        rv = Turn(scene, specs, roles, speech, blocks, self.director.notes.copy())
+        with self.profiler.stage("rewrite"):
+            blocks = list(self.director.rewrite(scene, roles, speech))
+        rv = self.latest = Turn(scene, specs, roles, speech, blocks, self.director.notes)
 
         # Directive handlers
         n = 0
-        for block, (key, note) in zip(blocks, self.director.notes.items()):
-            for m in note.maps:
-                for (action, entity, entities) in m.get("directives", []):
-                    method = getattr(drama, f"{drama.prefixes[1]}{action}", None)
-                    if isinstance(method, Callable):
-                        try:
-                            method(entity, *entities, identifier=key, **rv._asdict())
-                        except Exception as e:
-                            warnings.warn(f"Error in directive handler {method}")
-                            warnings.warn(str(e))
-                    n += 1
+        with self.profiler.stage("directives"):
+            for block, (key, note) in zip(blocks, self.director.notes.items()):
+                for m in note.maps:
+                    for (action, entity, entities) in m.get("directives", []):
+                        method = getattr(drama, f"{drama.prefixes[1]}{action}", None)
+                        if isinstance(method, Callable):
+                            try:
+                                method(entity, *entities, identifier=key, **rv._asdict())
+                            except Exception as e:
+                                warnings.warn(f"Error in directive handler {method}")
+                                warnings.warn(str(e))
+                        n += 1
 
         drama.set_state(Detail.none)
         return rv
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.director.notes.clear()
+        # The Turn keeps its notes. The Director starts a fresh log.
+        self.director.notes = type(self.director.notes)()
         return False
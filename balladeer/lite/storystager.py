@@ -95,6 +95,13 @@ class StoryStager(StoryBuilder):
         rv = self.__class__(*speech, config=config, assets=assets)
         return rv
 
+    def spawn(self, memo: dict = None):
+        memo = {} if memo is None else memo
+        stager = memo[id(self.stager)] = copy.copy(self.stager)
+        stager._active = self.stager._active.copy()
+        stager.strands = copy.deepcopy(self.stager.strands, memo)
+        return super().spawn(memo)
+
     def make(self, **kwargs):
         self.drama: dict[tuple[str, str], Drama] = {
             (realm, name): self.build(realm, name) for (realm, name) in self.stager.puzzles
@@ -146,11 +153,10 @@ class StoryStager(StoryBuilder):
             ).set_state(*states)
 
             if item_type is Transit:
-                self.world.map.transits.append(entity)
+                self.world.map.add(entity)
             else:
-                self.world.entities.append(entity)
+                self.world.add(entity)
 
-        self.world.typewise = Grouping.typewise(self.world.entities)
         return drama
 
     @property
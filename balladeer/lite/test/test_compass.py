@@ -17,7 +17,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import dataclasses
 import enum
+import pickle
 import unittest
 
 from balladeer.lite.compass import Compass
@@ -81,3 +83,138 @@ class MapTests(unittest.TestCase):
         r = m.route(m.spot.kitchen, m.spot.bedroom)
         self.assertEqual(3, len(r))
         self.assertEqual(3, len(set(r)))
+
+    def test_options_index(self):
+        m = MapTests.Map(MapTests.Map.spots)
+        arcs = list(m.topology)
+        self.assertEqual(6, len(arcs))
+        self.assertEqual(["bedroom door", "bedroom door"], arcs[0][2].names + arcs[1][2].names)
+
+        door = next(i for i in m.transits if "kitchen door" in i.names)
+        door.set_state(Traffic.forward)
+        self.assertEqual(2, len(m.options(m.spot.hall)))
+        self.assertEqual({m.spot.hall}, {i[1] for i in m.options(m.spot.kitchen)})
+        self.assertEqual(5, len(list(m.topology)))
+
+        door.set_state(Traffic.reverse)
+        self.assertEqual(
+            {m.spot.bedroom, m.spot.kitchen, m.spot.stairs}, {i[1] for i in m.options(m.spot.hall)}
+        )
+        self.assertFalse(m.options(m.spot.kitchen))
+
+        door.set_state(m.exit.bedroom)
+        self.assertFalse(m.options(m.spot.kitchen))
+        self.assertEqual({m.spot.hall}, {i[1] for i in m.options(m.spot.bedroom)})
+        self.assertEqual([m.spot.hall, m.spot.bedroom], m.route(m.spot.hall, m.spot.bedroom))
+
+    def test_options_direct_append(self):
+        m = MapTests.Map(MapTests.Map.spots)
+        self.assertFalse(m.options(m.spot.inventory))
+        m.transits.append(Transit().set_state(m.exit.hall, m.into.inventory, Traffic.forward))
+        self.assertFalse(m.options(m.spot.inventory))
+        self.assertIn(m.spot.inventory, {i[1] for i in m.options(m.spot.hall)})
+
+    def test_route_invalidation(self):
+        m = MapTests.Map(MapTests.Map.spots)
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+        self.assertIn(("kitchen", "stairs"), m.routes)
+
+        door = next(i for i in m.transits if "kitchen door" in i.names)
+        door.set_state(Traffic.blocked)
+        self.assertFalse(m.routes)
+        self.assertEqual([], m.route(m.spot.kitchen, m.spot.stairs))
+
+        door.set_state(Traffic.forward)
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+        self.assertEqual([], m.route(m.spot.stairs, m.spot.kitchen))
+
+    def test_map_field(self):
+        @dataclasses.dataclass(kw_only=True, unsafe_hash=True)
+        class Portal(Transit):
+            map: str = "Elsewhere"
+
+        m = MapTests.Map(MapTests.Map.spots)
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+        portal = Portal(name="portal")
+        m.add(portal.set_state(m.exit.kitchen, m.into.stairs, Traffic.flowing))
+        self.assertEqual([m.spot.kitchen, m.spot.stairs], m.route(m.spot.kitchen, m.spot.stairs))
+
+        portal.set_state(Traffic.blocked)
+        self.assertEqual("Elsewhere", portal.map)
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+
+    def test_route_to_self(self):
+        m = MapTests.Map(MapTests.Map.spots)
+        self.assertEqual([m.spot.hall], m.route(m.spot.hall, m.spot.hall))
+        self.assertEqual([], m.route(m.spot.hall, m.spot.inventory))
+
+    def test_route_added_transit(self):
+        m = MapTests.Map(MapTests.Map.spots)
+        self.assertEqual(3, len(m.route(m.spot.bedroom, m.spot.kitchen)))
+        m.add(Transit(name="secret door").set_state(m.exit.bedroom, m.into.kitchen, Traffic.flowing))
+        self.assertEqual([m.spot.bedroom, m.spot.kitchen], m.route(m.spot.bedroom, m.spot.kitchen))
+
+    def test_route_spawn(self):
+        m = MapTests.Map(MapTests.Map.spots)
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+
+        s = m.spawn()
+        self.assertTrue(all(i._map is s for i in s.transits))
+        door = next(i for i in s.transits if "kitchen door" in i.names)
+        door.set_state(Traffic.blocked)
+        self.assertEqual([], s.route(s.spot.kitchen, s.spot.stairs))
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+
+    def test_route_pickle(self):
+        m = MapTests.Map(MapTests.Map.spots)
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+
+        s = pickle.loads(pickle.dumps(m))
+        self.assertIsNone(s.indexed)
+        self.assertFalse(s.arcs)
+        self.assertEqual(3, len(s.route(s.spot.kitchen, s.spot.stairs)))
+        self.assertEqual({id(i) for i in s.transits}, set(s.arcs))
+
+        door = next(i for i in s.transits if "kitchen door" in i.names)
+        door.set_state(Traffic.blocked)
+        self.assertEqual([], s.route(s.spot.kitchen, s.spot.stairs))
+        self.assertEqual(3, len(m.route(m.spot.kitchen, m.spot.stairs)))
+
+    def test_weighted_route(self):
+
+        class Weighted(MapTests.Map):
+            def weight(self, transit):
+                return 10 if "long way" in transit.names else 1
+
+        m = MapTests.Map(MapTests.Map.spots)
+        w = Weighted(MapTests.Map.spots)
+        w.add(Transit(name="long way").set_state(m.exit.kitchen, m.into.stairs, Traffic.flowing))
+        m.add(Transit(name="long way").set_state(m.exit.kitchen, m.into.stairs, Traffic.flowing))
+        self.assertEqual(2, len(m.route(m.spot.kitchen, m.spot.stairs)))
+        self.assertEqual(3, len(w.route(w.spot.kitchen, w.spot.stairs)))
+
+
+class GridTests(unittest.TestCase):
+
+    class Grid(MapBuilder):
+        side = 20
+
+        def build(self, **kwargs):
+            for n in range(self.side * self.side):
+                x, y = divmod(n, self.side)
+                if y + 1 < self.side:
+                    yield Transit().set_state(
+                        self.exit[f"s{n}"], Compass.E, self.into[f"s{n + 1}"], Traffic.flowing
+                    )
+                if x + 1 < self.side:
+                    yield Transit().set_state(
+                        self.exit[f"s{n}"], Compass.N, self.into[f"s{n + self.side}"], Traffic.flowing
+                    )
+
+    def test_large_grid(self):
+        spots = {f"s{n}": [f"spot {n}"] for n in range(self.Grid.side * self.Grid.side)}
+        m = self.Grid(spots)
+        self.assertGreater(len(spots), m.precompute)
+        r = m.route(m.spot.s0, m.spot.s399)
+        self.assertEqual(39, len(r))
+        self.assertEqual(1, len(m.trees))
@@ -25,6 +25,7 @@ import tomllib
 
 from balladeer.lite.director import Director
 from balladeer.lite.entity import Entity
+from balladeer.lite.loader import Loader
 from balladeer.lite.speech import Speech
 from balladeer.lite.speech import Prologue
 from balladeer.lite.speech import Dialogue
@@ -680,6 +681,151 @@ class RoleTests(unittest.TestCase):
         self.assertEqual(entities["Biffy"], rv["CHARACTER_2"])
 
 
+class NotesTests(unittest.TestCase):
+
+    def test_note_layers(self):
+        note = Director.Note()
+        note["type"] = "cue"
+        self.assertIs(note, note.new_child(pause=1))
+        note["entity"] = "Rusty"
+        note.new_child({"type": "para"})
+
+        self.assertEqual("para", note["type"])
+        self.assertEqual(1, note["pause"])
+        self.assertEqual(["type", "pause", "entity"], list(note))
+        self.assertEqual(3, len(note))
+        self.assertEqual(
+            [{"type": "para"}, {"pause": 1, "entity": "Rusty"}, {"type": "cue"}],
+            note.maps
+        )
+        self.assertEqual(["cue"], [i["type"] for i in reversed(note.maps) if i.get("type") == "cue"])
+        self.assertIsNone(note.get("offer"))
+        self.assertRaises(KeyError, note.__getitem__, "offer")
+
+    def test_cursor(self):
+        notes = Director.Notes()
+        self.assertIsNone(notes.cursor)
+        self.assertFalse(notes[("a", 0)])
+        notes[("b", 0)]["type"] = "cue"
+        self.assertEqual(("b", 0), notes.cursor)
+        self.assertEqual("cue", notes.current["type"])
+
+        notes[("a", 0)].new_child(type="para")
+        self.assertEqual(("b", 0), notes.cursor)
+        self.assertEqual([("a", 0), ("b", 0)], list(notes))
+
+        rv = notes.copy()
+        self.assertIsInstance(rv, Director.Notes)
+        self.assertEqual(("b", 0), rv.cursor)
+        del notes[("b", 0)]
+        self.assertEqual(("a", 0), notes.cursor)
+        notes.clear()
+        self.assertIsNone(notes.cursor)
+
+    def test_edit(self):
+        text = textwrap.dedent("""
+        <WEAPON.attacking@FIGHTER_2:shouts/slapwhack>
+
+            _Whack!_
+
+        <FIGHTER_2>
+
+            Uuurrggh!
+
+            Ow!
+
+        """).strip()
+        director = Director()
+        selection = {
+            "WEAPON": Entity(name="Rusty"),
+            "FIGHTER_2": Entity(name="Bashy"),
+        }
+
+        edit = list(director.edit(Speech(text), selection))
+        self.assertEqual(2, len(director.notes))
+        self.assertEqual(list(director.notes)[-1], director.notes.cursor)
+        self.assertIs(selection["FIGHTER_2"], director.notes.current["entity"])
+        delays = [i["delay"] for i in reversed(director.notes.current.maps) if "delay" in i]
+        self.assertEqual(3, len(delays))
+        self.assertEqual(sorted(delays), delays)
+
+
+class CastingTests(unittest.TestCase):
+
+    class Mood(State, enum.Enum):
+        calm = 0
+        angry = 1
+
+    class Feline(Entity):
+        pass
+
+    def setUp(self):
+        self.ensemble = [
+            Entity(name="Biffy", types={"Animal", "Canine"}).set_state(self.Mood.calm),
+            self.Feline(name="Bashy", types={"Animal"}).set_state(self.Mood.angry, 3),
+            Entity(name="Rusty", type="Weapon"),
+        ]
+        self.ensemble[2].sharp = True
+
+    def test_select_types(self):
+        casting = Director.Casting(self.ensemble)
+        self.assertEqual({0, 1}, casting.select({"Animal"}, {}, {}))
+        self.assertEqual({0}, casting.select({"Animal", "Canine"}, {}, {}))
+        self.assertEqual({1}, casting.select({"Feline", "Canine", "Animal"}, {}, {}))
+        self.assertEqual({0, 1, 2}, casting.select(set(), {}, {}))
+
+    def test_select_states(self):
+        casting = Director.Casting(self.ensemble)
+        self.assertEqual({1}, casting.select(set(), {"Mood": {"angry"}}, {}))
+        self.assertEqual({0, 1}, casting.select(set(), {"Mood": {"angry", "calm"}}, {}))
+        self.assertEqual({1}, casting.select(set(), {"int": {3}}, {}))
+        self.assertFalse(casting.select({"Weapon"}, {"int": {3}}, {}))
+
+    def test_select_attributes(self):
+        casting = Director.Casting(self.ensemble)
+        self.assertEqual({2}, casting.select(set(), {}, {"sharp": True}))
+        self.assertFalse(casting.select(set(), {}, {"sharp": False}))
+
+    def test_specify_scene(self):
+        content = textwrap.dedent("""
+            [CAT]
+            type = "Feline"
+            state = "Mood.angry"
+
+            [DOG]
+            type = "Canine"
+
+            [[_]]
+            s="<CAT> Hiss!"
+        """)
+        scene = Loader.Scene(content, tomllib.loads(content))
+        director = Director()
+        specs, ranking = director.specify_scene(scene)
+        self.assertEqual({"CAT", "DOG"}, set(specs))
+        self.assertEqual(["CAT", "DOG"], [role for role, spec in ranking])
+        self.assertIs(ranking, director.specify_scene(scene)[1])
+
+        rv, specs, roles = director.selection([scene], self.ensemble)
+        self.assertIs(rv, scene)
+        self.assertEqual("Bashy", roles["CAT"].name)
+        self.assertEqual("Biffy", roles["DOG"].name)
+
+    def test_rankings_bounded(self):
+        director = Director()
+        director.rankings_size = 2
+        scenes = [Loader.Scene("", {"HERO": {"type": f"Type{n}"}}) for n in range(3)]
+        for scene in scenes:
+            director.specify_scene(scene)
+        self.assertEqual([id(i.tables) for i in scenes[1:]], list(director.rankings))
+
+        director.specify_scene(scenes[1])
+        director.specify_scene(scenes[0])
+        self.assertEqual([id(i.tables) for i in (scenes[1], scenes[0])], list(director.rankings))
+
+        rv = copy.deepcopy(director)
+        self.assertFalse(rv.rankings)
+
+
 class ParametersTests(unittest.TestCase):
     def test_paragraph_reveal(self):
         text = textwrap.dedent("""
@@ -1025,3 +1171,59 @@ class RewriteTests(unittest.TestCase):
                     self.assertEqual(2, len(maps))
 
         self.assertEqual(3, len(rv))
+
+    def test_precompiled_rewrite(self):
+        content = textwrap.dedent('''
+            [GUEST]
+            [STAFF]
+
+            [[_]]
+            s="""
+            <STAFF?class=polite> Can I help you, sir?
+            """
+
+            [[_]]
+            s="""
+            <GUEST.shouting@STAFF> I'd like to order a taxi, please.
+
+            For eight o' clock.
+
+            <STAFF#2> Certainly.
+            """
+        ''')
+        tables = tomllib.loads(content)
+        scenes = [
+            Loader.Scene(content, tables),
+            Loader.Scene(content, tables, cues=Loader.compile_cues(tables)),
+        ]
+        directors = [Director(), Director()]
+        rv = [list(d.rewrite(scene, self.roles)) for d, scene in zip(directors, scenes)]
+
+        self.assertEqual(3, len(rv[1]))
+        self.assertEqual(rv[0], rv[1])
+        self.assertEqual(directors[0].delay, directors[1].delay)
+        self.assertEqual(
+            [list(i.maps) for i in directors[0].notes.values()],
+            [list(i.maps) for i in directors[1].notes.values()],
+        )
+
+    def test_precompiled_other_keys(self):
+        content = textwrap.dedent('''
+            [GUEST]
+            [STAFF]
+
+            [[_]]
+            s="""
+            <STAFF> Can I help you, sir?
+            """
+            d="""
+            <GUEST> A taxi, please.
+            """
+        ''')
+        tables = tomllib.loads(content)
+        scene = Loader.Scene(content, tables, cues=Loader.compile_cues(tables))
+        rv = list(Director(dialogue_key="d").rewrite(scene, self.roles))
+        self.assertEqual(1, len(rv))
+        self.assertIn("A taxi, please.", rv[0][1])
+        self.assertNotIn("Can I help you", rv[0][1])
+
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import re
+import threading
+import time
+import unittest
+import uuid
+import warnings
+
+import httpx
+from starlette.testclient import TestClient
+
+from balladeer.lite.app import app_factory
+from balladeer.lite.dispatcher import Dispatcher
+from balladeer.lite.drama import Drama
+from balladeer.lite.speech import Dialogue
+from balladeer.lite.storybuilder import StoryBuilder
+from balladeer.lite.types import Grouping
+
+
+class DispatcherTests(unittest.TestCase):
+
+    def test_inline(self):
+        dispatcher = Dispatcher()
+        rv = asyncio.run(dispatcher.run(uuid.uuid4(), threading.get_ident))
+        self.assertEqual(threading.get_ident(), rv)
+        self.assertFalse(dispatcher.locks)
+
+    def test_executor(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            dispatcher = Dispatcher(executor)
+            rv = asyncio.run(dispatcher.run(uuid.uuid4(), threading.get_ident))
+        self.assertNotEqual(threading.get_ident(), rv)
+
+    def test_serialized(self):
+        events = []
+
+        def turn(name, delay):
+            events.append(f"{name} begin")
+            time.sleep(delay)
+            events.append(f"{name} end")
+            return name
+
+        async def play(dispatcher):
+            a, b = uuid.uuid4(), uuid.uuid4()
+            return await asyncio.gather(
+                dispatcher.run(a, turn, "a1", 0.05),
+                dispatcher.run(a, turn, "a2", 0),
+                dispatcher.run(b, turn, "b1", 0),
+            )
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            dispatcher = Dispatcher(executor)
+            rv = asyncio.run(play(dispatcher))
+
+        self.assertEqual(["a1", "a2", "b1"], rv)
+        self.assertLess(events.index("a1 end"), events.index("a2 begin"))
+        self.assertLess(events.index("b1 end"), events.index("a1 end"))
+        self.assertFalse(dispatcher.locks)
+        self.assertFalse(dispatcher.pending)
+
+    def test_coalesced(self):
+        calls = []
+
+        def turn(name):
+            calls.append(name)
+            time.sleep(0.02)
+            return name
+
+        async def play(dispatcher):
+            session_id = uuid.uuid4()
+            return await asyncio.gather(
+                dispatcher.run(session_id, turn, "a", key="a"),
+                dispatcher.run(session_id, turn, "a", key="a"),
+                dispatcher.run(session_id, turn, "b", key="b"),
+            )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            dispatcher = Dispatcher(executor)
+            rv = asyncio.run(play(dispatcher))
+
+        self.assertEqual(["a", "a", "b"], rv)
+        self.assertEqual(["a", "b"], calls)
+        self.assertFalse(dispatcher.inflight)
+
+    def test_coalesced_error(self):
+        def turn():
+            time.sleep(0.02)
+            raise KeyError("No story")
+
+        async def play(dispatcher):
+            session_id = uuid.uuid4()
+            return await asyncio.gather(
+                dispatcher.run(session_id, turn, key="a"),
+                dispatcher.run(session_id, turn, key="a"),
+                return_exceptions=True,
+            )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            rv = asyncio.run(play(Dispatcher(executor)))
+        self.assertTrue(all(isinstance(i, KeyError) for i in rv), rv)
+
+    def test_completed(self):
+        calls = []
+
+        def turn(name):
+            calls.append(name)
+            return name
+
+        async def play(dispatcher):
+            session_id = uuid.uuid4()
+            rv = [await dispatcher.run(session_id, turn, name, key=name, remember=True) for name in "abbacb"]
+            rv.append(await dispatcher.run(uuid.uuid4(), turn, "a", key="a", remember=True))
+            rv.append(await dispatcher.run(session_id, turn, "d", key="d"))
+            rv.append(await dispatcher.run(session_id, turn, "d", key="d"))
+            return rv
+
+        dispatcher = Dispatcher()
+        dispatcher.memory = 2
+        rv = asyncio.run(play(dispatcher))
+        self.assertEqual(["a", "b", "b", "a", "c", "b", "a", "d", "d"], rv)
+        self.assertEqual(["a", "b", "c", "b", "a", "d", "d"], calls)
+        self.assertEqual(2, len(dispatcher.completed))
+
+    def test_busy(self):
+        async def play(dispatcher):
+            session_id = uuid.uuid4()
+            return await asyncio.gather(
+                *(dispatcher.run(session_id, time.sleep, 0.02) for n in range(4)),
+                dispatcher.run(uuid.uuid4(), time.sleep, 0),
+                return_exceptions=True,
+            )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            dispatcher = Dispatcher(executor)
+            dispatcher.limit = 2
+            rv = asyncio.run(play(dispatcher))
+
+        self.assertEqual([None, None], rv[:2])
+        self.assertTrue(all(isinstance(i, Dispatcher.Busy) for i in rv[2:4]), rv)
+        self.assertIsNone(rv[4])
+
+
+class ExecutorEndpointTests(unittest.TestCase):
+
+    class Greeting(Drama):
+        running = 0
+        calls = []
+
+        def do_wave(self, this, text, director, *args, **kwargs):
+            """
+            wave
+
+            """
+            cls = type(self)
+            cls.running += 1
+            cls.calls.append(cls.running)
+            time.sleep(0.02)
+            cls.running -= 1
+            yield Dialogue("<> You wave.")
+
+    # Distinct commands with the same effect
+    spellings = ["wave", "Wave", "WAVE", "the wave", "a wave"]
+
+    class Story(StoryBuilder):
+        def build(self, **kwargs):
+            yield ExecutorEndpointTests.Greeting(
+                Dialogue("<> Hello, `wave` to me."), world=self.world, config=self.config
+            )
+
+    def setUp(self):
+        self.Greeting.calls = []
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.app = asyncio.run(
+            app_factory(assets=Grouping(list), story_builder=self.Story(), executor=self.executor)
+        )
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def post_commands(self, *commands, nonces=None):
+        nonces = nonces or [uuid.uuid4().hex for i in commands]
+        transport = httpx.ASGITransport(app=self.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://balladeer") as client:
+            url = (await client.post("/sessions")).headers["location"]
+            return await asyncio.gather(
+                *(
+                    client.post(
+                        f"{url}/command",
+                        data={"ballad-command-form-input-text": i, "ballad-command-form-input-nonce": n},
+                    )
+                    for i, n in zip(commands, nonces)
+                )
+            )
+
+    def test_coalesced_commands(self):
+        responses = asyncio.run(self.post_commands("wave", "wave", "wave", nonces=["a", "a", "a"]))
+        self.assertEqual([303, 303, 303], [i.status_code for i in responses])
+        self.assertEqual([1], self.Greeting.calls)
+
+    def test_repeated_commands(self):
+        responses = asyncio.run(self.post_commands("wave", "wave", nonces=["a", "b"]))
+        self.assertEqual([303, 303], [i.status_code for i in responses])
+        self.assertEqual([1, 1], self.Greeting.calls)
+
+    def test_resubmitted_command(self):
+        client = TestClient(self.app)
+        url = client.post("/sessions").url
+        data = {"ballad-command-form-input-text": "wave", "ballad-command-form-input-nonce": "a"}
+        responses = [client.post(f"{url}/command", data=data, follow_redirects=False) for n in range(2)]
+        self.assertEqual([303, 303], [i.status_code for i in responses])
+        self.assertEqual([1], self.Greeting.calls)
+
+    def test_nonce_in_forms(self):
+        client = TestClient(self.app)
+        pattern = re.compile('name="ballad-command-form-input-nonce" value="([0-9a-f]+)"')
+        nonces = [pattern.findall(client.post("/sessions").text) for n in range(2)]
+        self.assertEqual([2, 2], [len(i) for i in nonces])
+        self.assertEqual(4, len(set(nonces[0] + nonces[1])))
+
+    def test_serialized_commands(self):
+        responses = asyncio.run(self.post_commands(*self.spellings[:4]))
+        self.assertEqual([303] * 4, [i.status_code for i in responses])
+        self.assertEqual([1, 1, 1, 1], self.Greeting.calls)
+
+    def test_too_many_commands(self):
+        self.app.state.dispatcher.limit = 2
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            responses = asyncio.run(self.post_commands(*self.spellings))
+        self.assertEqual([303, 303, 429, 429, 429], [i.status_code for i in responses])
+        self.assertEqual("1", responses[-1].headers["Retry-After"])
+        self.assertEqual([1, 1], self.Greeting.calls)
+
+
+    def test_render_in_executor(self):
+        threads = []
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="turns") as executor:
+            app = asyncio.run(
+                app_factory(
+                    assets=Grouping(list), story_builder=StoryBuilder(Dialogue("<> Hello.")), executor=executor
+                )
+            )
+            sanitize = app.state.presenter.sanitize
+
+            def record(html5):
+                threads.append(threading.current_thread().name)
+                return sanitize(html5)
+
+            app.state.presenter.sanitize = record
+            response = TestClient(app).post("/sessions")
+
+        self.assertIn("Hello", response.text)
+        self.assertTrue(threads)
+        self.assertTrue(all(i.startswith("turns") for i in threads), threads)
+
+    def test_head_first(self):
+        events = []
+
+        async def get(app, path: str):
+            scope = dict(
+                type="http", http_version="1.1", method="GET", scheme="http", server=("balladeer", 80),
+                path=path, raw_path=path.encode(), root_path="", query_string=b"", headers=[],
+            )
+            messages = [{"type": "http.request", "body": b"", "more_body": False}]
+            done = asyncio.Event()
+
+            async def receive():
+                if messages:
+                    return messages.pop(0)
+                await done.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.body" and message["body"]:
+                    events.append(message["body"].decode())
+
+            await app(scope, receive, send)
+            done.set()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            app = asyncio.run(
+                app_factory(
+                    assets=Grouping(list), story_builder=StoryBuilder(Dialogue("<> Hello.")), executor=executor
+                )
+            )
+            sanitize = app.state.presenter.sanitize
+
+            def record(html5):
+                events.append(("cue", bool(app.state.dispatcher.locks)))
+                return sanitize(html5)
+
+            app.state.presenter.sanitize = record
+            response = TestClient(app).post("/sessions", follow_redirects=False)
+            path = httpx.URL(response.headers["location"]).path
+            asyncio.run(get(app, path))
+
+        # The cue renders after the session is released and the head is sent
+        self.assertIn(("cue", False), events)
+        n = events.index(("cue", False))
+        self.assertIn("</head>", "".join(events[:n]))
+        self.assertIn("Hello", "".join(events[n + 1:]))
+
+    def test_session(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            app = asyncio.run(
+                app_factory(
+                    assets=Grouping(list), story_builder=StoryBuilder(Dialogue("<> Hello.")), executor=executor
+                )
+            )
+            client = TestClient(app)
+            response = client.post("/sessions")
+            self.assertEqual(200, response.status_code)
+            self.assertIn("Hello", response.text)
+
+            session_id = response.url.path.split("/")[-1]
+            response = client.post(
+                f"/session/{session_id}/command", data={"ballad-command-form-input-text": "help"},
+                follow_redirects=False,
+            )
+            self.assertEqual(303, response.status_code)
+
+            response = client.get(f"/session/{session_id}/assembly")
+            self.assertEqual(200, response.status_code)
+            self.assertIn("ensemble", response.json())
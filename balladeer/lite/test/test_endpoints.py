@@ -19,19 +19,39 @@
 #!/usr/bin/env python
 # encoding: utf8
 
+import asyncio
+import contextlib
+import io
+import json
 import pathlib
+import shutil
+import tempfile
+import time
 import unittest
 from unittest.mock import Mock
+import uuid
+import warnings
 
 from starlette.applications import Starlette
 from starlette.datastructures import State
 from starlette.requests import Request
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 
 from balladeer import Dialogue
+from balladeer import Drama
+from balladeer import Entity
+from balladeer import Grouping
 from balladeer import Page
 from balladeer import Presenter
 from balladeer import Session
 from balladeer import StoryBuilder
+from balladeer import WorldBuilder
+from balladeer.lite.app import app_factory
+from balladeer.lite.app import discover_assets
+from balladeer.lite.app import Assembly
+from balladeer.lite.app import Home
+from balladeer.lite.loader import Loader
 
 
 class ActionButtonTests(unittest.TestCase):
@@ -97,3 +117,267 @@ class ActionButtonTests(unittest.TestCase):
             None
         )
         self.assertTrue(action_form, lines)
+
+
+class AssemblyTests(unittest.TestCase):
+
+    class World(WorldBuilder):
+        def build(self):
+            yield Entity(name="Lamp", links={"b", "a"}).set_state(1)
+
+    def setUp(self):
+        story = StoryBuilder(Dialogue("<> Hello."), world=self.World())
+        app = asyncio.run(app_factory(assets=Grouping(list), story_builder=story))
+        self.client = TestClient(app)
+        response = self.client.post("/sessions")
+        self.url = str(response.url) + "/assembly"
+        self.story = next(iter(app.state.sessions.values()))
+
+    def test_assembly(self):
+        response = self.client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        data = response.json()
+        self.assertIn("Lamp", [i["names"][0] for i in data["ensemble"] if i["names"]])
+        self.assertIn(["a", "b"], [i["links"] for i in data["ensemble"]])
+        self.assertEqual(
+            json.loads(Entity.Encoder().encode(dict(ensemble=self.story.context.ensemble))),
+            dict(ensemble=data["ensemble"])
+        )
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        tag = response.headers["ETag"]
+
+        response = self.client.get(self.url, headers={"If-None-Match": tag})
+        self.assertEqual(304, response.status_code)
+        self.assertFalse(response.content)
+
+        lamp = self.story.world.typewise[Entity][0]
+        lamp.set_state(2)
+        response = self.client.get(self.url, headers={"If-None-Match": tag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(tag, response.headers["ETag"])
+
+    def test_patch(self):
+        data = self.client.get(self.url).json()
+        version = data["version"]
+        self.assertIn("ensemble", data)
+
+        data = self.client.get(self.url, params=dict(since=version)).json()
+        self.assertEqual(version, data["version"])
+        self.assertEqual([], data["patch"])
+
+        lamp = self.story.world.typewise[Entity][0]
+        lamp.set_state(2)
+        data = self.client.get(self.url, params=dict(since=version)).json()
+        self.assertEqual(version + 1, data["version"])
+        self.assertEqual(1, len(data["patch"]), data)
+        op = data["patch"][0]
+        self.assertEqual("replace", op["op"])
+        self.assertEqual(f"/ensemble/{lamp.uid}", op["path"])
+        self.assertEqual(2, op["value"]["states"]["int"])
+
+        self.story.world.discard(lamp)
+        data = self.client.get(self.url, params=dict(since=version)).json()
+        self.assertEqual([{"op": "remove", "path": f"/ensemble/{lamp.uid}"}], data["patch"])
+
+        data = self.client.get(self.url, params=dict(since=-1)).json()
+        self.assertNotIn("patch", data)
+        self.assertIn("ensemble", data)
+
+    def test_journal(self):
+        journal = Assembly.Journal(maxlen=2)
+        encoder = Entity.Encoder()
+        a, b = Entity(name="a"), Entity(name="b")
+        self.assertEqual(1, journal.record([a], encoder))
+        self.assertEqual(1, journal.record([a], encoder))
+        self.assertEqual(2, journal.record([a, b], encoder))
+        self.assertEqual(3, journal.record([b], encoder))
+        self.assertEqual([("remove", str(a.uid), None)], journal.since(2))
+        self.assertEqual(
+            [("add", str(b.uid), journal.snapshot[str(b.uid)]), ("remove", str(a.uid), None)],
+            journal.since(1)
+        )
+        self.assertIsNone(journal.since(0))
+
+
+class ChannelTests(unittest.TestCase):
+
+    class Greeting(Drama):
+        def do_wave(self, this, text, director, *args, **kwargs):
+            """
+            wave
+
+            """
+            yield Dialogue("<> You wave. I wave back.")
+
+    class Story(StoryBuilder):
+        def build(self, **kwargs):
+            yield ChannelTests.Greeting(Dialogue("<> Hello, `wave` to me."), world=self.world, config=self.config)
+
+    def setUp(self):
+        self.app = asyncio.run(app_factory(assets=Grouping(list), story_builder=self.Story()))
+        self.client = TestClient(self.app)
+        response = self.client.post("/sessions", follow_redirects=False)
+        self.url = response.headers["location"].replace("http://testserver", "") + "/channel"
+
+    def test_turns(self):
+        with self.client.websocket_connect(self.url) as ws:
+            data = ws.receive_json()
+            self.assertEqual(1, len(data["cues"]))
+            self.assertIn("Hello", data["cues"][0])
+            self.assertIn("wave", data["options"])
+            self.assertEqual(0, data["offer"])
+
+            ws.send_json({"command": "wave"})
+            data = ws.receive_json()
+            self.assertEqual(1, len(data["cues"]))
+            self.assertIn("You wave. I wave back.", data["cues"][0])
+            self.assertNotIn("Hello", data["cues"][0])
+            self.assertIn("wave", data["options"])
+
+            ws.send_json(["wave"])
+            data = ws.receive_json()
+            self.assertIn("error", data)
+
+    def test_connect_from_page(self):
+        response = self.client.get(self.url.removesuffix("/channel"))
+        self.assertIn("Hello", response.text)
+        story = next(iter(self.app.state.sessions.values()))
+        turn = story.latest
+
+        with self.client.websocket_connect(self.url) as ws:
+            data = ws.receive_json()
+            self.assertEqual(1, len(data["cues"]))
+            self.assertIn("Hello", data["cues"][0])
+
+        self.assertIs(turn, next(iter(self.app.state.sessions.values())).latest)
+
+    def test_no_session(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            with self.assertRaises(WebSocketDisconnect):
+                with self.client.websocket_connect(f"/session/{uuid.uuid4()}/channel") as ws:
+                    ws.receive_json()
+
+
+class ShellTests(unittest.TestCase):
+
+    def setUp(self):
+        self.request = ActionButtonTests.mock_request()
+        static = self.request.app.state.static.resolve()
+        self.request.app.state.static = static
+        self.assets = Grouping(list)
+        for name in ("main.css", "dark.style.css", "app.js"):
+            typ = "application/javascript" if name.endswith(".js") else "text/css"
+            self.assets[typ].append(Loader.Asset(name, path=static.joinpath(name), type=typ))
+
+    def test_memo(self):
+        shell = Home.Shell(self.assets, self.request.app.state.static)
+        a = shell.css_links(self.request)
+        self.assertEqual(['<link rel="stylesheet" href="/static/main.css" />'], a)
+        self.assertIs(a, shell.css_links(self.request))
+        self.assertEqual(2, len(shell.css_links(self.request, "dark")))
+        self.assertEqual(1, len(shell.js_links(self.request)))
+
+        settings = StoryBuilder.settings("default", themes=Page.themes)
+        self.assertIs(shell.css_vars(settings), shell.css_vars(settings.copy()))
+        self.assertEqual(list(Home.render_css_vars(settings)), shell.css_vars(settings))
+
+        shell.clear()
+        self.assertIsNot(a, shell.css_links(self.request))
+
+    def test_replaced_assets(self):
+        class Endpoint(Home):
+            assets = self.assets
+
+        endpoint = Endpoint(dict(type="http"), None, None)
+        shell = Home.Shell.of(endpoint, self.request)
+        self.assertIs(shell, Home.Shell.of(endpoint, self.request))
+
+        Endpoint.assets = self.assets.copy()
+        self.assertIsNot(shell, Home.Shell.of(endpoint, self.request))
+
+    def test_media(self):
+        static = self.request.app.state.static
+        assets = Grouping.typewise(
+            Loader.Asset(name, path=static.joinpath(name), type=typ)
+            for name, typ in [
+                ("bell.mp3", "audio/mpeg"), ("bell.ogg", "audio/ogg"), ("door.png", "image/png"),
+                ("intro.mp4", "video/mp4"), ("intro.vtt", "text/vtt"), ("notes.vtt", "text/vtt"),
+            ]
+        )
+
+        class Endpoint(Session):
+            pass
+
+        Endpoint.assets = assets
+        endpoint = Endpoint(dict(type="http"), None, None)
+        shell = Home.Shell.of(endpoint, self.request)
+        self.assertEqual({"audio/mpeg", "audio/ogg"}, set(shell.media["bell"]))
+        self.assertEqual({"video/mp4", "text/vtt"}, set(shell.media["intro"]))
+
+        html = "".join(endpoint.render_detail(self.request, "", ["bell", "door", "intro", "notes", "nil"], 1.5))
+        self.assertEqual(1, html.count("<audio "))
+        self.assertIn(
+            '<audio id="00-00" controls="controls" preload="auto">'
+            '<source src="/static/bell.mp3" type="audio/mpeg" />'
+            '<source src="/static/bell.ogg" type="audio/ogg" />'
+            '</audio>',
+            html
+        )
+        self.assertIn('<img src="/static/door.png" alt="door" />', html)
+        self.assertIn('<video id="00-00" controls="controls" preload="auto">', html)
+        self.assertIn('<source src="/static/intro.mp4" type="video/mp4" />', html)
+        self.assertIn('<track kind="subtitles" src="/static/intro.vtt" />', html)
+        self.assertNotIn("notes.vtt", html)
+        self.assertEqual(2, html.count("1500.0"))
+
+        door = shell.media["door"] | {
+            "image/webp": Loader.Asset("door.webp", path=static.joinpath("door.webp"), type="image/webp")
+        }
+        self.assertEqual(
+            [
+                "<picture>", '<source srcset="/static/door.webp" type="image/webp" />',
+                '<img src="/static/door.png" alt="door" />', "</picture>",
+            ],
+            list(endpoint.render_media("door", door)),
+        )
+
+        key = ("media", "bell", 1.5, 0, 0)
+        self.assertIn(key, shell.items)
+        self.assertIs(shell.items[key], shell.memo(key, list))
+
+
+class ReloadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = pathlib.Path(tempfile.mkdtemp(prefix="balladeer-", suffix="-test"))
+        self.path.joinpath("a.scene.toml").write_text("[[_]]\ns = 'Before.'\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_reload(self):
+        assets = discover_assets(self.path)
+        story_builder = StoryBuilder(assets=assets)
+        story = story_builder.spawn()
+        app = asyncio.run(
+            app_factory(
+                assets=assets, story_builder=story_builder, watcher=Loader.Watcher(self.path, interval=0.01)
+            )
+        )
+        endpoint = next(i.endpoint for i in app.routes if getattr(i, "name", "") == "session")
+        shell = endpoint.assets
+
+        with TestClient(app), contextlib.redirect_stderr(io.StringIO()):
+            self.path.joinpath("b.scene.toml").write_text("[[_]]\ns = 'After.'\n")
+            for n in range(200):
+                if len(story.assets[Loader.Scene]) == 2:
+                    break
+                time.sleep(0.01)
+
+        self.assertEqual(["a.scene.toml", "b.scene.toml"], [i.path.name for i in assets[Loader.Scene]])
+        self.assertEqual(2, len(story.assets[Loader.Scene]))
+        self.assertIsNot(shell, endpoint.assets)
+        self.assertEqual(2, len(endpoint.assets[Loader.Scene]))
@@ -20,8 +20,13 @@
 import copy
 import enum
 import json
+import os
+import pickle
+import sys
 import unittest
+import uuid
 
+from balladeer.lite.entity import CompactEntity
 from balladeer.lite.entity import Entity
 from balladeer.lite.types import State
 
@@ -180,6 +185,20 @@ class TestSerialization(unittest.TestCase):
         data = json.loads(s)
         self.assertTrue(data)
 
+    def test_fragment(self):
+        encoder = Entity.Encoder()
+        entity = Entity(name="Lamp", links={"b", "a"}).set_state(1)
+        a = encoder.fragment(entity)
+        self.assertEqual(encoder.encode(entity), a)
+        self.assertIs(a, encoder.fragment(entity))
+
+        entity.set_state(2)
+        b = encoder.fragment(entity)
+        self.assertEqual(2, json.loads(b)["states"]["int"])
+
+        entity.links.add("c")
+        self.assertEqual(["a", "b", "c"], json.loads(encoder.fragment(entity))["links"])
+
 
 class TestUpdate(unittest.TestCase):
     class Time(enum.Enum):
@@ -220,3 +239,69 @@ class TestUpdate(unittest.TestCase):
         e.update(aspect=self.Time.later.name, revert=e.aspect)
         self.assertEqual(e.description, "A bit later, I think.")
         self.assertEqual(e.revert, "early")
+
+
+class TestCompact(unittest.TestCase):
+    class Time(enum.Enum):
+        early = 0
+        later = 1
+
+    def test_slots(self):
+        e = CompactEntity(name="Chuck", type="Squirrel")
+        self.assertIsNone(e._states)
+        self.assertIsNone(e._links)
+        self.assertIsNone(e._uid)
+        self.assertIsNone(e.get_state(self.Time))
+        self.assertIsNone(e._states)
+        self.assertIsInstance(e.uid, uuid.UUID)
+        self.assertEqual(4, e.uid.version)
+        self.assertIs(e.names[0], sys.intern("Chuck"))
+        self.assertIsInstance(e, Entity)
+
+    def test_state(self):
+        e = CompactEntity().set_state(self.Time.early, 12)
+        e.update(state=self.Time.later, links={"a"}, aspect="Busy")
+        self.assertEqual(self.Time.later, e.get_state(self.Time))
+        self.assertEqual(12, e.state)
+        self.assertEqual({"a"}, e.links)
+        self.assertEqual("Busy", e.aspect)
+
+    def test_comparison(self):
+        a = Entity(name="Chuck", types={"Squirrel"}, states={"int": 1})
+        b = CompactEntity(name="Chuck", types={"Squirrel"})
+        self.assertEqual(a, b)
+        self.assertEqual(2, len({CompactEntity(), CompactEntity()}))
+
+    def test_encoder(self):
+        a = Entity(name="Chuck", types={"Squirrel"}, links={"a"}).set_state(self.Time.early)
+        b = CompactEntity(name="Chuck", types={"Squirrel"}, links={"a"}, uid=a.uid).set_state(self.Time.early)
+        self.assertEqual(Entity.Encoder().encode(a), Entity.Encoder().encode(b))
+
+    def test_copies(self):
+        a = CompactEntity(name="Chuck", links={"a"}).set_state(12)
+        for b in (a.spawn(), pickle.loads(pickle.dumps(a))):
+            with self.subTest(b=b):
+                self.assertEqual(a.uid, b.uid)
+                self.assertEqual(a.states, b.states)
+                b.links.add("b")
+                self.assertNotEqual(a.links, b.links)
+
+        c = copy.deepcopy(a)
+        self.assertNotEqual(a.uid, c.uid)
+        self.assertEqual(12, c.state)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "Needs os.fork")
+    def test_fork(self):
+        CompactEntity().uid
+        r, w = os.pipe()
+        pid = os.fork()
+        if not pid:
+            os.close(r)
+            os.write(w, CompactEntity().uid.bytes)
+            os._exit(0)
+
+        os.close(w)
+        uid = uuid.UUID(bytes=os.read(r, 16))
+        os.close(r)
+        os.waitpid(pid, 0)
+        self.assertNotEqual(CompactEntity().uid, uid)
@@ -18,9 +18,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 import copy
 import enum
 import operator
+import os
 import pathlib
 import shutil
 import sqlite3
@@ -28,6 +31,7 @@ import sys
 import tempfile
 import textwrap
 import unittest
+from unittest import mock
 import uuid
 
 from balladeer.lite.entity import Entity
@@ -55,6 +59,26 @@ class LoaderTests(unittest.TestCase):
         self.assertEqual(1, len(assets))
         self.assertIsInstance(assets[0], Loader.Scene)
 
+    def test_precompiled_scene(self):
+        text = textwrap.dedent("""
+        [NARRATOR]
+        type = "Narrator"
+
+        [[_]]
+        s = "<NARRATOR> Once upon a time."
+
+        [[_]]
+        s = "<NARRATOR> The end."
+        """)
+        self.path.joinpath("test.scene.toml").write_text(text)
+        scene = next(iter(Loader.discover(self.path)))
+        self.assertIsNone(scene.cues)
+
+        scene = next(iter(Loader.discover(self.path, precompile=True)))
+        self.assertEqual({"<NARRATOR> Once upon a time.", "<NARRATOR> The end."}, set(scene.cues))
+        self.assertEqual(1, len(scene.cues["<NARRATOR> The end."]))
+        self.assertIn("The end.", scene.cues["<NARRATOR> The end."][0].block)
+
     def test_sqlite_database(self):
         path = self.path.joinpath("test.db")
         con = sqlite3.connect(path)
@@ -98,6 +122,117 @@ class LoaderTests(unittest.TestCase):
                 self.assertTrue(next(i for i in styled["text/css"] if i.path.name == "basics.css"), False)
                 self.assertEqual(len(styled.each), 1 + selection.count("cover") + 2 * selection.count("gallery"))
 
+    def make_scenes(self, n=8):
+        for i in range(n):
+            text = textwrap.dedent(f"""
+            [NARRATOR]
+            type = "Narrator"
+
+            [[_]]
+            s = "<NARRATOR> Scene {i:02d}."
+            """)
+            self.path.joinpath(f"{i:02d}.scene.toml").write_text(text)
+        self.path.joinpath("config.toml").write_text("[DB]\nport = 5432\n")
+
+    def test_parallel(self):
+        self.make_scenes()
+        serial = sorted(Loader.discover(self.path, precompile=True), key=operator.attrgetter("path"))
+        for pool in (ThreadPoolExecutor, ProcessPoolExecutor):
+            with self.subTest(pool=pool):
+                assets = sorted(
+                    Loader.discover(self.path, precompile=True, workers=2, pool=pool),
+                    key=operator.attrgetter("path")
+                )
+                self.assertEqual([i.path for i in serial], [i.path for i in assets])
+                self.assertEqual([i.text for i in serial], [i.text for i in assets])
+                self.assertEqual(
+                    [next(iter(i.cues.values()))[0].block for i in serial if isinstance(i, Loader.Scene)],
+                    [next(iter(i.cues.values()))[0].block for i in assets if isinstance(i, Loader.Scene)],
+                )
+
+    def test_cache(self):
+        self.make_scenes(2)
+        path = self.path.joinpath("assets.cache")
+        cache = Loader.Cache(path)
+        assets = list(Loader.discover(self.path, cache=cache))
+        self.assertTrue(path.exists())
+        self.assertEqual(3, len(cache.items))
+
+        cache = Loader.Cache(path)
+        self.assertFalse(cache.changed)
+        key = cache.key(self.path.joinpath("00.scene.toml"), ".", False)
+        mtime, size, items = cache.items[key]
+        cache.items[key] = (mtime, size, [items[0]._replace(text="cached")])
+        assets = list(Loader.discover(self.path, cache=cache))
+        self.assertIn("cached", [i.text for i in assets])
+        self.assertFalse(cache.changed)
+
+        self.path.joinpath("00.scene.toml").write_text("[[_]]\ns = 'Changed.'\n")
+        assets = list(Loader.discover(self.path, cache=cache))
+        self.assertNotIn("cached", [i.text for i in assets])
+        self.assertIn("Changed", next(i.text for i in assets if i.path.name == "00.scene.toml"))
+
+    def test_corrupt_cache(self):
+        path = self.path.joinpath("assets.cache")
+        path.write_bytes(b"not a pickle")
+        self.assertEqual({}, Loader.Cache(path).items)
+
+
+class WatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = pathlib.Path(tempfile.mkdtemp(prefix="balladeer-", suffix="-test"))
+        for name in ("a", "b"):
+            self.path.joinpath(f"{name}.scene.toml").write_text(f"[[_]]\ns = '{name}'\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def touch(self, name, text):
+        path = self.path.joinpath(name)
+        path.write_text(text)
+        stats = path.stat()
+        # Make sure the change is seen on filesystems with coarse timestamps
+        os.utime(path, ns=(stats.st_atime_ns, stats.st_mtime_ns + 1000000000))
+        return path
+
+    def test_changes(self):
+        watcher = Loader.Watcher(self.path)
+        self.assertEqual((set(), []), watcher.changes())
+
+        changed = self.touch("a.scene.toml", "[[_]]\ns = 'A'\n")
+        added = self.touch("c.scene.toml", "[[_]]\ns = 'c'\n")
+        removed = self.path.joinpath("b.scene.toml")
+        removed.unlink()
+
+        paths, items = watcher.changes()
+        self.assertEqual({changed, added, removed}, paths)
+        self.assertEqual([changed, added], [i.path for i in items])
+        self.assertEqual((set(), []), watcher.changes())
+
+    def test_swap(self):
+        assets = Grouping.typewise(sorted(Loader.discover(self.path), key=operator.attrgetter("path")))
+        scenes = assets[Loader.Scene]
+        watcher = Loader.Watcher(self.path)
+
+        changed = self.touch("a.scene.toml", "[[_]]\ns = 'A'\n")
+        self.path.joinpath("b.scene.toml").unlink()
+        watcher.swap(assets, *watcher.changes())
+
+        self.assertEqual(2, len(scenes))
+        self.assertEqual([changed], [i.path for i in assets[Loader.Scene]])
+        self.assertEqual("A", assets[Loader.Scene][0].tables["_"][0]["s"])
+
+    def test_unreadable(self):
+        watcher = Loader.Watcher(self.path)
+        path = self.touch("a.scene.toml", "")
+        with mock.patch.object(Loader, "load", side_effect=ValueError("Half written")):
+            with self.assertWarns(UserWarning):
+                self.assertEqual((set(), []), watcher.changes())
+
+        paths, items = watcher.changes()
+        self.assertEqual({path}, paths)
+
 
 class SceneTests(unittest.TestCase):
     def test_one_scene(self):
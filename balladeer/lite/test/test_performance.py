@@ -18,12 +18,14 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import difflib
 import enum
 from types import SimpleNamespace
 import unittest
 
 from balladeer.lite.entity import Entity
 from balladeer.lite.performance import Performance
+from balladeer.lite.types import Grouping
 
 
 class Trivial(Performance):
@@ -264,12 +266,126 @@ class MatchingTests(unittest.TestCase):
         self.assertEqual(kwargs["obj"].aspect, "blue")
         self.assertTrue(Performance.is_command_hidden("get blue thing", rv, threshold=1))
 
+        options = Grouping(list)
+        for k, v in Performance.expand_commands(func, ensemble=ensemble):
+            options[k].append(v)
+        self.assertFalse(Performance.is_command_hidden("pick up blue thing", options, threshold=1))
+        self.assertTrue(Performance.is_command_hidden("get blue thing", options, threshold=1))
+
         self.assertIn("pick up red thing", rv)
         rank, fn, kwargs = rv["pick up red thing"]
         self.assertEqual(rank, 0)
         self.assertEqual(kwargs["obj"].aspect, "red")
 
 
+class CompiledOptionsTests(unittest.TestCase):
+    class Thing(Entity):
+        pass
+
+    class Picking(Performance):
+        def do_pick(self, this, text, context, *args, obj: "Thing", **kwargs):
+            """
+            pick up {obj.names[0]}
+            """
+
+        def do_wait(self, this, text, context, *args, **kwargs):
+            """
+            wait
+            """
+
+    def setUp(self):
+        self.performance = self.Picking()
+        self.performance.Thing = self.Thing
+        self.ensemble = [self.Thing(name="apple"), self.Thing(name="pear")]
+
+    def test_compile_once(self):
+        Performance.compile_commands.cache_clear()
+        for n in range(3):
+            self.performance.options(self.ensemble)
+        self.assertEqual(2, Performance.compile_commands.cache_info().misses)
+
+    def test_unchanged_options(self):
+        a = self.performance.options(self.ensemble)
+        self.assertEqual({"pick up apple", "pick up pear", "wait"}, set(a))
+        b = self.performance.options(list(self.ensemble))
+        self.assertIs(a, b)
+
+    def test_changed_ensemble(self):
+        a = self.performance.options(self.ensemble)
+        key, wait = self.performance.compiled[self.performance.do_wait]
+        self.ensemble.append(self.Thing(name="plum"))
+        b = self.performance.options(self.ensemble)
+        self.assertIsNot(a, b)
+        self.assertIn("pick up plum", b)
+        self.assertIs(wait, self.performance.compiled[self.performance.do_wait][1])
+        self.assertIn("pick up plum", self.performance.active[self.performance.do_pick])
+
+    def test_changed_names(self):
+        self.performance.options(self.ensemble)
+        self.ensemble[0].names[0] = "crab apple"
+        options = self.performance.options(self.ensemble)
+        self.assertIn("pick up crab apple", options)
+        self.assertNotIn("pick up apple", options)
+
+    def test_changed_state(self):
+        class Breaking(Performance):
+            def do_break(self, this, text, context, *args, obj: "Thing", **kwargs):
+                """
+                break {obj.names[0]} {obj.state}
+                """
+
+        performance = Breaking()
+        performance.Thing = self.Thing
+        self.ensemble[0].set_state(3)
+        options = performance.options(self.ensemble[:1])
+        self.assertIn("break apple 3", options)
+
+        self.ensemble[0].set_state(2)
+        options = performance.options(self.ensemble[:1])
+        self.assertIn("break apple 2", options)
+        self.assertNotIn("break apple 3", options)
+        rank, fn, args, kwargs = next(performance.actions("break apple 2", ensemble=self.ensemble[:1]))
+        self.assertEqual(performance.do_break, fn)
+        self.assertIs(self.ensemble[0], kwargs["obj"])
+
+
+class MatcherTests(unittest.TestCase):
+    phrases = [
+        "examine lamp", "examine lamp post", "x lamp", "get lamp", "go north", "go north east",
+        "go south", "n", "ne", "look", "take the cloak", "hang cloak on hook", "",
+    ]
+
+    def test_same_as_difflib(self):
+        matcher = Performance.Matcher(dict.fromkeys(self.phrases))
+        words = self.phrases + [
+            "examine lamb", "examin lamp", "go nort", "go north  east", "gonorth", "x", "loo",
+            "hang cloak on hoo", "take cloak", "nn", " ", "lamp examine",
+        ]
+        for word in words:
+            for cutoff in (0.95, 0.9, 0.8, 0.6):
+                for n in (1, 3):
+                    with self.subTest(word=word, cutoff=cutoff, n=n):
+                        self.assertEqual(
+                            difflib.get_close_matches(word, self.phrases, n=n, cutoff=cutoff),
+                            matcher.get_close_matches(word, n=n, cutoff=cutoff),
+                        )
+
+    def test_least_matches(self):
+        for total in range(0, 64):
+            for cutoff in (0.95, 0.6):
+                with self.subTest(total=total, cutoff=cutoff):
+                    rv = Performance.Matcher.least_matches(total, cutoff)
+                    if total:
+                        self.assertGreaterEqual(2.0 * rv / total, cutoff)
+                        self.assertLess(2.0 * (rv - 1) / total, cutoff)
+
+    def test_index_reused(self):
+        performance = Trivial()
+        options = performance.options([])
+        matcher = performance.index(options)
+        self.assertIs(matcher, performance.index(performance.options([])))
+
+
 class PerformanceMatchTests(unittest.TestCase):
     def setUp(self):
         self.performance = Trivial()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import pickle
+import unittest
+
+from starlette.testclient import TestClient
+
+from balladeer.lite.app import app_factory
+from balladeer.lite.profiler import Profiler
+from balladeer.lite.speech import Dialogue
+from balladeer.lite.storybuilder import StoryBuilder
+from balladeer.lite.types import Grouping
+
+
+class Clock:
+    def __init__(self, *values):
+        self.values = list(values)
+
+    def __call__(self):
+        return self.values.pop(0)
+
+
+class ProfilerTests(unittest.TestCase):
+
+    def test_disabled(self):
+        profiler = Profiler(enabled=False)
+        with profiler.stage("rewrite"):
+            pass
+        self.assertIs(profiler.disabled, profiler.stage("rewrite"))
+        self.assertFalse(profiler.stages)
+
+    def test_histogram(self):
+        profiler = Profiler(buckets=(0.1, 1), clock=Clock(0, 0.05, 1, 1.5, 2, 4))
+        for n in range(3):
+            with profiler.stage("rewrite"):
+                pass
+
+        counts, total = profiler.stages["rewrite"]
+        self.assertEqual([1, 1, 1], counts)
+        self.assertAlmostEqual(2.55, total)
+
+        lines = profiler.render().splitlines()
+        self.assertIn("# TYPE balladeer_stage_seconds histogram", lines)
+        self.assertIn('balladeer_stage_seconds_bucket{stage="rewrite",le="0.1"} 1', lines)
+        self.assertIn('balladeer_stage_seconds_bucket{stage="rewrite",le="1"} 2', lines)
+        self.assertIn('balladeer_stage_seconds_bucket{stage="rewrite",le="+Inf"} 3', lines)
+        self.assertIn('balladeer_stage_seconds_count{stage="rewrite"} 3', lines)
+
+    def test_gauge(self):
+        profiler = Profiler().gauge("sessions", lambda: 3, "Number of live sessions.")
+        profiler.gauge("broken", lambda: 1 / 0)
+        lines = profiler.render().splitlines()
+        self.assertIn("# TYPE balladeer_sessions gauge", lines)
+        self.assertIn("balladeer_sessions 3.0", lines)
+        self.assertFalse([i for i in lines if "broken" in i])
+
+
+class MetricsEndpointTests(unittest.TestCase):
+
+    def test_no_metrics(self):
+        app = asyncio.run(app_factory(story_builder=StoryBuilder(Dialogue("<> Hello."))))
+        client = TestClient(app)
+        self.assertFalse(app.state.profiler.enabled)
+        self.assertEqual(404, client.get("/metrics").status_code)
+
+    def test_turn_metrics(self):
+        profiler = Profiler()
+        app = asyncio.run(
+            app_factory(
+                assets=Grouping(list), story_builder=StoryBuilder(Dialogue("<> Hello.")), profiler=profiler
+            )
+        )
+        client = TestClient(app)
+        response = client.post("/sessions")
+        self.assertEqual(200, response.status_code)
+        self.assertIn("Hello", response.text)
+
+        response = client.get("/metrics")
+        self.assertEqual(200, response.status_code)
+        for stage in ("selection", "rewrite", "directives", "compose"):
+            with self.subTest(stage=stage):
+                self.assertIn(f'balladeer_stage_seconds_count{{stage="{stage}"}} 1', response.text)
+        self.assertIn("balladeer_sessions 1.0", response.text)
+        self.assertIn("balladeer_render_cache_ratio", response.text)
+
+    def test_profiler_per_app(self):
+        profiler = Profiler()
+        a = asyncio.run(
+            app_factory(
+                assets=Grouping(list), story_builder=StoryBuilder(Dialogue("<> Hello.")), profiler=profiler
+            )
+        )
+        b = asyncio.run(app_factory(assets=Grouping(list), story_builder=StoryBuilder(Dialogue("<> Hello."))))
+        self.assertIs(profiler, a.state.profiler)
+        self.assertIs(profiler, a.state.story_builder.profiler)
+        self.assertFalse(b.state.profiler.enabled)
+        self.assertFalse(b.state.story_builder.profiler.enabled)
+        self.assertFalse(StoryBuilder.profiler.enabled)
+
+        TestClient(b).post("/sessions")
+        self.assertFalse(profiler.stages)
+        TestClient(a).post("/sessions")
+        self.assertIn("rewrite", profiler.stages)
+
+        story = a.state.story_builder.spawn()
+        self.assertIs(profiler, story.profiler)
+        restored = pickle.loads(pickle.dumps(profiler))
+        self.assertEqual(profiler.stages, restored.stages)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+from collections import Counter
+import pathlib
+import tempfile
+import unittest
+import uuid
+
+from starlette.testclient import TestClient
+
+from balladeer.lite.app import app_factory
+from balladeer.lite.router import Ring
+from balladeer.lite.router import Router
+from balladeer.lite.speech import Dialogue
+from balladeer.lite.storybuilder import StoryBuilder
+from balladeer.lite.types import Grouping
+
+
+class RingTests(unittest.TestCase):
+
+    def test_balance(self):
+        ring = Ring(range(4))
+        keys = [uuid.uuid4() for n in range(4000)]
+        counts = Counter(ring.lookup(i) for i in keys)
+        self.assertEqual({0, 1, 2, 3}, set(counts))
+        self.assertTrue(all(600 < i < 1400 for i in counts.values()), counts)
+        self.assertEqual(ring.lookup(keys[0]), ring.lookup(str(keys[0])))
+
+    def test_consistent(self):
+        keys = [uuid.uuid4() for n in range(4000)]
+        before = Ring(range(4))
+        after = Ring(range(5))
+        moved = [i for i in keys if before.lookup(i) != after.lookup(i)]
+        self.assertTrue(all(after.lookup(i) == 4 for i in moved))
+        self.assertLess(len(moved), len(keys) * 0.35)
+
+
+class RouterTests(unittest.TestCase):
+
+    def test_route(self):
+        router = Router(["a", "b", "c"])
+        session_id = uuid.uuid4()
+        for path in (f"/session/{session_id}", f"/session/{session_id}/assembly?since=3"):
+            with self.subTest(path=path):
+                head = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii")
+                self.assertEqual(router.ring.lookup(session_id), router.route(head))
+
+        head = b"POST /sessions HTTP/1.1\r\n\r\n"
+        self.assertEqual([0, 1, 2, 0], [router.route(head) for n in range(4)])
+
+    def test_headers(self):
+        head = b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: Keep-Alive\r\n\r\n"
+        headers = Router.headers(head)
+        self.assertEqual(b"localhost", headers[b"host"])
+        self.assertTrue(Router.keep_alive(head, headers))
+        self.assertTrue(Router.keep_alive(b"HTTP/1.1 200 OK\r\n\r\n", {}))
+        self.assertFalse(Router.keep_alive(b"HTTP/1.1 200 OK\r\n\r\n", {b"connection": b"close"}))
+        self.assertFalse(Router.keep_alive(b"GET / HTTP/1.0\r\n\r\n", {}))
+        self.assertTrue(Router.keep_alive(b"GET / HTTP/1.0\r\n\r\n", {b"connection": b"keep-alive"}))
+
+    class Workers:
+        "Stand-ins for the worker processes, which answer with their node and the path requested."
+
+        metrics = (
+            "# HELP balladeer_stage_seconds Time spent in each stage of a turn.\n"
+            "# TYPE balladeer_stage_seconds histogram\n"
+            'balladeer_stage_seconds_count{stage="match"} 1\n'
+            "# TYPE balladeer_sessions gauge\n"
+            "balladeer_sessions 2\n"
+        )
+
+        def __init__(self, tmp: str, count: int = 3):
+            self.paths = [str(pathlib.Path(tmp).joinpath(f"worker-{n}.sock")) for n in range(count)]
+            self.connections = Counter()
+            self.servers = []
+
+        async def start(self):
+            self.servers = [
+                await asyncio.start_unix_server(lambda r, w, n=n: self.serve(n, r, w), path)
+                for n, path in enumerate(self.paths)
+            ]
+            return self
+
+        def close(self):
+            for server in self.servers:
+                server.close()
+
+        async def serve(self, node, reader, writer):
+            self.connections[node] += 1
+            try:
+                while True:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    path = head.split()[1].decode("ascii")
+                    body = f"{node} {path}".encode("ascii")
+                    if path == "/metrics" and self.metrics:
+                        writer.write(b"HTTP/1.0 200 OK\r\n\r\n" + self.metrics.encode("ascii"))
+                        break
+                    elif path == "/metrics":
+                        writer.write(b"HTTP/1.0 404 Not Found\r\n\r\nNot Found")
+                        break
+                    elif path.endswith("chunked"):
+                        writer.write(
+                            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+                            b"%x\r\n%s\r\n0\r\n\r\n" % (len(body), body)
+                        )
+                    else:
+                        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+                    await writer.drain()
+            except asyncio.IncompleteReadError:
+                pass
+            finally:
+                writer.close()
+
+    @staticmethod
+    async def get(reader, writer, path: str) -> str:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        return b"".join([i async for i in Router.body(reader, Router.headers(head))]).decode("ascii")
+
+    def test_keep_alive(self):
+        async def run(tmp):
+            workers = await self.Workers(tmp).start()
+            router = Router(workers.paths)
+            server = await asyncio.start_server(router.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+
+            sessions = [uuid.uuid4() for n in range(8)]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            rv = [await self.get(reader, writer, f"/session/{i}") for i in sessions + sessions]
+            rv.append(await self.get(reader, writer, f"/session/{sessions[0]}/chunked"))
+            rv.append(await self.get(reader, writer, f"/session/{sessions[0]}"))
+            writer.close()
+
+            server.close()
+            router.close()
+            workers.close()
+            return sessions, [router.ring.lookup(i) for i in sessions], rv, workers.connections
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sessions, nodes, responses, connections = asyncio.run(run(tmp))
+
+        self.assertEqual([f"{n} /session/{i}" for n, i in zip(nodes, sessions)] * 2, responses[:16])
+        self.assertIn(f"{nodes[0]} /session/{sessions[0]}/chunked\r\n0\r\n\r\n", responses[-2])
+        self.assertEqual(f"{nodes[0]} /session/{sessions[0]}", responses[-1])
+
+        # One connection to each worker serves all its requests
+        self.assertEqual(set(nodes), set(connections))
+        self.assertTrue(all(i == 1 for i in connections.values()), connections)
+
+    def test_metrics(self):
+        async def run(tmp, metrics=self.Workers.metrics):
+            workers = await self.Workers(tmp, count=2).start()
+            workers.metrics = metrics
+            router = Router(workers.paths)
+            server = await asyncio.start_server(router.handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            head = await reader.readuntil(b"\r\n\r\n")
+            body = b"".join([i async for i in Router.body(reader, Router.headers(head))])
+            writer.close()
+            server.close()
+            router.close()
+            workers.close()
+            return head.split(b"\r\n", 1)[0].decode("ascii"), body.decode("ascii")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            status, text = asyncio.run(run(tmp))
+            self.assertEqual(("HTTP/1.1 404 Not Found", "Not Found"), asyncio.run(run(tmp, metrics=None)))
+
+        self.assertEqual("HTTP/1.1 200 OK", status)
+        lines = text.splitlines()
+        self.assertEqual(1, lines.count("# TYPE balladeer_stage_seconds histogram"))
+        self.assertEqual(1, lines.count("# TYPE balladeer_sessions gauge"))
+        self.assertIn('balladeer_stage_seconds_count{worker="0",stage="match"} 1', lines)
+        self.assertIn('balladeer_stage_seconds_count{worker="1",stage="match"} 1', lines)
+        self.assertIn('balladeer_sessions{worker="1"} 2', lines)
+        self.assertLess(
+            lines.index('balladeer_sessions{worker="1"} 2'), lines.index("# TYPE balladeer_sessions gauge") + 3
+        )
+
+
+class AffinityTests(unittest.TestCase):
+
+    def test_start(self):
+        app = asyncio.run(app_factory(assets=Grouping(list), story_builder=StoryBuilder(Dialogue("<> Hello."))))
+        app.state.ring = Ring(range(3))
+        app.state.node = 1
+        client = TestClient(app)
+        for n in range(8):
+            response = client.post("/sessions", follow_redirects=False)
+            session_id = response.headers["location"].split("/")[-1]
+            self.assertEqual(1, app.state.ring.lookup(uuid.UUID(session_id)))
+            self.assertIn(uuid.UUID(session_id), app.state.sessions)
@@ -18,8 +18,16 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+from concurrent.futures import ThreadPoolExecutor
+import pathlib
+import shutil
+import tempfile
+import time
 import unittest
 
+from speechmark import SpeechMark
+
+from balladeer.lite.speech import RenderCache
 from balladeer.lite.speech import Speech
 
 
@@ -79,3 +87,126 @@ class SpeechTests(unittest.TestCase):
         b = s.words
         self.assertIs(a, b)
         self.assertEqual(24, len(s.words))
+
+
+class RenderCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = pathlib.Path(tempfile.mkdtemp(prefix="balladeer-", suffix="-test"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_shared_render(self):
+        cache = RenderCache()
+        calls = []
+        render = lambda x: calls.append(x) or x.upper()
+
+        self.assertEqual("HELLO", cache.render("hello", render))
+        self.assertEqual("HELLO", cache.render(Speech("hello"), render))
+        self.assertEqual(["hello"], calls)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(0.5, cache.ratio)
+
+    def test_bounded(self):
+        cache = RenderCache(maxsize=2)
+        for text in ("a", "b", "c", "a"):
+            cache.render(text, str.upper)
+        self.assertEqual(2, len(cache.items))
+        self.assertEqual(4, cache.misses)
+
+    def test_threaded_render(self):
+
+        class Processor(SpeechMark):
+            active = 0
+            overlaps = 0
+
+            def loads(self, text):
+                self.active += 1
+                self.overlaps += self.active > 1
+                time.sleep(0.001)
+                rv = super().loads(text)
+                self.active -= 1
+                return rv
+
+        texts = [f"<GUIDE> Line {n} of _the_ *story*.\n\n1. one {n}\n2. two\n" for n in range(64)]
+        expected = [SpeechMark().loads(Speech(text).trim()) for text in texts]
+
+        cache, processor = Speech.cache, Speech.processor
+        try:
+            Speech.cache = RenderCache(maxsize=1)
+            Speech.processor = Processor()
+            # Before Python 3.12, cached_property holds a lock across all instances
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                rv = list(executor.map(lambda text: Speech.tags.func(Speech(text)), texts))
+            self.assertEqual(0, Speech.processor.overlaps)
+        finally:
+            Speech.cache, Speech.processor = cache, processor
+
+        self.assertEqual(expected, rv)
+
+    def test_persistent(self):
+        path = self.path.joinpath("renders.db")
+        a = RenderCache(path=path)
+        a.render("hello", str.upper)
+
+        b = RenderCache(path=path)
+        self.assertEqual("HELLO", b.render("hello", str.lower))
+        self.assertEqual(1, b.hits)
+        self.assertEqual(0, b.misses)
+        a.close()
+        b.close()
+
+    def test_persistent_version(self):
+        path = self.path.joinpath("renders.db")
+        a = RenderCache(path=path)
+        a.render("hello", str.upper, version="1")
+
+        b = RenderCache(path=path)
+        self.assertEqual("hello", b.render("hello", str.lower, version="2"))
+        self.assertEqual("HELLO", b.render("hello", str.lower, version="1"))
+        self.assertEqual(1, b.hits)
+        self.assertEqual(1, b.misses)
+        a.close()
+        b.close()
+
+    def test_identify(self):
+        version = RenderCache.identify(Speech.processor)
+        self.assertIn("SpeechMark", version)
+        self.assertEqual(version, RenderCache.identify(Speech.processor))
+        self.assertNotEqual(version, RenderCache.identify(SpeechMark(noescape="")))
+
+    def test_speech_tags(self):
+        a = Speech("<> Cached.")
+        b = Speech("<> Cached.")
+        hits = Speech.cache.hits
+        self.assertEqual(a.tags, b.tags)
+        self.assertGreater(Speech.cache.hits, hits)
+
+
+class CueTests(unittest.TestCase):
+
+    def test_pieces(self):
+        speech = Speech("<GUEST.shouting@STAFF#3> Oi!\n\nYou there!")
+        self.assertEqual(1, len(speech.cues))
+        cue = speech.cues[0]
+        self.assertEqual("3", cue.attrs["fragments"].lstrip("#"))
+        self.assertTrue(cue.pieces[0].startswith("<blockquote"))
+        self.assertEqual(cue.block, speech.cues[0].block)
+
+        cites = [i for i in cue.pieces if isinstance(i, tuple) and i[0] == "cite"]
+        self.assertEqual(1, len(cites))
+        self.assertEqual("GUEST", cites[0][3])
+
+        paras = [i for i in cue.pieces if isinstance(i, tuple) and i[0] == "p"]
+        self.assertEqual([("p", "Oi!", 1), ("p", "You there!", 2)], paras)
+
+    def test_reassemble(self):
+        speech = Speech("<GUEST> Hello.\n\n<STAFF> Hello, Sir.\n\nCan I help you?")
+        for cue in speech.cues:
+            text = "".join(
+                i if isinstance(i, str) else (i[1] if i[0] == "cite" else f"<p>{i[1]}</p>")
+                for i in cue.pieces
+            )
+            self.assertEqual("".join(cue.block.split()), "".join(text.split()))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pathlib
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from balladeer.lite.speech import Dialogue
+from balladeer.lite.store import MemoryStore
+from balladeer.lite.store import SQLiteStore
+from balladeer.lite.storybuilder import StoryBuilder
+
+
+class Clock:
+    def __init__(self):
+        self.value = 0
+
+    def __call__(self):
+        return self.value
+
+
+class MemoryStoreTests(unittest.TestCase):
+
+    def test_keys(self):
+        store = MemoryStore()
+        story = StoryBuilder()
+        store[story.uid] = story
+        self.assertIs(store[story.uid], story)
+        self.assertIs(store[str(story.uid)], story)
+        self.assertIn(story.uid, store)
+        self.assertEqual(1, len(store))
+
+        del store[story.uid]
+        self.assertRaises(KeyError, store.__getitem__, story.uid)
+
+    def test_limit(self):
+        store = MemoryStore(limit=2)
+        stories = [StoryBuilder() for i in range(3)]
+        for story in stories:
+            store[story.uid] = story
+
+        self.assertEqual(2, len(store))
+        self.assertNotIn(stories[0].uid, store)
+        self.assertRaises(KeyError, store.__getitem__, stories[0].uid)
+
+    def test_lru_order(self):
+        store = MemoryStore(limit=2)
+        stories = [StoryBuilder() for i in range(3)]
+        store[stories[0].uid] = stories[0]
+        store[stories[1].uid] = stories[1]
+        store[stories[0].uid]
+        store[stories[2].uid] = stories[2]
+
+        self.assertIn(stories[0].uid, store)
+        self.assertNotIn(stories[1].uid, store)
+
+    def test_ttl(self):
+        clock = Clock()
+        store = MemoryStore(ttl=10, clock=clock)
+        story = StoryBuilder()
+        store[story.uid] = story
+
+        clock.value = 9
+        self.assertIs(store[story.uid], story)
+
+        clock.value = 20
+        self.assertEqual([str(story.uid)], store.expire())
+        self.assertRaises(KeyError, store.__getitem__, story.uid)
+
+    def test_evict_to_backing(self):
+        clock = Clock()
+        backing = SQLiteStore()
+        store = MemoryStore(ttl=10, backing=backing, clock=clock)
+        story = StoryBuilder(Dialogue("<> Still here."))
+        store[story.uid] = story
+
+        clock.value = 20
+        store.expire()
+        self.assertFalse(store.items)
+        self.assertIn(story.uid, backing)
+        self.assertIn(story.uid, store)
+
+        restored = store[story.uid]
+        self.assertIsNot(restored, story)
+        self.assertEqual(story.uid, restored.uid)
+        self.assertEqual(list(story.speech), list(restored.speech))
+        self.assertNotIn(story.uid, backing)
+        self.assertIn(str(story.uid), store.items)
+
+
+class SQLiteStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = pathlib.Path(tempfile.mkdtemp(prefix="balladeer-", suffix="-test"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_round_trip(self):
+        store = SQLiteStore()
+        story = StoryBuilder(Dialogue("<> Hello."))
+        store[story.uid] = story
+        self.assertIn(story.uid, store)
+        self.assertEqual([str(story.uid)], list(store))
+
+        rv = store[story.uid]
+        self.assertEqual(story.uid, rv.uid)
+        with rv.turn() as turn:
+            self.assertTrue(turn.blocks)
+
+        del store[story.uid]
+        self.assertRaises(KeyError, store.__getitem__, story.uid)
+        self.assertRaises(KeyError, store.__delitem__, story.uid)
+
+    def test_shared_objects(self):
+        template = StoryBuilder(Dialogue("<> Hello."), config={"title": "Test"})
+        template.assets["text/css"].append("main.css")
+        story = template.spawn()
+
+        store = SQLiteStore(shared=dict(assets=template.assets, config=template.config))
+        store[story.uid] = story
+        unshared = SQLiteStore()
+        unshared[story.uid] = story
+        self.assertLess(len(store.dumps(story)), len(unshared.dumps(story)))
+        self.assertNotIn(b"main.css", store.dumps(story))
+        self.assertIn(b"main.css", unshared.dumps(story))
+
+        rv = store[story.uid]
+        self.assertIs(template.assets, rv.assets)
+        self.assertIs(template.config, rv.config)
+
+        # A story restored after a reload sees the new assets
+        template.assets["text/css"][:] = ["other.css"]
+        self.assertEqual(["other.css"], store[story.uid].assets["text/css"])
+
+        store.shared.clear()
+        self.assertRaises(pickle.UnpicklingError, store.__getitem__, story.uid)
+
+    def test_shared_file(self):
+        path = self.path.joinpath("sessions.db")
+        a = SQLiteStore(path)
+        b = SQLiteStore(path)
+        story = StoryBuilder()
+        a[story.uid] = story
+        self.assertEqual(story.uid, b[story.uid].uid)
+        a.close()
+        b.close()
+
+    def test_ttl(self):
+        clock = Clock()
+        store = SQLiteStore(ttl=10, clock=clock)
+        story = StoryBuilder()
+        store[story.uid] = story
+
+        clock.value = 20
+        self.assertRaises(KeyError, store.__getitem__, story.uid)
+        self.assertEqual(0, len(store))
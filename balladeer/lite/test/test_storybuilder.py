@@ -178,6 +178,55 @@ class StoryTests(unittest.TestCase):
         self.assertEqual(6, len(witness), witness)
         self.assertTrue(all(witness.values()), witness)
 
+    def test_story_spawn(self):
+        class Map(MapBuilder):
+            def build(self):
+                yield Transit().set_state(self.exit.a, self.into.b)
+
+        class World(WorldBuilder):
+            def build(self):
+                yield Entity(name="Anna")
+                yield Entity(name="Bob")
+
+        class Story(StoryBuilder):
+            def build(self):
+                yield Drama(*self.speech, world=self.world, config=self.config).set_state(1)
+
+        m = Map({"a": ["A", "a"], "b": ["B", "b"]})
+        a = Story(Dialogue("<> Knock, knock."), world=World(map=m))
+        # Side effect: the drama generates its active set
+        a.context.options(a.context.ensemble)
+        b = a.spawn()
+
+        self.assertNotEqual(a.uid, b.uid)
+        self.assertIsNot(a.director, b.director)
+        self.assertIs(a.assets, b.assets)
+        self.assertIsNot(a.world, b.world)
+        self.assertIsNot(a.world.map, b.world.map)
+        self.assertIs(a.world.map.spot, b.world.map.spot)
+        self.assertEqual(list(a.speech), list(b.speech))
+
+        for x, y in zip(a.world.entities + a.world.map.transits, b.world.entities + b.world.map.transits):
+            with self.subTest(x=x, y=y):
+                self.assertIsNot(x, y)
+                self.assertEqual(x.uid, y.uid)
+                self.assertIsNot(x.states, y.states)
+                self.assertIsNot(x.names, y.names)
+
+        drama = b.context
+        self.assertIsNot(a.context, drama)
+        self.assertIs(b.world, drama.world)
+        self.assertEqual(b.world.entities + [drama], drama.ensemble)
+
+        self.assertIsNot(a.context.active, drama.active)
+        self.assertIsNot(a.context.speech, drama.speech)
+
+        b.world.entities[0].set_state(2)
+        self.assertIsNone(a.world.entities[0].get_state())
+
+        with b.turn() as turn:
+            self.assertTrue(turn.blocks)
+
     def test_theme(self):
         page = Page()
         page.themes["a"] = {"ink": {}}
@@ -142,6 +142,37 @@ class StoryTests(unittest.TestCase):
                 with self.subTest(a=a, b=b):
                     self.assertIsNot(a, b)
 
+    def test_story_spawn(self):
+        a = self.story.spawn()
+        b = self.story.spawn()
+
+        self.assertNotEqual(a.uid, b.uid)
+        self.assertEqual(list(a.drama), list(b.drama))
+        self.assertIsNot(a.stager, b.stager)
+        self.assertIs(a.stager.realms, self.story.stager.realms)
+        self.assertIsNot(a.stager.active, b.stager.active)
+        self.assertEqual(a.stager.active, b.stager.active)
+        self.assertIs(a.world.map.spot, b.world.map.spot)
+
+        for realm, sorter in a.stager.strands.items():
+            with self.subTest(realm=realm):
+                self.assertIsNot(sorter, b.stager.strands[realm])
+
+        for key, drama in a.drama.items():
+            with self.subTest(key=key):
+                self.assertIs(a.world, drama.world)
+                self.assertIsNot(drama, b.drama[key])
+
+        self.assertEqual(
+            [i.uid for i in a.world.map.transits], [i.uid for i in b.world.map.transits]
+        )
+        self.assertFalse(
+            any(x is y for x, y in zip(a.world.entities, b.world.entities))
+        )
+
+        with a.turn() as turn:
+            self.assertTrue(turn)
+
     def test_monitor_context_events(self):
         text = textwrap.dedent("""
             label = "Events test"
@@ -184,6 +184,38 @@ class PageTests(unittest.TestCase):
         page.paste("<title>Zone test</title>", zone=page.zone.title)
         self.assertTrue(page.structure[page.zone.title])
 
+    def test_stream(self):
+        page = Page()
+        page.paste("<title>Stream test</title>", zone=page.zone.title)
+        page.paste("<p>Once upon a time...</p>")
+        page.paste("<form></form>", zone=page.zone.inputs)
+        self.assertEqual(page.html, "".join(page.stream()))
+        self.assertGreater(len(list(page.stream())), 4)
+
+    def test_stream_generator(self):
+        consumed = []
+
+        def lines():
+            for n in range(3):
+                consumed.append(n)
+                yield f"<p>{n}</p>"
+
+        page = Page()
+        page.paste("<title>Lazy</title>", zone=page.zone.title)
+        page.paste(lines(), zone=page.zone.main)
+        page.paste(lines(), zone=page.zone.inputs)
+        chunks = page.stream()
+        head = next(i for i in chunks if "<title>" in i)
+        self.assertIn("<title>Lazy</title>", head)
+        self.assertFalse(consumed)
+
+        html = "".join(chunks)
+        self.assertEqual(6, len(consumed))
+        self.assertIn("<p>2</p>", html)
+        self.assertIn('<div id="ballad-zone-inputs" class="ballad zone">', html)
+        self.assertEqual(page.html, page.html)
+        self.assertEqual(6, len(consumed))
+
 
 class ColourTests(unittest.TestCase):
 
@@ -18,9 +18,14 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import dataclasses
+import enum
+import pickle
 import unittest
 
 from balladeer.lite.entity import Entity
+from balladeer.lite.types import Grouping
+from balladeer.lite.types import State
 from balladeer.lite.world import WorldBuilder
 
 
@@ -60,3 +65,107 @@ class WorldBuilderTests(unittest.TestCase):
             with self.subTest(spec=spec):
                 entity = next(world.build_to_spec([spec]))
                 self.assertEqual(entity, Entity(name="a", types={"Spec", "b"}))
+
+
+class IndexTests(unittest.TestCase):
+
+    class Mood(State, enum.Enum):
+        calm = 0
+        angry = 1
+
+    class World(WorldBuilder):
+        def build(self):
+            yield Entity(name="Ann", types={"Spy"}).set_state(IndexTests.Mood.calm)
+            yield Entity(name="Bob", types={"Spy"}).set_state(IndexTests.Mood.angry)
+            yield Entity(name="Cat", types={"Pet"}).set_state(IndexTests.Mood.calm)
+
+    def assertIndexed(self, world):
+        self.assertEqual(Grouping.typewise(world.entities), world.typewise)
+        expected = Grouping(list)
+        for entity in world.entities:
+            for state in entity.states.values():
+                expected[str(state)].append(entity)
+        # Entities are listed in the order they took each state
+        self.assertEqual(
+            {k: sorted(map(id, v)) for k, v in expected.items()},
+            {k: sorted(map(id, v)) for k, v in world.statewise.items()},
+        )
+
+    def test_built(self):
+        world = self.World()
+        self.assertIs(world, world.entities[0]._world)
+        self.assertEqual(["Ann", "Bob"], [i.name for i in world.typewise["Spy"]])
+        self.assertEqual(["Ann", "Cat"], [i.name for i in world.statewise[str(self.Mood.calm)]])
+        self.assertIndexed(world)
+
+    def test_set_state(self):
+        world = self.World()
+        ann, bob, cat = world.entities
+        calm = world.statewise[str(self.Mood.calm)]
+        for entity in calm:
+            entity.set_state(self.Mood.angry)
+
+        self.assertEqual([ann, cat], calm)
+        self.assertEqual([bob, ann, cat], world.statewise[str(self.Mood.angry)])
+        self.assertNotIn(str(self.Mood.calm), world.statewise)
+
+        bob.set_state(self.Mood.calm)
+        self.assertEqual([bob], world.statewise[str(self.Mood.calm)])
+        self.assertIndexed(world)
+
+    def test_add_discard(self):
+        world = self.World()
+        ann, bob, cat = world.entities
+        dog = Entity(name="Dog", types={"Pet"}).set_state(self.Mood.angry)
+        world.add(dog, dog)
+        self.assertEqual([ann, bob, cat, dog], world.entities)
+        self.assertEqual([cat, dog], world.typewise["Pet"])
+
+        world.discard(ann, Entity(name="Eve"))
+        self.assertEqual([bob, cat, dog], world.entities)
+        self.assertEqual([bob], world.typewise["Spy"])
+        self.assertIndexed(world)
+
+    def test_direct_append(self):
+        world = self.World()
+        dog = Entity(name="Dog", types={"Pet"})
+        world.entities.append(dog)
+        self.assertIn(dog, world.typewise["Pet"])
+        self.assertIndexed(world)
+
+    def test_foreign_entity(self):
+        world = self.World()
+        stranger = Entity(name="Eve")
+        stranger._world = world
+        stranger.set_state(self.Mood.angry)
+        self.assertNotIn(stranger, world.statewise[str(self.Mood.angry)])
+
+    def test_world_field(self):
+        @dataclasses.dataclass(kw_only=True, unsafe_hash=True)
+        class Planet(Entity):
+            world: str = "Earth"
+
+        world = self.World()
+        earth = Planet(name="Earth")
+        world.add(earth)
+        earth.set_state(self.Mood.angry)
+        self.assertEqual("Earth", earth.world)
+        self.assertIn(earth, world.statewise[str(self.Mood.angry)])
+        self.assertIndexed(world)
+
+    def test_spawn(self):
+        world = self.World()
+        other = world.spawn()
+        ann, bob, cat = other.entities
+        self.assertIs(other, ann._world)
+
+        ann.set_state(self.Mood.angry)
+        self.assertEqual(2, len(world.statewise[str(self.Mood.calm)]))
+        self.assertEqual([cat], other.statewise[str(self.Mood.calm)])
+        self.assertIndexed(world)
+        self.assertIndexed(other)
+
+    def test_pickle(self):
+        world = pickle.loads(pickle.dumps(self.World()))
+        world.entities[0].set_state(self.Mood.angry)
+        self.assertIndexed(world)
@@ -21,6 +21,7 @@ import colorsys
 import enum
 from collections import defaultdict
 from collections import namedtuple
+from collections.abc import Generator
 import re
 import warnings
 
@@ -108,27 +109,47 @@ class Page:
 
     def contents(self, zone: Zone):
         values = self.structure.get(zone, [])
-        if any(values) and zone.name in self.divs:
+        wrap = any(values) and zone.name in self.divs
+        if wrap:
             yield ""
             yield f'<div id="ballad-zone-{zone.name}" class="ballad zone">'
 
-        for seq in values:
+        for n, seq in enumerate(values):
             if not seq:
                 continue
 
             if isinstance(seq, str):
                 yield seq
-            else:
+            elif isinstance(seq, (list, tuple)):
                 yield from seq
+            else:
+                # A generator is kept as a list once consumed, so the page may be rendered again
+                items = values[n] = []
+                for item in seq:
+                    items.append(item)
+                    yield item
 
-        if any(values) and zone.name in self.divs:
+        if wrap:
             yield f"</div>"
 
+    def stream(self, *zones: tuple[Zone], sep: str = "") -> Generator[str]:
+        """
+        Generate the text of the page one zone at a time.
+        Pass `zones` to generate only those.
+
+        Content may be pasted as a generator. It is not consumed until its zone is reached,
+        so that earlier zones may be sent without waiting for it.
+
+        """
+        for zone in zones or self.structure:
+            text = "\n".join(self.contents(zone))
+            if text:
+                yield sep + text
+                sep = "\n"
+
     @property
     def html(self):
-        return "\n".join(
-            filter(None, ("\n".join(self.contents(zone)) for zone in self.structure))
-        )
+        return "".join(self.stream())
 
 
 class State:
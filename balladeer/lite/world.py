@@ -19,6 +19,7 @@
 
 from collections import defaultdict
 from collections.abc import Generator
+import copy
 import dataclasses
 import enum
 import warnings
@@ -47,6 +48,46 @@ class WorldBuilder:
 
     """
 
+    class Groups:
+        """
+        Entities posted under keys. Each group is a dictionary keyed by serial number,
+        so an entity joins or leaves it in constant time.
+        A group keeps its entities in the order they joined it.
+
+        """
+
+        def __init__(self):
+            self.members = defaultdict(dict)
+            self.stale = set()
+            self.grouping = Grouping(list)
+
+        def post(self, keys: frozenset, serial: int, entity: Entity):
+            for key in keys:
+                self.members[key][serial] = entity
+            self.stale.update(keys)
+
+        def unpost(self, keys: frozenset, serial: int):
+            for key in keys:
+                self.members.get(key, {}).pop(serial, None)
+            self.stale.update(keys)
+
+        def view(self) -> Grouping:
+            """
+            Return a Grouping of lists, one for each group.
+            Only those lists whose groups have changed are built again.
+            Lists are replaced rather than modified, so it is safe to change state while iterating over one.
+
+            """
+            while self.stale:
+                key = self.stale.pop()
+                group = self.members.get(key)
+                if not group:
+                    self.members.pop(key, None)
+                    self.grouping.pop(key, None)
+                    continue
+                self.grouping[key] = list(group.values())
+            return self.grouping
+
     specs = set()
 
     def __init__(self, map: MapBuilder=None, config: dict  = None, assets: Grouping = None, **kwargs):
@@ -54,13 +95,17 @@ class WorldBuilder:
         self.config = config
 
         self.entities = []
-        self.typewise = Grouping()
+        self.reindex()
 
         try:
             self.make(assets, **kwargs)
         except Exception as e:
             warnings.warn(str(e))
 
+    def __getstate__(self):
+        # The index is keyed by object id, so a copy must rebuild it
+        return self.__dict__ | dict(indexed=None)
+
     def preserve_spec_params(self, table):
         params = table.copy()
         for k, v in table.items():
@@ -103,11 +148,133 @@ class WorldBuilder:
         self.assets = assets
         if not self.specs:
             self.specs.update(set(self.discover_spec_params(self.assets)))
-        self.entities = list(self.build(**kwargs))
-        self.typewise = Grouping.typewise(self.entities)
+        self.entities = []
+        self.reindex()
+        self.add(*self.build(**kwargs))
+
+        return self
+
+    @staticmethod
+    def keys(entity: Entity) -> tuple[frozenset, frozenset]:
+        "Return the keys under which an entity is grouped by type and by state."
+        types = {type(entity)}
+        try:
+            types.update(entity.types)
+        except AttributeError:
+            try:
+                types.add(entity.type)
+            except AttributeError:
+                pass
+        return frozenset(types), frozenset(str(i) for i in entity.states.values())
+
+    def add(self, *entities: tuple[Entity]):
+        """
+        Add entities to the world.
+        Each one is given a reference to the world so that it can report changes to its state.
+
+        """
+        self.check()
+        for entity in entities:
+            if id(entity) in self.index:
+                continue
+
+            entity._world = self
+            self.entities.append(entity)
+            types, states = self.keys(entity)
+            self.index[id(entity)] = (self.serial, types, states)
+            self._typewise.post(types, self.serial, entity)
+            self._statewise.post(states, self.serial, entity)
+            self.serial += 1
+
+        self.indexed = len(self.entities)
+        return self
+
+    def discard(self, *entities: tuple[Entity]):
+        "Remove entities from the world, if present."
+        self.check()
+        for entity in entities:
+            try:
+                serial, types, states = self.index.pop(id(entity))
+            except KeyError:
+                continue
 
+            self.entities = [i for i in self.entities if i is not entity]
+            self._typewise.unpost(types, serial)
+            self._statewise.unpost(states, serial)
+
+        self.indexed = len(self.entities)
+        return self
+
+    def reindex(self, *entities: tuple[Entity]):
+        """
+        Update the indexes of the world after a change to some of its entities.
+        With no arguments, rebuild them from scratch.
+
+        Entities call this method from `set_state`.
+        If you modify their state or types some other way, call it yourself.
+
+        """
+        if not entities or self.indexed != len(self.entities):
+            self._typewise = self.Groups()
+            self._statewise = self.Groups()
+            self.index = {}
+            self.serial = 0
+            self.indexed = 0
+            entities, self.entities = self.entities, []
+            return self.add(*entities)
+
+        for entity in entities:
+            try:
+                serial, types, states = self.index[id(entity)]
+            except KeyError:
+                # Not one of ours
+                continue
+
+            keys = self.keys(entity)
+            self.index[id(entity)] = (serial,) + keys
+            for groups, old, new in zip((self._typewise, self._statewise), (types, states), keys):
+                groups.unpost(old - new, serial)
+                groups.post(new - old, serial, entity)
         return self
 
+    def check(self):
+        "Rebuild the indexes if the list of entities has been modified directly."
+        if self.indexed != len(self.entities):
+            self.reindex()
+
+    def spawn(self, memo: dict = None):
+        """
+        Copy this world from a template for use in a new story.
+        Entities are spawned rather than built again.
+
+        """
+        memo = {} if memo is None else memo
+        try:
+            return memo[id(self)]
+        except KeyError:
+            rv = memo[id(self)] = copy.copy(self)
+
+        rv.map = self.map and self.map.spawn(memo)
+        rv.entities = [i.spawn(memo) for i in self.entities]
+        return rv.reindex()
+
+    @property
+    def typewise(self) -> Grouping:
+        """
+        Returns a :py:class:`~balladeer.lite.types.Grouping`
+        of entities by class and by declared type.
+
+        It is maintained as entities are added, removed or change state.
+        Treat it as read-only.
+
+        """
+        self.check()
+        return self._typewise.view()
+
+    @typewise.setter
+    def typewise(self, value: Grouping):
+        self._typewise.grouping = value
+
     @property
     def statewise(self) -> Grouping:
         """
@@ -115,14 +282,15 @@ class WorldBuilder:
         whose keys are all of type ``int`` or
         :py:class:`~balladeer.lite.types.State`.
 
-        The corresponding value is a list of entities with that state.
+        The corresponding value is a list of entities with that state,
+        in the order they took it.
+
+        It is maintained as entities are added, removed or change state.
+        Treat it as read-only.
 
         """
-        rv = Grouping(list)
-        for entity in self.entities:
-            for state in entity.states.values():
-                rv[str(state)].append(entity)
-        return rv
+        self.check()
+        return self._statewise.view()
 
     def build(self, **kwargs) -> Generator[Entity]:
         """
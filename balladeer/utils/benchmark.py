@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+#   encoding: utf-8
+
+# This is part of the Balladeer library.
+# Copyright (C) 2024 D E Haynes
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import difflib
+import json
+import math
+import pathlib
+import platform
+import sys
+import tempfile
+import textwrap
+import time
+import tracemalloc
+import types
+import warnings
+
+import busker
+
+import balladeer
+
+from balladeer.lite.app import app_factory
+from balladeer.lite.app import Home
+from balladeer.lite.app import Session
+from balladeer.lite.app import discover_assets
+from balladeer.lite.director import Director
+from balladeer.lite.drama import Drama
+from balladeer.lite.entity import CompactEntity
+from balladeer.lite.entity import Entity
+from balladeer.lite.loader import Loader
+from balladeer.lite.performance import Performance
+from balladeer.lite.resident import Resident
+from balladeer.lite.speech import Dialogue
+from balladeer.lite.storystager import StoryStager
+from balladeer.lite.compass import Compass
+from balladeer.lite.compass import MapBuilder
+from balladeer.lite.compass import Traffic
+from balladeer.lite.compass import Transit
+from balladeer.lite.store import MemoryStore
+from balladeer.lite.storybuilder import StoryBuilder
+from balladeer.lite.types import Grouping
+from balladeer.lite.types import Page
+from balladeer.lite.world import WorldBuilder
+
+__doc__ = """
+Measure the performance of Balladeer components.
+
+python -m balladeer.utils.benchmark sessions
+
+python -m balladeer.utils.benchmark --size 5000 --output results.json
+
+"""
+
+
+def timed(fn, *args, repeat=1, **kwargs) -> float:
+    "Return the mean time in seconds of a call to `fn`."
+    start = time.perf_counter()
+    for n in range(repeat):
+        fn(*args, **kwargs)
+    return (time.perf_counter() - start) / repeat
+
+
+class Staged(StoryStager):
+    types = [Drama, Entity, Resident, Transit]
+
+
+def bench_sessions(args):
+    "Story creation by deepcopy versus spawn, in sessions per second."
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        assets = discover_assets(busker, "test", ignore=[])
+        template = Staged(assets=assets)
+
+        before = timed(copy.deepcopy, template, repeat=args.repeat)
+        after = timed(template.spawn, repeat=args.repeat)
+
+    yield "sessions.deepcopy", 1 / before, "sessions/s"
+    yield "sessions.spawn", 1 / after, "sessions/s"
+
+
+class Picking(Drama):
+    def do_examine(self, this, text, director, *args, item: Entity, **kwargs):
+        """
+        examine {item.names[0]} | x {item.names[0]}
+        inspect {item.names[0]}
+
+        """
+
+    def do_take(self, this, text, director, *args, item: Entity, **kwargs):
+        """
+        take {item.names[0]} | get {item.names[0]}
+
+        """
+
+
+class Grid(MapBuilder):
+    "A square grid of spots, joined to their neighbours East and North."
+
+    @staticmethod
+    def layout(n: int) -> dict:
+        return {f"spot_{i:05d}": [f"spot {i}"] for i in range(n)}
+
+    def build(self, **kwargs):
+        spots = list(self.spot)
+        side = math.ceil(math.sqrt(len(spots)))
+        for n, spot in enumerate(spots):
+            east, north = n + 1, n + side
+            if east < len(spots) and east % side:
+                yield Transit().set_state(
+                    self.exit[spot.name], Compass.E, self.into[spots[east].name], Traffic.flowing
+                )
+            if north < len(spots):
+                yield Transit().set_state(
+                    self.exit[spot.name], Compass.N, self.into[spots[north].name], Traffic.flowing
+                )
+
+
+class World(WorldBuilder):
+    def build(self, size=0, **kwargs):
+        spots = list(self.map.spot) if self.map else [None]
+        for n in range(size):
+            yield Entity(name=f"item {n:04d}", types={f"Type{n % 10}", "Item"}).set_state(
+                n % 7, *filter(None, [spots[n % len(spots)]])
+            )
+
+
+class Story(StoryBuilder):
+    def build(self, **kwargs):
+        yield Picking(world=self.world, config=self.config)
+
+
+def synthesize_scenes(path: pathlib.Path, scenes: int = 10, shots: int = 4) -> pathlib.Path:
+    "Write scene files to `path`. Each scene casts roles by type and state."
+    for n in range(scenes):
+        lines = [
+            "[HERO]",
+            f'type = "Type{n % 10}"',
+            "",
+            "[ITEM]",
+            'type = "Item"',
+            f"state = {n % 7}",
+            "",
+        ]
+        for i in range(shots):
+            lines.extend([
+                "[[_]]",
+                's="""',
+                f"<HERO> This is shot {i} of scene {n}, with {{ITEM.name}}.",
+                "",
+                "<ITEM.shown@HERO> *Quite so*.",
+                '"""',
+                "",
+            ])
+        path.joinpath(f"scene_{n:03d}.scene.toml").write_text("\n".join(lines))
+    return path
+
+
+def synthesize_story(args, path: pathlib.Path) -> StoryBuilder:
+    "Create a story of synthetic entities, scenes and map spots."
+    assets = discover_assets(synthesize_scenes(path, args.scenes, args.shots))
+    grid = Grid(Grid.layout(args.spots))
+    world = World(map=grid, assets=assets, size=args.size)
+    return Story(assets=assets, world=world)
+
+
+def bench_turn(args):
+    "A turn of a synthesized story, from scene selection to rewrite."
+    with tempfile.TemporaryDirectory() as path:
+        story = synthesize_story(args, pathlib.Path(path))
+
+        def turn():
+            with story.turn() as turn:
+                return turn
+
+        rv = turn()
+        yield "turn.blocks", len(rv.blocks), ""
+        yield "turn.enter", timed(turn, repeat=args.repeat) * 1000, "ms"
+
+
+def bench_discover(args):
+    "Discovery of synthesized scene files."
+    with tempfile.TemporaryDirectory() as path:
+        path = synthesize_scenes(pathlib.Path(path), args.scenes, args.shots)
+        yield "discover.scenes", args.scenes, ""
+        yield "discover.parsed", timed(lambda: list(Loader.discover(path)), repeat=args.repeat) * 1000, "ms"
+        yield "discover.compiled", timed(
+            lambda: list(Loader.discover(path, precompile=True)), repeat=args.repeat
+        ) * 1000, "ms"
+        for label, pool in [("threads", ThreadPoolExecutor), ("processes", ProcessPoolExecutor)]:
+            yield f"discover.{label}", timed(
+                lambda: list(Loader.discover(path, precompile=True, workers=4, pool=pool)),
+                repeat=max(args.repeat // 10, 1)
+            ) * 1000, "ms"
+
+        cache = Loader.Cache(path.joinpath("assets.cache"))
+        list(Loader.discover(path, precompile=True, cache=cache))
+        yield "discover.cached", timed(
+            lambda: list(Loader.discover(path, precompile=True, cache=Loader.Cache(cache.path))),
+            repeat=args.repeat
+        ) * 1000, "ms"
+
+        watcher = Loader.Watcher(path, precompile=True)
+        scene = next(path.glob("*.scene.toml"))
+
+        def reload():
+            scene.write_text(scene.read_text())
+            watcher.snapshot[scene] = None
+            return watcher.changes()
+
+        yield "discover.reload", timed(reload, repeat=args.repeat) * 1000, "ms"
+
+
+def bench_route(args):
+    "Routing across a grid of spots, from one corner to the other."
+    grid = Grid(Grid.layout(args.spots))
+    spots = list(grid.spot)
+
+    def route():
+        grid.invalidate()
+        return grid.route(spots[0], spots[-1])
+
+    yield "route.spots", len(spots), ""
+    yield "route.hops", len(route()), ""
+    yield "route.cold", timed(route, repeat=args.repeat) * 1000, "ms"
+    yield "route.warm", timed(grid.route, spots[0], spots[-1], repeat=args.repeat) * 1000000, "us"
+
+
+def bench_adjacency(args):
+    "Exits from a spot on a grid, and the cost of a change to the state of a transit."
+    # Enum creation is slow for large maps, so is not part of the timing
+    grid = Grid(Grid.layout(args.spots))
+    spots = list(grid.spot)
+    spot = spots[len(spots) // 2]
+    yield "adjacency.spots", len(spots), ""
+    yield "adjacency.index", timed(lambda: grid.make().options(spot)) * 1000, "ms"
+    yield "adjacency.options", timed(grid.options, spot, repeat=args.repeat) * 1000000, "us"
+
+    transit = next(iter(grid.options(spot)))[-1]
+
+    def toggle():
+        transit.set_state(Traffic.blocked)
+        grid.options(spot)
+        transit.set_state(Traffic.flowing)
+        return grid.options(spot)
+
+    yield "adjacency.change", timed(toggle, repeat=args.repeat) * 1000000 / 2, "us"
+
+
+def bench_world(args):
+    "Lookups in the indexes of a world, and the cost of keeping them current."
+    world = World(size=args.size)
+    item = world.entities[len(world.entities) // 2]
+
+    def toggle():
+        item.set_state(7)
+        world.statewise["7"]
+        item.set_state(0)
+        return world.statewise["0"]
+
+    yield "world.entities", len(world.entities), ""
+    yield "world.make", timed(world.make, size=args.size) * 1000, "ms"
+    item = world.entities[len(world.entities) // 2]
+    yield "world.typewise", timed(lambda: world.typewise["Type3"], repeat=args.repeat) * 1000000, "us"
+    yield "world.statewise", timed(lambda: world.statewise["3"], repeat=args.repeat) * 1000000, "us"
+    yield "world.change", timed(toggle, repeat=args.repeat) * 1000000 / 2, "us"
+    yield "world.set_state", timed(lambda: item.set_state(7).set_state(0), repeat=args.repeat) * 1000000 / 2, "us"
+
+
+def bench_entities(args):
+    "Memory and construction time of entities, compared with their compact variant."
+
+    def build(cls):
+        return [
+            cls(name=f"item {n % 100:02d}", types={f"Type{n % 10}", "Item"}).set_state(n % 7)
+            for n in range(args.size)
+        ]
+
+    for cls in (Entity, CompactEntity):
+        tracemalloc.start()
+        entities = build(cls)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del entities
+        yield f"entities.{cls.__name__}.bytes", size / args.size, "B"
+        yield f"entities.{cls.__name__}.build", timed(build, cls) * 1000000 / args.size, "us"
+
+
+def bench_endpoints(args):
+    "HTTP endpoints of the web app through an in-process ASGI client, in requests per second."
+    # httpx comes with the test extra, not with balladeer itself
+    import httpx
+
+    async def run(story):
+        app = await app_factory(assets=story.assets, story_builder=story)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://balladeer") as client:
+            start = time.perf_counter()
+            for n in range(args.repeat):
+                response = await client.post("/sessions")
+            yield "endpoints.start", args.repeat / (time.perf_counter() - start), "requests/s"
+
+            url = response.headers["location"]
+            response = await client.get(f"{url}/assembly")
+            tag = {"If-None-Match": response.headers.get("ETag", "")}
+            since = dict(since=response.json().get("version", 0))
+            for label, method, path, kwargs in [
+                ("endpoints.session", client.get, url, {}),
+                ("endpoints.assembly", client.get, f"{url}/assembly", {}),
+                ("endpoints.assembly.etag", client.get, f"{url}/assembly", dict(headers=tag)),
+                ("endpoints.assembly.patch", client.get, f"{url}/assembly", dict(params=since)),
+                (
+                    "endpoints.command",
+                    client.post,
+                    f"{url}/command",
+                    dict(data={"ballad-command-form-input-text": "x item 0001"}),
+                ),
+            ]:
+                start = time.perf_counter()
+                for n in range(args.repeat):
+                    response = await method(path, **kwargs)
+                yield label, args.repeat / (time.perf_counter() - start), "requests/s"
+
+    async def collect(story):
+        return [i async for i in run(story)]
+
+    with tempfile.TemporaryDirectory() as path:
+        story = synthesize_story(args, pathlib.Path(path))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            yield from asyncio.run(collect(story))
+
+
+def bench_dispatch(args):
+    "Latency of concurrent sessions, with turns on the event loop and in a thread pool, and a store which blocks."
+    # httpx comes with the test extra, not with balladeer itself
+    import httpx
+
+    class SlowStore(MemoryStore):
+        def __setitem__(self, session_id, story):
+            # Like a write to disk, this releases the GIL
+            time.sleep(0.002)
+            super().__setitem__(session_id, story)
+
+    users = 16
+    turns = max(args.repeat // 10, 1)
+
+    async def run(story, executor):
+        app = await app_factory(
+            assets=story.assets, story_builder=story, sessions=SlowStore(), executor=executor
+        )
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://balladeer") as client:
+            urls = [(await client.post("/sessions")).headers["location"] for n in range(users)]
+            rv = []
+
+            probes = []
+            done = asyncio.Event()
+
+            async def user(url):
+                for n in range(turns):
+                    start = time.perf_counter()
+                    await client.get(url)
+                    rv.append(time.perf_counter() - start)
+
+            async def probe(interval=0.001):
+                # How late the loop is to wake a sleeper is how long a new request must wait
+                while not done.is_set():
+                    start = time.perf_counter()
+                    await asyncio.sleep(interval)
+                    probes.append(time.perf_counter() - start - interval)
+
+            task = asyncio.create_task(probe())
+            start = time.perf_counter()
+            await asyncio.gather(*(user(url) for url in urls))
+            elapsed = time.perf_counter() - start
+            done.set()
+            await task
+            return len(rv) / elapsed, sorted(rv), sorted(probes)
+
+    with tempfile.TemporaryDirectory() as path, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        story = synthesize_story(args, pathlib.Path(path))
+        yield "dispatch.users", users, ""
+        for label, executor in [("inline", None), ("threads", ThreadPoolExecutor(max_workers=2))]:
+            rate, latencies, probes = asyncio.run(run(story, executor))
+            yield f"dispatch.{label}", rate, "requests/s"
+            yield f"dispatch.{label}.p50", latencies[len(latencies) // 2] * 1000, "ms"
+            yield f"dispatch.{label}.p99", latencies[int(len(latencies) * 0.99)] * 1000, "ms"
+            yield f"dispatch.{label}.lag.p50", probes[len(probes) // 2] * 1000, "ms"
+            yield f"dispatch.{label}.lag.p99", probes[int(len(probes) * 0.99)] * 1000, "ms"
+            if executor is not None:
+                executor.shutdown()
+
+
+def bench_channel(args):
+    "Commands by form post and redirect, compared with the WebSocket channel, in commands per second."
+    # The test client needs httpx, which comes with the test extra
+    from starlette.testclient import TestClient
+
+    with tempfile.TemporaryDirectory() as path, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        story = synthesize_story(args, pathlib.Path(path))
+        client = TestClient(asyncio.run(app_factory(assets=story.assets, story_builder=story)))
+        url = client.post("/sessions").url.path
+        data = {"ballad-command-form-input-text": "x item 0001"}
+
+        start = time.perf_counter()
+        for n in range(args.repeat):
+            client.post(f"{url}/command", data=data)
+        yield "channel.http", args.repeat / (time.perf_counter() - start), "commands/s"
+
+        with client.websocket_connect(f"{url}/channel") as ws:
+            ws.receive_json()
+            start = time.perf_counter()
+            for n in range(args.repeat):
+                ws.send_json({"command": "x item 0001"})
+                ws.receive_json()
+            yield "channel.websocket", args.repeat / (time.perf_counter() - start), "commands/s"
+
+
+def bench_stream(args):
+    "Time to the first and last bytes of a session page, called directly through ASGI."
+    # httpx comes with the test extra, not with balladeer itself
+    import httpx
+
+
+    async def get(app, path: str) -> tuple[float, float]:
+        scope = dict(
+            type="http", http_version="1.1", method="GET", scheme="http", server=("balladeer", 80),
+            path=path, raw_path=path.encode(), root_path="", query_string=b"", headers=[],
+        )
+        first = []
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+        done = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and not first:
+                first.append(time.perf_counter())
+
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        done.set()
+        return first[0] - start, time.perf_counter() - start
+
+    async def run(story):
+        app = await app_factory(assets=story.assets, story_builder=story)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://balladeer") as client:
+            response = await client.post("/sessions")
+        path = response.headers["location"].replace("http://balladeer", "")
+        return [await get(app, path) for n in range(args.repeat)]
+
+    with tempfile.TemporaryDirectory() as path, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        story = synthesize_story(args, pathlib.Path(path))
+        results = asyncio.run(run(story))
+
+    yield "stream.first", sum(i for i, j in results) / len(results) * 1000, "ms"
+    yield "stream.last", sum(j for i, j in results) / len(results) * 1000, "ms"
+
+
+def bench_render(args):
+    "Links and theme variables for the head of a page, rendered afresh and from the memo."
+    static = pathlib.Path("static").resolve()
+    assets = Grouping(list)
+    for n in range(max(args.size // 10, 1)):
+        for name, typ in [(f"style_{n:03d}.css", "text/css"), (f"app_{n:03d}.js", "application/javascript")]:
+            assets[typ].append(Loader.Asset(name, path=static.joinpath(name), type=typ))
+
+    request = types.SimpleNamespace(app=types.SimpleNamespace(state=types.SimpleNamespace(static=static)))
+    settings = StoryBuilder.settings("default", themes=Page.themes)
+
+    def render(shell: Home.Shell):
+        shell = shell or Home.Shell(assets, static)
+        return (shell.css_links(request, "dark"), shell.js_links(request), shell.css_vars(settings))
+
+    shell = Home.Shell(assets, static)
+    yield "render.assets", len(assets.all), ""
+    yield "render.fresh", timed(render, None, repeat=args.repeat) * 1000000, "us"
+    yield "render.memo", timed(render, shell, repeat=args.repeat) * 1000000, "us"
+
+
+def bench_media(args):
+    "Markup for the media of a cue, from the asset index and memo."
+    static = pathlib.Path("static").resolve()
+    assets = Grouping.typewise(
+        Loader.Asset(f"{name}_{n:03d}.{ext}", path=static.joinpath(f"{name}_{n:03d}.{ext}"), type=typ)
+        for n in range(args.size)
+        for name, ext, typ in [("bell", "mp3", "audio/mpeg"), ("intro", "mp4", "video/mp4")]
+    )
+    request = types.SimpleNamespace(app=types.SimpleNamespace(state=types.SimpleNamespace(static=static)))
+
+    class Endpoint(Session):
+        pass
+
+    Endpoint.assets = assets
+    endpoint = Endpoint(dict(type="http"), None, None)
+    media = ["bell_000", "intro_000"]
+
+    def render(fresh: bool):
+        if fresh:
+            Endpoint.shell = None
+        return list(endpoint.render_detail(request, "", media, 1.0))
+
+    yield "media.assets", len(assets[Loader.Asset]), ""
+    yield "media.fresh", timed(render, True, repeat=args.repeat) * 1000000, "us"
+    yield "media.memo", timed(render, False, repeat=args.repeat) * 1000000, "us"
+
+
+def bench_notes(args):
+    "Edit of a long scene, where each cue has a note and every paragraph adds to it."
+    text = "\n".join(
+        f"<HERO>\n\n    Line {n} of the [HERO]_.\n\n    And another.\n\n    And one more.\n"
+        for n in range(args.size)
+    )
+    speech = Dialogue(text)
+    roles = {"HERO": Entity(name="Hero")}
+
+    def edit():
+        director = Director()
+        rv = list(director.edit(speech, roles))
+        return director.notes
+
+    notes = edit()
+    yield "notes.cues", len(notes), ""
+    yield "notes.edit", timed(edit, repeat=max(args.repeat // 10, 1)) * 1000, "ms"
+    yield "notes.list", timed(lambda: list(notes)[-1], repeat=args.repeat) * 1000000, "us"
+    yield "notes.cursor", timed(lambda: notes.current, repeat=args.repeat) * 1000000, "us"
+
+
+def bench_options(args):
+    "Expansion of commands, when cold and when cached."
+    ensemble = [Entity(name=f"item {n:04d}") for n in range(args.size)]
+    drama = Picking()
+
+    cold = timed(lambda: Picking().options(ensemble))
+    drama.options(ensemble)
+    warm = timed(drama.options, ensemble, repeat=args.repeat)
+
+    yield "options.cold", cold * 1000, "ms"
+    yield "options.warm", warm * 1000, "ms"
+    yield "options.actions", timed(
+        lambda: list(drama.actions("take item 0012", ensemble=ensemble)), repeat=args.repeat
+    ) * 1000, "ms"
+
+
+def bench_matcher(args):
+    "Fuzzy matching of commands against difflib, over phrases from the options benchmark."
+    ensemble = [Entity(name=f"item {n:04d}") for n in range(args.size)]
+    options = Picking().options(ensemble)
+    matcher = Performance.Matcher(options)
+    words = ["x item 0012", "examine itm 0012", "take item 001", "inspect item 00012"]
+
+    yield "matcher.phrases", len(options), ""
+    yield "matcher.build", timed(Performance.Matcher, options) * 1000, "ms"
+    yield "matcher.difflib", timed(
+        lambda: [difflib.get_close_matches(i, options, n=1, cutoff=0.95) for i in words], repeat=args.repeat
+    ) * 1000 / len(words), "ms"
+    yield "matcher.indexed", timed(
+        lambda: [matcher.get_close_matches(i, n=1, cutoff=0.95) for i in words], repeat=args.repeat
+    ) * 1000 / len(words), "ms"
+
+
+def bench_casting(args):
+    "Selection of a scene from a hundred, where only the last can be cast."
+    ensemble = [
+        Entity(name=f"item {n:04d}", types={f"Type{n % 10}", "Item"}).set_state(n % 7)
+        for n in range(args.size)
+    ]
+    scenes = [
+        Loader.Scene(
+            "",
+            {"HERO": {"type": f"Type{n % 10}", "state": 100}, "ITEM": {"types": ["Item"], "state": n % 7}}
+            if n < 99 else {"HERO": {"type": "Type1", "state": 1}, "ITEM": {"types": ["Item"], "state": 2}}
+        )
+        for n in range(100)
+    ]
+    director = Director()
+    director.selection(scenes, ensemble)
+
+    yield "casting.selection", timed(director.selection, scenes, ensemble, repeat=args.repeat) * 1000, "ms"
+
+
+def bench_scenes(args):
+    "Rewriting of the example scenes, with and without precompiled cues."
+    path = pathlib.Path(__file__).parent.parent.joinpath("examples")
+    scenes = [i for i in Loader.discover(path, precompile=True) if isinstance(i, Loader.Scene)]
+    casting = [
+        (scene, {k: Entity(name=k.title()) for k, v in scene.tables.items() if isinstance(v, dict)})
+        for scene in scenes
+    ]
+
+    def rewrite(compiled: bool):
+        for scene, roles in casting:
+            scene = scene if compiled else scene._replace(cues=None)
+            for item in Director().rewrite(scene, roles):
+                pass
+
+    rewrite(False)
+    yield "scenes.count", len(scenes), ""
+    yield "scenes.parsed", timed(rewrite, False, repeat=args.repeat) * 1000, "ms"
+    yield "scenes.compiled", timed(rewrite, True, repeat=args.repeat) * 1000, "ms"
+
+
+benchmarks = {
+    "sessions": bench_sessions,
+    "options": bench_options,
+    "matcher": bench_matcher,
+    "scenes": bench_scenes,
+    "casting": bench_casting,
+    "turn": bench_turn,
+    "discover": bench_discover,
+    "route": bench_route,
+    "adjacency": bench_adjacency,
+    "world": bench_world,
+    "entities": bench_entities,
+    "endpoints": bench_endpoints,
+    "channel": bench_channel,
+    "dispatch": bench_dispatch,
+    "stream": bench_stream,
+    "render": bench_render,
+    "media": bench_media,
+    "notes": bench_notes,
+}
+
+
+def parser(usage=__doc__):
+    rv = argparse.ArgumentParser(usage)
+    rv.add_argument(
+        "names", nargs="*", help="Benchmarks to run: {0} [all].".format(", ".join(benchmarks))
+    )
+    rv.add_argument("--repeat", type=int, default=100, help="Number of repetitions [%(default)s].")
+    rv.add_argument("--size", type=int, default=1000, help="Number of entities [%(default)s].")
+    rv.add_argument("--scenes", type=int, default=20, help="Number of synthesized scenes [%(default)s].")
+    rv.add_argument("--shots", type=int, default=4, help="Number of shots in each scene [%(default)s].")
+    rv.add_argument("--spots", type=int, default=25, help="Number of spots on the map [%(default)s].")
+    rv.add_argument("--output", type=pathlib.Path, default=None, help="Write results as JSON to this file.")
+    return rv
+
+
+def main(args):
+    unknown = set(args.names).difference(benchmarks)
+    if unknown:
+        print(f"Unknown benchmarks: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    results = []
+    for name in args.names or benchmarks:
+        try:
+            for label, value, unit in benchmarks[name](args):
+                print(f"{label:<36} {value:>12.2f} {unit}")
+                results.append(dict(benchmark=name, label=label, value=value, unit=unit))
+        except ModuleNotFoundError as e:
+            print(f"Skipped {name}: {e!s}", file=sys.stderr)
+
+    if args.output:
+        data = dict(
+            version=balladeer.__version__,
+            python=platform.python_version(),
+            platform=platform.platform(),
+            options={k: v for k, v in vars(args).items() if k not in ("names", "output")},
+            results=results,
+        )
+        args.output.write_text(json.dumps(data, indent=2))
+    return 0
+
+
+def run():
+    p = parser()
+    args = p.parse_args()
+    rv = main(args)
+    sys.exit(rv)
+
+
+if __name__ == "__main__":
+    run()